@@ -1,6 +1,7 @@
+import os
 import sys
 import argparse
-from . import commands, VERSION
+from . import commands, exif_read, scan_index, state_store, VERSION
 
 
 def main():
@@ -85,6 +86,24 @@ def main():
         del vars(args)["version"]
     if "full_help" in vars(args):
         del vars(args)["full_help"]
+    state_backend = vars(args).pop("state_backend", None)
+    use_scan_index = vars(args).pop("scan_index", False)
+    state_root = vars(args).get("import_path")
+    video_import_path = vars(args).get("video_import_path")
+    if not state_root and video_import_path:
+        state_root = (
+            video_import_path
+            if os.path.isdir(video_import_path)
+            else os.path.dirname(video_import_path)
+        )
+    if state_backend == "sqlite":
+        if not state_root or not os.path.isdir(state_root):
+            parser.error("--state_backend sqlite requires an existing import path")
+        state_store.enable_sqlite(state_root)
+    if use_scan_index:
+        if not state_root or not os.path.isdir(state_root):
+            parser.error("--scan_index requires an existing import path")
+        scan_index.enable(state_root)
 
     # Run the selected subcommand if unit command, or in case of batch
     # command, run several unit commands
@@ -92,6 +111,15 @@ def main():
         if args_command == command.name:
             command.run(args)
 
+    scan_index.save_all()
+
+    if vars(args).get("verbose"):
+        cache_info = exif_read.exif_cache_info()
+        print(
+            f"EXIF cache: {cache_info.hits} hits, {cache_info.misses} misses, "
+            f"{cache_info.currsize} images cached"
+        )
+
 
 if __name__ == "__main__":
     main()
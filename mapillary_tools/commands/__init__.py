@@ -1,4 +1,5 @@
 from . import authenticate
+from . import compact_logs
 from . import exif_insert
 from . import extract_geotag_data
 from . import extract_import_meta_data
@@ -29,6 +30,7 @@ mapillary_tools_advanced_commands = [
     authenticate,
     interpolate,
     post_process,
+    compact_logs,
 ]
 
 mapillary_tools_commands = [process, upload, process_and_upload]
@@ -77,3 +79,18 @@ def add_general_arguments(parser, command):
         help="path to your photos, or in case of video, path where the photos from video sampling will be saved",
         required=required,
     )
+
+    parser.add_argument(
+        "--state_backend",
+        help="Where to keep the processing and upload state of the images: flag files under .mapillary/logs next to each image, or a single SQLite database in the import path. Existing logs are imported when the database is created, and an existing database is always used.",
+        choices=["files", "sqlite"],
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--scan_index",
+        help="Keep an index of the directory listings and image states in the import path, so that rerunning on a large import path where little changed only reads the changed directories.",
+        action="store_true",
+        default=False,
+        required=False,
+    )
@@ -0,0 +1,27 @@
+from ..compact_logs import compact_logs
+
+
+class Command:
+    name = "compact_logs"
+    help = "Helper tool : Fold the timestamped flag files accumulated in the logs of an import path into one history record per image."
+
+    def add_basic_arguments(self, parser):
+        parser.add_argument(
+            "--skip_subfolders",
+            help="Skip all subfolders and compact only the logs of the images in the given directory path.",
+            action="store_true",
+            default=False,
+            required=False,
+        )
+
+    def add_advanced_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            help="Number of directories compacted in parallel. Defaults to a number based on the number of CPUs.",
+            type=int,
+            default=None,
+            required=False,
+        )
+
+    def run(self, args):
+        compact_logs(**vars(args))
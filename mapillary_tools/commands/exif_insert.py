@@ -75,6 +75,13 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--workers",
+            help="Number of processes inserting the image descriptions in parallel. By default the images are processed one after the other.",
+            type=int,
+            default=None,
+            required=False,
+        )
 
     def run(self, args):
         insert_MAPJson(**vars(args))
@@ -68,6 +68,35 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--trace_tolerance",
+            help="Simplify the GPS trace before geotagging, dropping the points that the simplified trace places within this distance in meters of where they were recorded.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--trace_interval",
+            help="Resample the GPS trace before geotagging, to one point every this many seconds.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--exif_read_mode",
+            help="Read the image EXIF for geotagging on threads or on processes, when --workers is more than 1.",
+            action="store",
+            choices=["thread", "process"],
+            default="thread",
+            required=False,
+        )
+        parser.add_argument(
+            "--workers",
+            help="Number of workers reading the image EXIF for geotagging in parallel. By default the images are read one after the other.",
+            type=int,
+            default=None,
+            required=False,
+        )
 
     def run(self, args):
         vars_args = vars(args)
@@ -59,6 +59,13 @@ class Command:
             help="max angle for two images to be considered duplicates in degrees",
             required=False,
         )
+        parser.add_argument(
+            "--duplicates_across_sequences",
+            help="flag images as duplicates also if they duplicate an image of another sequence or folder of the import, not only the previous image of their sequence",
+            action="store_true",
+            default=False,
+            required=False,
+        )
         parser.add_argument(
             "--offset_angle",
             default=0.0,
@@ -1,7 +1,9 @@
 import inspect
 
+from .. import image_catalog
 from ..insert_MAPJson import insert_MAPJson
 from ..post_process import post_process
+from ..process_fused import process_fused
 from ..process_geotag_properties import process_geotag_properties
 from ..process_import_meta_properties import (
     process_import_meta_properties,
@@ -51,6 +53,13 @@ class Command:
         )
 
     def add_advanced_arguments(self, parser):
+        parser.add_argument(
+            "--fused",
+            help="Run all per image process steps for one image after the other in a single pass over the images, instead of one pass over all images per step. Only the sequence process runs as a separate pass.",
+            action="store_true",
+            default=False,
+            required=False,
+        )
         # master upload
         parser.add_argument(
             "--master_upload",
@@ -174,6 +183,28 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--trace_tolerance",
+            help="Simplify the GPS trace before geotagging, dropping the points that the simplified trace places within this distance in meters of where they were recorded.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--trace_interval",
+            help="Resample the GPS trace before geotagging, to one point every this many seconds.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--exif_read_mode",
+            help="Read the image EXIF for geotagging on threads or on processes, when --workers is more than 1.",
+            action="store",
+            choices=["thread", "process"],
+            default="thread",
+            required=False,
+        )
 
         # sequence
         parser.add_argument(
@@ -217,6 +248,13 @@ class Command:
             default=5,
             required=False,
         )
+        parser.add_argument(
+            "--duplicates_across_sequences",
+            help="flag images as duplicates also if they duplicate an image of another sequence or folder of the import, not only the previous image of their sequence",
+            action="store_true",
+            default=False,
+            required=False,
+        )
 
         # EXIF insert
         parser.add_argument(
@@ -339,6 +377,13 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--workers",
+            help="Number of workers reading the image EXIF for geotagging and inserting the image descriptions in parallel. By default the images are processed one after the other.",
+            type=int,
+            default=None,
+            required=False,
+        )
         # add custom meta data in a form of a string consisting of a triplet
         # "name,type,value"
         parser.add_argument(
@@ -366,74 +411,88 @@ class Command:
             and vars_args["device_make"].lower() == "blackvue"
         ):
             vars_args["duplicate_angle"] = 360
-        process_user_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_user_properties).args
-                }
-            )
-        )
+        # share the file lists, state and EXIF read by the stages
+        with image_catalog.activate(image_catalog.ImageCatalog()):
+            if vars_args.get("fused"):
+                process_fused(
+                    **(
+                        {
+                            k: v
+                            for k, v in vars_args.items()
+                            if k in inspect.getargspec(process_fused).args
+                        }
+                    )
+                )
+            else:
+                process_user_properties(
+                    **(
+                        {
+                            k: v
+                            for k, v in vars_args.items()
+                            if k in inspect.getargspec(process_user_properties).args
+                        }
+                    )
+                )
 
-        process_import_meta_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_import_meta_properties).args
-                }
-            )
-        )
+                process_import_meta_properties(
+                    **(
+                        {
+                            k: v
+                            for k, v in vars_args.items()
+                            if k
+                            in inspect.getargspec(process_import_meta_properties).args
+                        }
+                    )
+                )
 
-        process_geotag_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_geotag_properties).args
-                }
-            )
-        )
+                process_geotag_properties(
+                    **(
+                        {
+                            k: v
+                            for k, v in vars_args.items()
+                            if k in inspect.getargspec(process_geotag_properties).args
+                        }
+                    )
+                )
 
-        process_sequence_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_sequence_properties).args
-                }
-            )
-        )
+                process_sequence_properties(
+                    **(
+                        {
+                            k: v
+                            for k, v in vars_args.items()
+                            if k in inspect.getargspec(process_sequence_properties).args
+                        }
+                    )
+                )
 
-        process_upload_params(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_upload_params).args
-                }
-            )
-        )
+                process_upload_params(
+                    **(
+                        {
+                            k: v
+                            for k, v in vars_args.items()
+                            if k in inspect.getargspec(process_upload_params).args
+                        }
+                    )
+                )
 
-        insert_MAPJson(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(insert_MAPJson).args
-                }
-            )
-        )
+                insert_MAPJson(
+                    **(
+                        {
+                            k: v
+                            for k, v in vars_args.items()
+                            if k in inspect.getargspec(insert_MAPJson).args
+                        }
+                    )
+                )
 
-        print("Process done.")
+            print("Process done.")
 
-        post_process(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(post_process).args
-                }
+            post_process(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(post_process).args
+                    }
+                )
             )
-        )
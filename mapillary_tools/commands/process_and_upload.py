@@ -1,5 +1,6 @@
 import inspect
 
+from .. import image_catalog
 from ..insert_MAPJson import insert_MAPJson
 from ..post_process import post_process
 from ..process_geotag_properties import process_geotag_properties
@@ -182,6 +183,28 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--trace_tolerance",
+            help="Simplify the GPS trace before geotagging, dropping the points that the simplified trace places within this distance in meters of where they were recorded.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--trace_interval",
+            help="Resample the GPS trace before geotagging, to one point every this many seconds.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--exif_read_mode",
+            help="Read the image EXIF for geotagging on threads or on processes, when --workers is more than 1.",
+            action="store",
+            choices=["thread", "process"],
+            default="thread",
+            required=False,
+        )
 
         # sequence
         parser.add_argument(
@@ -225,6 +248,13 @@ class Command:
             default=5,
             required=False,
         )
+        parser.add_argument(
+            "--duplicates_across_sequences",
+            help="flag images as duplicates also if they duplicate an image of another sequence or folder of the import, not only the previous image of their sequence",
+            action="store_true",
+            default=False,
+            required=False,
+        )
         # EXIF insert
         parser.add_argument(
             "--skip_EXIF_insert",
@@ -233,6 +263,13 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--inject_descriptions",
+            help="Insert the image descriptions into the uploaded images instead of reading them from the image EXIF, together with --skip_EXIF_insert the image files are never rewritten.",
+            action="store_true",
+            default=False,
+            required=False,
+        )
         parser.add_argument(
             "--keep_original",
             help='Do not overwrite original images, instead save the processed images in a new directory called "processed_images" located in .mapillary in the import_path.',
@@ -360,6 +397,13 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--workers",
+            help="Number of workers reading the image EXIF for geotagging and inserting the image descriptions in parallel. By default the images are processed one after the other.",
+            type=int,
+            default=None,
+            required=False,
+        )
         # add custom meta data in a form of a string consisting of a triplet
         # "name,type,value"
         parser.add_argument(
@@ -388,83 +432,85 @@ class Command:
         ):
             vars_args["duplicate_angle"] = 360
 
-        process_user_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_user_properties).args
-                }
+        # share the file lists, state and EXIF read by the stages
+        with image_catalog.activate(image_catalog.ImageCatalog()):
+            process_user_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_user_properties).args
+                    }
+                )
             )
-        )
 
-        process_import_meta_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_import_meta_properties).args
-                }
+            process_import_meta_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_import_meta_properties).args
+                    }
+                )
             )
-        )
 
-        process_geotag_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_geotag_properties).args
-                }
+            process_geotag_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_geotag_properties).args
+                    }
+                )
             )
-        )
 
-        process_sequence_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_sequence_properties).args
-                }
+            process_sequence_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_sequence_properties).args
+                    }
+                )
             )
-        )
 
-        process_upload_params(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_upload_params).args
-                }
+            process_upload_params(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_upload_params).args
+                    }
+                )
             )
-        )
 
-        insert_MAPJson(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(insert_MAPJson).args
-                }
+            insert_MAPJson(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(insert_MAPJson).args
+                    }
+                )
             )
-        )
-        print("Process done.")
+            print("Process done.")
 
-        upload(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(upload).args
-                }
+            upload(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(upload).args
+                    }
+                )
             )
-        )
 
-        post_process(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(post_process).args
-                }
+            post_process(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(post_process).args
+                    }
+                )
             )
-        )
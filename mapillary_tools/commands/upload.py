@@ -40,6 +40,13 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--inject_descriptions",
+            help="Insert the image descriptions into the uploaded images instead of reading them from the image EXIF, for images processed with --skip_EXIF_insert.",
+            action="store_true",
+            default=False,
+            required=False,
+        )
 
         # post process
         parser.add_argument(
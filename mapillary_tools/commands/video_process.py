@@ -1,5 +1,6 @@
 import inspect
 
+from .. import exif_plan
 from ..apply_camera_specific_config import apply_camera_specific_config
 from ..insert_MAPJson import insert_MAPJson
 from ..post_process import post_process
@@ -205,6 +206,28 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--trace_tolerance",
+            help="Simplify the GPS trace before geotagging, dropping the points that the simplified trace places within this distance in meters of where they were recorded.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--trace_interval",
+            help="Resample the GPS trace before geotagging, to one point every this many seconds.",
+            type=float,
+            default=0.0,
+            required=False,
+        )
+        parser.add_argument(
+            "--exif_read_mode",
+            help="Read the image EXIF for geotagging on threads or on processes, when --workers is more than 1.",
+            action="store",
+            choices=["thread", "process"],
+            default="thread",
+            required=False,
+        )
 
         # sequence
         parser.add_argument(
@@ -248,6 +271,13 @@ class Command:
             default=5,
             required=False,
         )
+        parser.add_argument(
+            "--duplicates_across_sequences",
+            help="flag images as duplicates also if they duplicate an image of another sequence or folder of the import, not only the previous image of their sequence",
+            action="store_true",
+            default=False,
+            required=False,
+        )
         # EXIF insert
         parser.add_argument(
             "--skip_EXIF_insert",
@@ -298,6 +328,13 @@ class Command:
             default=False,
             required=False,
         )
+        parser.add_argument(
+            "--workers",
+            help="Number of workers reading the image EXIF for geotagging and inserting the image descriptions in parallel. By default the images are processed one after the other.",
+            type=int,
+            default=None,
+            required=False,
+        )
         # post process
         parser.add_argument(
             "--summarize",
@@ -383,75 +420,77 @@ class Command:
 
         vars_args = apply_camera_specific_config(vars_args)
 
-        sample_video(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(sample_video).args
-                }
+        # write the EXIF changes of the frames once, when the images are processed
+        with exif_plan.activate(exif_plan.ExifPlan(vars_args.get("workers"))):
+            sample_video(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(sample_video).args
+                    }
+                )
             )
-        )
 
-        process_user_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_user_properties).args
-                }
+            process_user_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_user_properties).args
+                    }
+                )
             )
-        )
 
-        process_import_meta_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_import_meta_properties).args
-                }
+            process_import_meta_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_import_meta_properties).args
+                    }
+                )
             )
-        )
 
-        process_geotag_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_geotag_properties).args
-                }
+            process_geotag_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_geotag_properties).args
+                    }
+                )
             )
-        )
 
-        process_sequence_properties(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_sequence_properties).args
-                }
+            process_sequence_properties(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_sequence_properties).args
+                    }
+                )
             )
-        )
 
-        process_upload_params(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(process_upload_params).args
-                }
+            process_upload_params(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(process_upload_params).args
+                    }
+                )
             )
-        )
 
-        insert_MAPJson(
-            **(
-                {
-                    k: v
-                    for k, v in vars_args.items()
-                    if k in inspect.getargspec(insert_MAPJson).args
-                }
+            insert_MAPJson(
+                **(
+                    {
+                        k: v
+                        for k, v in vars_args.items()
+                        if k in inspect.getargspec(insert_MAPJson).args
+                    }
+                )
             )
-        )
 
         print("Process done.")
 
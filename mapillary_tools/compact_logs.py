@@ -0,0 +1,120 @@
+import os
+import sys
+import typing as T
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+from . import state_store
+from .error import print_error
+
+
+class CompactionResult(T.NamedTuple):
+    images: int = 0
+    removed_files: int = 0
+    created_files: int = 0
+    reclaimed_bytes: int = 0
+
+    @property
+    def reclaimed_inodes(self) -> int:
+        return self.removed_files - self.created_files
+
+    def __add__(self, other):
+        return CompactionResult(*(a + b for a, b in zip(self, other)))
+
+
+def _allocated_size(stat: os.stat_result) -> int:
+    blocks = getattr(stat, "st_blocks", None)
+    return stat.st_size if blocks is None else blocks * 512
+
+
+def compact_log_root(log_root: str) -> CompactionResult:
+    """
+    Fold the timestamped flag files of one image into its history record
+    """
+    entries = []
+    with os.scandir(log_root) as it:
+        for entry in it:
+            if entry.is_file() and state_store.is_history_entry(entry.name):
+                entries.append(entry)
+    if not entries:
+        return CompactionResult()
+
+    record_path = os.path.join(log_root, state_store.HISTORY_RECORD_FILENAME)
+    try:
+        previous_size = _allocated_size(os.stat(record_path))
+        created_files = 0
+    except FileNotFoundError:
+        previous_size = 0
+        created_files = 1
+
+    history = state_store.read_history_record(log_root)
+    history.extend(state_store.split_history_entry(entry.name) for entry in entries)
+    # the record is in place before anything is removed, so an interrupted
+    # compaction loses nothing and is finished by the next run
+    state_store.write_history_record(log_root, history)
+
+    reclaimed_bytes = previous_size - _allocated_size(os.stat(record_path))
+    for entry in entries:
+        reclaimed_bytes += _allocated_size(entry.stat())
+        os.remove(entry.path)
+
+    return CompactionResult(1, len(entries), created_files, reclaimed_bytes)
+
+
+def compact_logs_directory(logs_dir: str) -> CompactionResult:
+    result = CompactionResult()
+    with os.scandir(logs_dir) as it:
+        log_roots = [entry.path for entry in it if entry.is_dir()]
+    for log_root in log_roots:
+        result += compact_log_root(log_root)
+    return result
+
+
+def find_logs_directories(
+    import_path: str, skip_subfolders: bool = False
+) -> T.List[str]:
+    logs_dirs = []
+    for dirpath, dirnames, _ in os.walk(import_path, topdown=True):
+        if skip_subfolders:
+            dirnames.clear()
+        else:
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        logs_dir = os.path.join(dirpath, ".mapillary", "logs")
+        if os.path.isdir(logs_dir):
+            logs_dirs.append(logs_dir)
+    return logs_dirs
+
+
+def compact_logs(
+    import_path: str,
+    skip_subfolders: bool = False,
+    workers: T.Optional[int] = None,
+    verbose: bool = False,
+) -> CompactionResult:
+    """
+    Fold the timestamped flag files (<flag>_<YYYY_mm_dd_HH_MM_SS>) left by every
+    process and upload run into one history record per image, the directories
+    holding logs are compacted in parallel
+    """
+    if not import_path or not os.path.isdir(import_path):
+        print_error(f"Error, import directory {import_path} does not exist, exiting...")
+        sys.exit(1)
+
+    logs_dirs = find_logs_directories(import_path, skip_subfolders)
+    result = CompactionResult()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for logs_dir_result in tqdm(
+            executor.map(compact_logs_directory, logs_dirs),
+            total=len(logs_dirs),
+            unit="directories",
+            desc="Compacting logs",
+            disable=not verbose,
+        ):
+            result += logs_dir_result
+
+    print(
+        f"Compacted the logs of {result.images} images: "
+        f"{result.reclaimed_inodes} inodes and {result.reclaimed_bytes} bytes reclaimed"
+    )
+    return result
@@ -0,0 +1,127 @@
+import datetime
+import pickle
+import typing as T
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from tqdm import tqdm
+
+from . import image_catalog
+
+"""
+Parallel extraction of the EXIF fields needed for geotagging.
+
+Reading EXIF is the bulk of the geotag process on large imports. The fields
+of a whole file list are read on a pool of threads (the reads overlap, which
+pays off on network and spinning disks) or of processes (the parsing runs on
+all cores), and are returned as one small ExifGeotag per image, in the order
+of the file list.
+"""
+
+EXTRACTION_MODES = ["thread", "process"]
+
+
+def _unwrap(value: T.Any) -> T.Any:
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+
+class ExifGeotag(T.NamedTuple):
+    """
+    The geotag fields of one image, with the interface of ExifRead. A field
+    that could not be read holds the exception, which is raised on access.
+    """
+
+    lon_lat: T.Union[T.Tuple[T.Optional[float], T.Optional[float]], Exception]
+    capture_time: T.Union[T.Optional[datetime.datetime], Exception]
+    altitude: T.Union[T.Optional[float], Exception]
+    direction: T.Union[T.Optional[float], Exception]
+
+    def extract_lon_lat(self):
+        return _unwrap(self.lon_lat)
+
+    def extract_capture_time(self):
+        return _unwrap(self.capture_time)
+
+    def extract_altitude(self):
+        return _unwrap(self.altitude)
+
+    def extract_direction(self):
+        return _unwrap(self.direction)
+
+
+def _field(read: T.Callable[[], T.Any]) -> T.Any:
+    try:
+        return read()
+    except Exception as ex:
+        return ex
+
+
+def read_geotag(image: str) -> T.Optional[ExifGeotag]:
+    """
+    Read the geotag fields of image, None if its EXIF can not be read
+    """
+    try:
+        exif = image_catalog.read_exif(image)
+    except Exception:
+        return None
+    return ExifGeotag(
+        _field(exif.extract_lon_lat),
+        _field(exif.extract_capture_time),
+        _field(exif.extract_altitude),
+        _field(exif.extract_direction),
+    )
+
+
+def _portable(value: T.Any) -> T.Any:
+    # exceptions of the EXIF parsers do not always survive pickling
+    if isinstance(value, Exception):
+        try:
+            pickle.loads(pickle.dumps(value))
+        except Exception:
+            return RuntimeError(str(value))
+    return value
+
+
+def _read_geotag_in_process(image: str) -> T.Optional[ExifGeotag]:
+    geotag = read_geotag(image)
+    if geotag is None:
+        return None
+    return ExifGeotag(*(_portable(value) for value in geotag))
+
+
+def extract_geotags(
+    images: T.List[str],
+    workers: T.Optional[int] = None,
+    mode: str = "thread",
+    desc: str = "Extracting gps data from image EXIF",
+) -> T.List[T.Optional[ExifGeotag]]:
+    """
+    Read the geotag fields of images, on workers threads or processes
+    (serially if workers is not more than 1)
+    """
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Invalid EXIF extraction mode {mode}")
+
+    if workers is None or workers <= 1 or len(images) <= 1:
+        return [read_geotag(image) for image in tqdm(images, desc=desc)]
+
+    if mode == "process":
+        executor: T.Any = ProcessPoolExecutor(max_workers=workers)
+        read = _read_geotag_in_process
+        chunksize = max(1, min(64, len(images) // (workers * 4)))
+    else:
+        # the threads share the image catalog, so the EXIF read here is
+        # reused by the following stages
+        executor = ThreadPoolExecutor(max_workers=workers)
+        read = read_geotag
+        chunksize = 1
+
+    with executor:
+        return list(
+            tqdm(
+                executor.map(read, images, chunksize=chunksize),
+                total=len(images),
+                desc=desc,
+            )
+        )
@@ -0,0 +1,342 @@
+import mmap
+import struct
+import typing as T
+
+from exifread.classes import IfdTag
+from exifread.tags import EXIF_TAGS, FIELD_TYPES, GPS_TAGS
+from exifread.utils import Ratio
+
+"""
+Fast EXIF reader for JPEG files.
+
+exifread.process_file walks the whole TIFF structure of the EXIF and decodes
+every tag. This reader reads the JPEG markers up to and including the EXIF
+APP1 segment only, and indexes only the tags used by ExifRead. Each tag is
+decoded when it is first looked up, into the same tag object with the same
+values as exifread. Anything it does not handle the way exifread does makes
+it give up (read_exif_tags returns None), so that the caller falls back to
+exifread.
+"""
+
+# JPEG markers
+SOI = 0xD8
+SOS = 0xDA
+EOI = 0xD9
+DQT = 0xDB
+APP1 = 0xE1
+
+# the EXIF is expected within the first segments, stop looking after that
+MAX_HEADER_BYTES = 1024 * 1024
+MAX_IFDS = 16
+
+GPS_INFO_TAG = 0x8825
+EXIF_OFFSET_TAG = 0x8769
+
+# the tags read by ExifRead, by IFD name
+WANTED_TAGS: T.Dict[str, T.Set[str]] = {
+    "Image": {
+        "ImageDescription",
+        "Make",
+        "Model",
+        "Orientation",
+        "DateTime",
+        "DateTimeOriginal",
+        "DateTimeDigitized",
+        "SubSecTime",
+        "SubSecTimeOriginal",
+        "SubSecTimeDigitized",
+        "ImageWidth",
+        "ImageLength",
+        "Tag 0x9213",
+    },
+    "EXIF": {
+        "DateTime",
+        "DateTimeOriginal",
+        "DateTimeDigitized",
+        "SubSecTime",
+        "SubSecTimeOriginal",
+        "SubSecTimeDigitized",
+        "LensMake",
+        "LensModel",
+        "ExifImageWidth",
+        "ExifImageLength",
+    },
+    "GPS": {
+        "GPSLatitudeRef",
+        "GPSLatitude",
+        "GPSLongitudeRef",
+        "GPSLongitude",
+        "GPSAltitudeRef",
+        "GPSAltitude",
+        "GPSTimeStamp",
+        "GPSDate",
+        "GPSTrack",
+        "GPSImgDirection",
+    },
+}
+
+
+class UnsupportedExif(Exception):
+    pass
+
+
+# struct formats of the numeric field types
+_NUMBER_FORMATS = {
+    1: "B",
+    3: "H",
+    4: "I",
+    5: "I",
+    6: "b",
+    7: "B",
+    8: "h",
+    9: "i",
+    10: "i",
+}
+
+
+def _tag_name(tag_dict: T.Dict, tag: int) -> str:
+    tag_entry = tag_dict.get(tag)
+    return tag_entry[0] if tag_entry else "Tag 0x%04X" % tag
+
+
+class _RawTag(T.NamedTuple):
+    tag: int
+    field_type: int
+    value_count: int
+    # offset of the values in the TIFF structure, as reported by exifread
+    field_offset: int
+    # the bytes of the values, decoded on demand
+    data: bytes
+
+
+def _decode_values(
+    data: bytes, field_type: int, count: int, little_endian: bool
+) -> T.Any:
+    if field_type == 2:
+        if count == 0:
+            return None
+        values: T.Any = data.split(b"\x00", 1)[0]
+        try:
+            return values.decode("utf-8")
+        except UnicodeDecodeError:
+            return values
+
+    if count >= 1000:
+        return []
+    # ratios are pairs of longs
+    number_format = _NUMBER_FORMATS[field_type] * (
+        count * 2 if field_type in (5, 10) else count
+    )
+    numbers = struct.unpack(("<" if little_endian else ">") + number_format, data)
+    if field_type in (5, 10):
+        return [Ratio(numbers[i], numbers[i + 1]) for i in range(0, len(numbers), 2)]
+    return list(numbers)
+
+
+def _decode_tag(raw: _RawTag, little_endian: bool) -> IfdTag:
+    values = _decode_values(raw.data, raw.field_type, raw.value_count, little_endian)
+    if raw.value_count == 1 and raw.field_type != 2:
+        printable = str(values[0])
+    else:
+        printable = str(values)
+    return IfdTag(
+        printable,
+        raw.tag,
+        raw.field_type,
+        values,
+        raw.field_offset,
+        raw.value_count * FIELD_TYPES[raw.field_type][0],
+    )
+
+
+class LazyTags(T.Mapping[str, IfdTag]):
+    """
+    The tags read by ExifRead, keyed like the tags of exifread. Only the
+    bytes of their values are held, each tag is decoded when it is first
+    looked up.
+    """
+
+    def __init__(self, raw_tags: T.Dict[str, _RawTag], little_endian: bool) -> None:
+        self._raw_tags = raw_tags
+        self._little_endian = little_endian
+        self._decoded: T.Dict[str, IfdTag] = {}
+
+    def __getitem__(self, key: str) -> IfdTag:
+        tag = self._decoded.get(key)
+        if tag is None:
+            tag = _decode_tag(self._raw_tags[key], self._little_endian)
+            self._decoded[key] = tag
+        return tag
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._raw_tags
+
+    def __iter__(self) -> T.Iterator[str]:
+        return iter(self._raw_tags)
+
+    def __len__(self) -> int:
+        return len(self._raw_tags)
+
+
+class _TiffReader:
+    """
+    Indexes the tags of the TIFF structure held in data as exifread reads
+    them
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        if data[:2] not in (b"II", b"MM"):
+            raise UnsupportedExif("unknown byte order")
+        self.little_endian = data[:2] == b"II"
+        self.raw_tags: T.Dict[str, _RawTag] = {}
+
+    def number(self, offset: int, length: int, signed: bool = False) -> int:
+        if offset < 0 or len(self.data) < offset + length:
+            # exifread would read on in the file, beyond the APP1 segment
+            raise UnsupportedExif("offset out of the EXIF segment")
+        value = self.data[offset : offset + length]
+        if self.little_endian:
+            return int.from_bytes(value, "little", signed=signed)
+        return int.from_bytes(value, "big", signed=signed)
+
+    def ifds(self) -> T.List[int]:
+        ifds: T.List[int] = []
+        ifd = self.number(4, 4)
+        while ifd:
+            if len(ifds) == MAX_IFDS:
+                raise UnsupportedExif("too many IFDs")
+            ifds.append(ifd)
+            next_ifd = self.number(ifd + 2 + 12 * self.number(ifd, 2), 4)
+            ifd = 0 if next_ifd == ifd else next_ifd
+        return ifds
+
+    def raw_values(self, entry: int, field_type: int, count: int) -> bytes:
+        type_length = FIELD_TYPES[field_type][0]
+        if field_type != 2 and count >= 1000:
+            # exifread skips the values of long arrays
+            return b""
+        offset = entry + 8
+        if count * type_length > 4:
+            offset = self.number(offset, 4)
+        length = count * type_length
+        if offset < 0 or len(self.data) < offset + length:
+            raise UnsupportedExif("offset out of the EXIF segment")
+        return self.data[offset : offset + length]
+
+    def index_ifd(self, ifd: int, ifd_name: str, tag_dict: T.Dict) -> None:
+        wanted = WANTED_TAGS.get(ifd_name, set())
+        entries = self.number(ifd, 2)
+        if len(self.data) < ifd + 2 + 12 * entries:
+            raise UnsupportedExif("IFD out of the EXIF segment")
+        entry_format = "<HHI" if self.little_endian else ">HHI"
+        for i in range(entries):
+            entry = ifd + 2 + 12 * i
+            tag, field_type, count = struct.unpack_from(entry_format, self.data, entry)
+            tag_name = _tag_name(tag_dict, tag)
+            is_gps_info = tag_dict is EXIF_TAGS and tag == GPS_INFO_TAG
+            is_exif_offset = ifd_name == "Image" and tag == EXIF_OFFSET_TAG
+            if tag_name not in wanted and not is_gps_info and not is_exif_offset:
+                continue
+
+            if not 0 < field_type < len(FIELD_TYPES):
+                # skipped by exifread too
+                continue
+            raw = _RawTag(
+                tag,
+                field_type,
+                count,
+                entry + 8,
+                self.raw_values(entry, field_type, count),
+            )
+
+            if is_gps_info:
+                values = _decode_values(raw.data, field_type, count, self.little_endian)
+                if values:
+                    self.index_ifd(values[0], "GPS", GPS_TAGS)
+                continue
+
+            self.raw_tags[f"{ifd_name} {tag_name}"] = raw
+
+    def read_tags(self) -> LazyTags:
+        for ctr, ifd in enumerate(self.ifds()):
+            if ctr == 0:
+                ifd_name = "Image"
+            elif ctr == 1:
+                ifd_name = "Thumbnail"
+            else:
+                ifd_name = f"IFD {ctr}"
+            self.index_ifd(ifd, ifd_name, EXIF_TAGS)
+        exif_offset = self.raw_tags.pop("Image ExifOffset", None)
+        if exif_offset is not None:
+            values = _decode_values(
+                exif_offset.data,
+                exif_offset.field_type,
+                exif_offset.value_count,
+                self.little_endian,
+            )
+            if not values or not isinstance(values[0], int):
+                raise UnsupportedExif("invalid EXIF offset")
+            self.index_ifd(values[0], "EXIF", EXIF_TAGS)
+        return LazyTags(self.raw_tags, self.little_endian)
+
+
+def _read_exif_segment(fp: T.Any) -> bytes:
+    """
+    Return the TIFF structure of the EXIF APP1 segment of the JPEG in fp,
+    empty if there is none
+    """
+    if fp.read(2) != b"\xff\xd8":
+        raise UnsupportedExif("not a JPEG")
+    position = 2
+    while position < MAX_HEADER_BYTES:
+        header = fp.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            raise UnsupportedExif("unexpected JPEG content")
+        marker = header[1]
+        if marker == DQT:
+            # the image data follows, exifread stops looking here too
+            return b""
+        if marker in (SOS, EOI, SOI):
+            raise UnsupportedExif("unexpected JPEG marker")
+        length = int.from_bytes(header[2:4], "big")
+        if length < 2:
+            raise UnsupportedExif("invalid segment length")
+        if marker == APP1:
+            segment = fp.read(length - 2)
+            if segment[:4] == b"Exif":
+                return segment[6:]
+        else:
+            fp.seek(length - 2, 1)
+        position += 2 + length
+    raise UnsupportedExif("no EXIF segment in the JPEG header")
+
+
+def read_tiff_tags(data: bytes) -> LazyTags:
+    """
+    Read the tags used by ExifRead from a TIFF structure, e.g. the EXIF
+    dumped by piexif without its 6 byte Exif header
+    """
+    return _TiffReader(data).read_tags()
+
+
+def read_exif_tags(
+    filename: str, use_mmap: bool = False
+) -> T.Optional[T.Mapping[str, IfdTag]]:
+    """
+    Read the tags used by ExifRead from the EXIF of the JPEG filename, None if
+    it has to be read with exifread instead. With use_mmap, the header is
+    read from a memory map of the file instead of with file reads.
+    """
+    with open(filename, "rb") as fp:
+        try:
+            if use_mmap:
+                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = _read_exif_segment(mm)
+            else:
+                data = _read_exif_segment(fp)
+            if not data:
+                return {}
+            return _TiffReader(data).read_tags()
+        except (UnsupportedExif, ValueError, TypeError, IndexError, OSError):
+            return None
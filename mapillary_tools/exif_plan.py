@@ -0,0 +1,139 @@
+import contextlib
+import os
+import threading
+import typing as T
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+from . import exif_header
+from . import exif_read
+from . import image_catalog
+from .exif_write import ExifEdit
+
+"""
+Deferred EXIF writes.
+
+Video frames get their capture time written when they are sampled and their
+image description when the process finishes, and interpolation may add more
+writes in between. While a plan is active, the stages record their EXIF changes
+in it instead of writing them, and the plan writes every image once, with all
+its changes, when it is committed.
+
+Until then, ExifRead and the image catalog serve the planned EXIF of an image,
+so the following stages see the changes as if they had been written.
+"""
+
+
+class ExifPlan:
+    """
+    The pending EXIF changes of the images, keyed by absolute path
+    """
+
+    def __init__(self, workers: T.Optional[int] = None) -> None:
+        # images written in parallel on commit
+        self.workers = workers
+        self.edits: T.Dict[str, ExifEdit] = {}
+        self._lock = threading.Lock()
+
+    def edit(self, image: str) -> ExifEdit:
+        pending = self.edits.get(os.path.abspath(image))
+        if pending is None:
+            return ExifEdit(image)
+        return pending.copy()
+
+    def record(self, exif_edit: ExifEdit) -> None:
+        image = os.path.abspath(exif_edit.filename)
+        try:
+            tags = exif_header.read_tiff_tags(exif_edit.dump()[6:])
+        except (exif_header.UnsupportedExif, ValueError, TypeError, IndexError):
+            # can not be served until written
+            with self._lock:
+                self.edits.pop(image, None)
+            exif_edit.write()
+            exif_read.clear_planned_tags(image)
+        else:
+            with self._lock:
+                self.edits[image] = exif_edit
+            exif_read.set_planned_tags(image, tags)
+        image_catalog.forget_exif(image)
+
+    def flush(self, image: str) -> None:
+        """
+        Write the pending changes of image
+        """
+        image = os.path.abspath(image)
+        with self._lock:
+            exif_edit = self.edits.pop(image, None)
+        if exif_edit is not None:
+            exif_edit.write()
+            exif_read.clear_planned_tags(image)
+
+    def commit(self) -> None:
+        """
+        Write the pending changes of all images
+        """
+        images = sorted(self.edits)
+        if not images:
+            return
+        with ThreadPoolExecutor(max_workers=self.workers or 1) as executor:
+            for _ in tqdm(
+                executor.map(self.flush, images),
+                total=len(images),
+                desc="Writing image EXIF",
+            ):
+                pass
+
+
+_ACTIVE: T.Optional[ExifPlan] = None
+
+
+@contextlib.contextmanager
+def activate(
+    plan: T.Optional[ExifPlan],
+) -> T.Generator[T.Optional[ExifPlan], None, None]:
+    """
+    Record the EXIF writes made within in plan, and commit them on exit. With
+    None, the writes made within are not deferred.
+    """
+    global _ACTIVE
+    previous = _ACTIVE
+    _ACTIVE = plan
+    try:
+        yield plan
+    finally:
+        _ACTIVE = previous
+        if plan is not None:
+            plan.commit()
+
+
+def edit(image: str) -> ExifEdit:
+    """
+    Start an EXIF edit of image, on top of its pending changes if any
+    """
+    if _ACTIVE is None:
+        return ExifEdit(image)
+    return _ACTIVE.edit(image)
+
+
+def write(exif_edit: ExifEdit, filename: T.Optional[str] = None) -> None:
+    """
+    Write the edit to filename (the edited image by default), or record it
+    in the active plan if it rewrites the edited image
+    """
+    if _ACTIVE is not None and (
+        filename is None
+        or os.path.abspath(filename) == os.path.abspath(exif_edit.filename)
+    ):
+        _ACTIVE.record(exif_edit)
+    else:
+        exif_edit.write(filename=filename)
+
+
+def commit() -> None:
+    """
+    Write the pending changes of the active plan, e.g. before the images are
+    handed over to other processes
+    """
+    if _ACTIVE is not None:
+        _ACTIVE.commit()
@@ -1,11 +1,14 @@
-from typing import List, Optional, Tuple, Type, Union, Any
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple, Type, Union
 import datetime
 import json
 import os
 import logging
+import threading
+from collections import OrderedDict
 
 import exifread
 
+from . import exif_header
 from .geo import normalize_bearing
 from exifread.utils import Ratio
 
@@ -75,19 +78,160 @@ def exif_gps_date_fields() -> List[List[str]]:
     return [["GPS GPSDate", "EXIF GPS GPSDate"]]
 
 
+# number of images whose tags are kept by the EXIF cache
+EXIF_CACHE_SIZE = 4096
+
+
+def mapillary_tags_exist(description: Dict) -> bool:
+    """
+    Check that an image description holds the required Mapillary tags
+    """
+    for requirement in [
+        "MAPCaptureTime",
+        "MAPLatitude",
+        "MAPLongitude",
+        "MAPSequenceUUID",
+        "MAPSettingsUserKey",
+    ]:
+        val = description.get(requirement)
+        if val is None:
+            return False
+        elif isinstance(val, str):
+            if not val.strip():
+                return False
+    return True
+
+
+class ExifCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class ExifTagsCache:
+    """
+    LRU cache of the EXIF tags read by ExifRead, keyed by the path and the
+    stat stamp of the image, so that a modified image is read again
+    """
+
+    def __init__(self, maxsize: int = EXIF_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # path -> (stamp, tags)
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, ...], Mapping]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, path: str, stamp: Tuple[int, ...]) -> Optional[Mapping]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path: str, stamp: Tuple[int, ...], tags: Mapping) -> None:
+        with self._lock:
+            self._entries[path] = (stamp, tags)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> ExifCacheInfo:
+        with self._lock:
+            return ExifCacheInfo(
+                self.hits, self.misses, self.maxsize, len(self._entries)
+            )
+
+
+_EXIF_CACHE = ExifTagsCache()
+
+
+def exif_cache_info() -> ExifCacheInfo:
+    """
+    Hits and misses of the EXIF cache shared by all ExifRead objects
+    """
+    return _EXIF_CACHE.info()
+
+
+def clear_exif_cache() -> None:
+    _EXIF_CACHE.clear()
+
+
+def invalidate_exif_cache(filename: str) -> None:
+    """
+    Drop the cached tags of filename, after its EXIF was written
+    """
+    _EXIF_CACHE.invalidate(os.path.abspath(filename))
+
+
+# tags of the images with EXIF changes planned but not written yet, see exif_plan
+_PLANNED_TAGS: Dict[str, Mapping] = {}
+
+
+def set_planned_tags(filename: str, tags: Mapping) -> None:
+    _PLANNED_TAGS[os.path.abspath(filename)] = tags
+
+
+def clear_planned_tags(filename: str) -> None:
+    _PLANNED_TAGS.pop(os.path.abspath(filename), None)
+
+
+def _read_tags(filename: str, use_mmap: bool = False) -> Mapping:
+    # only the tags used below, from the JPEG header
+    tags = exif_header.read_exif_tags(filename, use_mmap=use_mmap)
+    if tags is None:
+        with open(filename, "rb") as fp:
+            tags = exifread.process_file(fp, details=False)
+    return tags
+
+
 class ExifRead:
     """
     EXIF class for reading exif from an image
     """
 
-    def __init__(self, filename: str, details: bool = False) -> None:
+    def __init__(
+        self, filename: str, details: bool = False, use_mmap: bool = False
+    ) -> None:
         """
         Initialize EXIF object with FILE as filename or fileobj
         """
         self.filename = filename
-        if isinstance(filename, str):
+        if isinstance(filename, str) and details:
             with open(filename, "rb") as fp:
                 self.tags = exifread.process_file(fp, details=details)
+        elif isinstance(filename, str):
+            path = os.path.abspath(filename)
+            planned = _PLANNED_TAGS.get(path)
+            if planned is not None:
+                self.tags = planned
+                return
+            stat = os.stat(path)
+            # the ctime is updated by any write and cannot be set back, and
+            # the inode changes when the file is replaced, so a rewrite is
+            # noticed even where the mtime is too coarse to change
+            stamp = (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_ino)
+            tags = _EXIF_CACHE.get(path, stamp)
+            if tags is None:
+                tags = _read_tags(filename, use_mmap=use_mmap)
+                _EXIF_CACHE.put(path, stamp, tags)
+            self.tags = tags
         else:
             self.tags = exifread.process_file(filename, details=details)
 
@@ -324,17 +468,4 @@ class ExifRead:
             LOG.warning(f"Error JSON decoding ImageDescription: {description}")
             return False
 
-        for requirement in [
-            "MAPCaptureTime",
-            "MAPLatitude",
-            "MAPLongitude",
-            "MAPSequenceUUID",
-            "MAPSettingsUserKey",
-        ]:
-            val = description_values.get(requirement)
-            if val is None:
-                return False
-            elif isinstance(val, str):
-                if not val.strip():
-                    return False
-        return True
+        return mapillary_tags_exist(description_values)
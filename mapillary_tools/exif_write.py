@@ -1,10 +1,333 @@
+import copy
+import io
 import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import typing as T
 
 import piexif
 
+from . import exif_read
 from .error import print_error
 from .geo import decimal_to_dms
 
+# largest payload of a JPEG segment
+MAX_SEGMENT_LENGTH = 0xFFFF - 2
+# copied at once when splicing files
+COPY_CHUNK_SIZE = 1024 * 1024
+# ioctls cloning a file, or a block aligned range of it, with a reflink on
+# Linux (btrfs, xfs)
+FICLONE = 0x40049409
+FICLONE_RANGE = 0x4020940D
+
+
+class SegmentLocation(T.NamedTuple):
+    # offset of the EXIF APP1 segment, or where to insert one
+    offset: int
+    # length of the segment including its marker, 0 if there is none
+    length: int
+
+
+def locate_exif_segment(fp: T.BinaryIO) -> T.Optional[SegmentLocation]:
+    """
+    Find the EXIF APP1 segment of the JPEG in fp by walking the segment
+    headers, None if fp is not a JPEG this can handle
+    """
+    if fp.read(2) != b"\xff\xd8":
+        return None
+    offset = 2
+    insert_at = None
+    while True:
+        header = fp.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            return None
+        if header[1] == 0xDA:
+            # start of scan without an EXIF segment
+            return SegmentLocation(2 if insert_at is None else insert_at, 0)
+        (length,) = struct.unpack(">H", header[2:4])
+        if length < 2:
+            return None
+        if header[1] == 0xE1:
+            if fp.read(6) == b"Exif\x00\x00":
+                return SegmentLocation(offset, length + 2)
+            fp.seek(offset + 2 + length)
+        else:
+            fp.seek(length - 2, 1)
+        if insert_at is None:
+            # a JFIF APP0 segment has to stay the first one
+            insert_at = offset + 2 + length if header[1] == 0xE0 else 2
+        offset += 2 + length
+
+
+class CopyInfo(T.NamedTuple):
+    # copies written to another file, e.g. the processed images kept apart
+    # from the originals, as reflink clones and as regular copies
+    cloned: int
+    copied: int
+    # bytes the clones share with their source instead of taking up
+    bytes_saved: int
+
+
+_COPY_INFO = CopyInfo(0, 0, 0)
+_COPY_INFO_LOCK = threading.Lock()
+
+
+def copy_info() -> CopyInfo:
+    """
+    The copies written since the last reset_copy_info
+    """
+    return _COPY_INFO
+
+
+def reset_copy_info() -> None:
+    global _COPY_INFO
+    with _COPY_INFO_LOCK:
+        _COPY_INFO = CopyInfo(0, 0, 0)
+
+
+def add_copy_info(info: CopyInfo) -> None:
+    """
+    Count copies written elsewhere, e.g. in worker processes
+    """
+    global _COPY_INFO
+    with _COPY_INFO_LOCK:
+        _COPY_INFO = CopyInfo(
+            _COPY_INFO.cloned + info.cloned,
+            _COPY_INFO.copied + info.copied,
+            _COPY_INFO.bytes_saved + info.bytes_saved,
+        )
+
+
+def clone_file(source: str, target: str) -> bool:
+    """
+    Clone source to target with a reflink, so that both share their blocks
+    until either is modified. Falls back to a regular copy where reflinks
+    are not supported. Returns whether target is a clone.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # not on Windows
+        fcntl = None  # type: ignore
+    if fcntl is not None:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return True
+            except OSError:
+                # e.g. ext4, or source and target on different file systems
+                pass
+    shutil.copyfile(source, target)
+    return False
+
+
+def _clone_range(
+    src: T.BinaryIO, dst: T.BinaryIO, src_offset: int, dest_offset: int
+) -> bool:
+    """
+    Clone src from the block aligned src_offset to its end into dst at the
+    block aligned dest_offset with a reflink. Returns whether it is supported.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    src.flush()
+    dst.flush()
+    # struct file_clone_range, a length of 0 clones to the end of src
+    args = struct.pack("=qQQQ", src.fileno(), src_offset, 0, dest_offset)
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE_RANGE, args)
+    except OSError:
+        return False
+    return True
+
+
+def _copy_range(src: T.BinaryIO, dst: T.BinaryIO, offset: int, count: int) -> None:
+    src.flush()
+    dst.flush()
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while count > 0:
+                copied = copy_file_range(src.fileno(), dst.fileno(), count, offset)
+                if copied == 0:
+                    return
+                offset += copied
+                count -= copied
+            dst.seek(0, os.SEEK_END)
+            return
+        except OSError:
+            # e.g. not supported between these file systems
+            dst.seek(0, os.SEEK_END)
+    src.seek(offset)
+    while count > 0:
+        chunk = src.read(min(count, COPY_CHUNK_SIZE))
+        if not chunk:
+            return
+        dst.write(chunk)
+        count -= len(chunk)
+
+
+def _write_at(path: str, offset: int, data: bytes) -> None:
+    if not hasattr(os, "pwrite"):
+        with open(path, "r+b") as fp:
+            fp.seek(offset)
+            fp.write(data)
+        return
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        written = 0
+        while written < len(data):
+            written += os.pwrite(fd, data[written:], offset + written)
+    finally:
+        os.close(fd)
+
+
+def _exif_segment(exif_bytes: bytes, length: int) -> bytes:
+    # the APP1 segment of exif_bytes padded to length, with its marker, the
+    # padding is never pointed to by the EXIF offsets
+    padded = exif_bytes + b"\x00" * (length - 4 - len(exif_bytes))
+    return b"\xff\xe1" + struct.pack(">H", len(padded) + 2) + padded
+
+
+def _clone_shifted(
+    source: str, target: str, location: SegmentLocation, segment: bytes, block: int
+) -> bool:
+    """
+    Write source to target with segment in place of the EXIF segment, where
+    segment is longer by a whole number of blocks, so that the image data
+    after it is cloned with a reflink. Returns False where reflinks are not
+    supported.
+    """
+    tail = location.offset + location.length
+    shift = len(segment) - location.length
+    # the clone starts at the block of source holding the end of the segment
+    clone_start = tail // block * block
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        head = src.read(location.offset) + segment
+        dst.write(head)
+        if not _clone_range(src, dst, clone_start, clone_start + shift):
+            return False
+        # the first cloned block starts with the end of the old segment
+        dst.seek(clone_start + shift)
+        dst.write(head[clone_start + shift :])
+    return True
+
+
+def _splice(
+    source: str, target: str, location: SegmentLocation, exif_bytes: bytes
+) -> None:
+    """
+    Write the JPEG source to target with exif_bytes in place of the EXIF
+    segment. If the new segment fits in the EXIF segment, source is cloned and
+    the clone patched, so that a reflink clone shares all but the blocks of
+    the segment with source. If it does not fit and target is another file, it
+    is padded to move the image data after it by whole blocks, which are then
+    cloned from source.
+    """
+    size = os.path.getsize(source)
+    # replace the file a symlink points to, not the symlink
+    target = os.path.realpath(target)
+    copy = not (os.path.exists(target) and os.path.samefile(source, target))
+    block = os.stat(source).st_blksize or 4096
+    segment_length = 4 + len(exif_bytes)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+    os.close(fd)
+    try:
+        cloned = False
+        # the first byte of source that is not shared with target
+        unshared_from = location.offset
+        if location.length and segment_length <= location.length:
+            cloned = clone_file(source, tmp_path)
+            _write_at(
+                tmp_path, location.offset, _exif_segment(exif_bytes, location.length)
+            )
+        else:
+            # grown by whole blocks
+            blocks = -(-(segment_length - location.length) // block)
+            padded_length = location.length + blocks * block
+            if copy and padded_length <= MAX_SEGMENT_LENGTH + 4:
+                cloned = _clone_shifted(
+                    source,
+                    tmp_path,
+                    location,
+                    _exif_segment(exif_bytes, padded_length),
+                    block,
+                )
+                unshared_from = 0
+            if not cloned:
+                with open(source, "rb") as src, open(tmp_path, "wb") as dst:
+                    _copy_range(src, dst, 0, location.offset)
+                    dst.write(_exif_segment(exif_bytes, segment_length))
+                    tail = location.offset + location.length
+                    _copy_range(src, dst, tail, size - tail)
+        shutil.copymode(source, tmp_path)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if not copy:
+        return
+    bytes_saved = 0
+    if cloned:
+        # the blocks of source up to the end of the segment are not shared
+        first = unshared_from // block
+        last = -(-(location.offset + location.length) // block)
+        bytes_saved = max(0, size - (last - first) * block)
+    add_copy_info(CopyInfo(int(cloned), int(not cloned), bytes_saved))
+
+
+def write_exif_segment(source: str, exif_bytes: bytes, target: str) -> bool:
+    """
+    Write the JPEG source with the EXIF exif_bytes (as dumped by piexif) to
+    target, rewriting only the EXIF APP1 segment. If the new segment fits in
+    the old one, it is patched in place (of a clone of source if target is
+    another file) and the rest of the file is not touched; the space left is
+    padded, which the EXIF offsets never point to. Otherwise the file is
+    spliced into a copy, which shares the image data with source where
+    reflinks are supported. Returns False if source can not be handled this
+    way.
+    """
+    if len(exif_bytes) > MAX_SEGMENT_LENGTH:
+        return False
+    with open(source, "rb") as fp:
+        location = locate_exif_segment(fp)
+    if location is None:
+        return False
+
+    in_place = os.path.exists(target) and os.path.samefile(source, target)
+    if in_place and location.length and 4 + len(exif_bytes) <= location.length:
+        _write_at(source, location.offset, _exif_segment(exif_bytes, location.length))
+    else:
+        _splice(source, target, location, exif_bytes)
+    return True
+
+
+def write_image_with_exif(source: str, exif_bytes: bytes, dst: T.IO[bytes]) -> None:
+    """
+    Write the JPEG source with the EXIF exif_bytes (as dumped by piexif) to
+    the stream dst, e.g. a zip entry, leaving source untouched. Only the EXIF
+    APP1 segment is built in memory, the rest is copied in chunks.
+    """
+    with open(source, "rb") as src:
+        location = locate_exif_segment(src)
+        src.seek(0)
+        if location is None or len(exif_bytes) > MAX_SEGMENT_LENGTH:
+            output = io.BytesIO()
+            piexif.insert(exif_bytes, src.read(), output)
+            dst.write(output.getvalue())
+            return
+        dst.write(src.read(location.offset))
+        dst.write(b"\xff\xe1" + struct.pack(">H", len(exif_bytes) + 2) + exif_bytes)
+        src.seek(location.offset + location.length)
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
 
 class ExifEdit:
     _filename: str
@@ -72,24 +395,45 @@ class ExifEdit:
         )
         self._ef["GPS"][piexif.GPSIFD.GPSImgDirectionRef] = ref
 
-    def write(self, filename=None):
-        """Save exif data to file."""
-        if filename is None:
-            filename = self._filename
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    def copy(self) -> "ExifEdit":
+        """Return an independent copy of the edit, without reading the file."""
+        exif_edit = ExifEdit.__new__(ExifEdit)
+        exif_edit._filename = self._filename
+        exif_edit._ef = copy.deepcopy(self._ef)
+        return exif_edit
 
+    def dump(self) -> bytes:
+        """Return the exif data as bytes."""
         try:
-            exif_bytes = piexif.dump(self._ef)
+            return piexif.dump(self._ef)
         except piexif.InvalidImageDataError:
             if self._ef.get("thumbnail") == b"":
                 # workaround https://github.com/hMatoba/Piexif/issues/30
                 del self._ef["thumbnail"]
                 if "1st" in self._ef:
                     del self._ef["1st"]
-                exif_bytes = piexif.dump(self._ef)
+                return piexif.dump(self._ef)
             else:
                 raise
 
-        with open(self._filename, "rb") as fp:
-            img = fp.read()
+    def write_to(self, dst: T.IO[bytes]) -> None:
+        """Write the image with the exif data to dst, without modifying the file."""
+        write_image_with_exif(self._filename, self.dump(), dst)
+
+    def write(self, filename=None):
+        """Save exif data to file."""
+        if filename is None:
+            filename = self._filename
+
+        exif_bytes = self.dump()
+
+        if not write_exif_segment(self._filename, exif_bytes, filename):
+            with open(self._filename, "rb") as fp:
+                img = fp.read()
 
-        piexif.insert(exif_bytes, img, filename)
+            piexif.insert(exif_bytes, img, filename)
+        exif_read.invalidate_exif_cache(filename)
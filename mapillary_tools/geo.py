@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
 
+import bisect
+import csv
 import datetime
 import math
 import logging
+import threading
 
 import pytz
-from typing import Any, List, Tuple
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from .gps_trace import TRACE_MAGIC, TRACE_RECORD, GpsTrace, to_microseconds
 
 WGS84_a = 6378137.0
 WGS84_b = 6356752.314245
@@ -49,6 +64,138 @@ def gps_distance(latlon_1: Tuple[float, float], latlon_2: Tuple[float, float]) -
     return dis
 
 
+def _numpy():
+    """
+    Return numpy if it is installed. The array functions below compute the
+    same values with the scalar functions without it.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def ecef_from_lla_array(lats, lons, alts):
+    """
+    Compute the ECEF X, Y and Z arrays of latitude, longitude and altitude
+    arrays, see ecef_from_lla.
+    """
+    np = _numpy()
+    if np is None:
+        xs, ys, zs = [], [], []
+        for lat, lon, alt in zip(lats, lons, alts):
+            x, y, z = ecef_from_lla(lat, lon, alt)
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+        return xs, ys, zs
+    a2 = WGS84_a * WGS84_a
+    b2 = WGS84_b * WGS84_b
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    alt = np.asarray(alts, dtype=float)
+    cos_lat = np.cos(lat)
+    sin_lat = np.sin(lat)
+    L = 1.0 / np.sqrt(a2 * cos_lat * cos_lat + b2 * sin_lat * sin_lat)
+    x = (a2 * L + alt) * cos_lat * np.cos(lon)
+    y = (a2 * L + alt) * cos_lat * np.sin(lon)
+    z = (b2 * L + alt) * sin_lat
+    return x, y, z
+
+
+def _ecef_from_latlons(np, latlons: Sequence[Any]):
+    # building the arrays from the lists of floats is faster than from the
+    # (lat, lon) pairs
+    lats = np.array([latlon[0] for latlon in latlons], dtype=float)
+    lons = np.array([latlon[1] for latlon in latlons], dtype=float)
+    return np.stack(ecef_from_lla_array(lats, lons, np.zeros(len(lats))), axis=-1)
+
+
+def _norms(np, deltas) -> List[float]:
+    return np.sqrt(np.einsum("ij,ij->i", deltas, deltas)).tolist()
+
+
+def gps_distances(latlons_1: Sequence[Any], latlons_2: Sequence[Any]) -> List[float]:
+    """
+    Distances between the (lat, lon) pairs of latlons_1 and latlons_2, pair
+    by pair.
+
+    >>> p1 = (42.1, -11.1)
+    >>> p2 = (42.2, -11.3)
+    >>> [round(d) for d in gps_distances([p1, p1], [p1, p2])]
+    [0, 19916]
+    """
+    np = _numpy()
+    n = min(len(latlons_1), len(latlons_2))
+    if np is None or not n:
+        return [gps_distance(ll1, ll2) for ll1, ll2 in zip(latlons_1, latlons_2)]
+    return _norms(
+        np,
+        _ecef_from_latlons(np, latlons_1[:n]) - _ecef_from_latlons(np, latlons_2[:n]),
+    )
+
+
+def gps_distances_from(latlon: Any, latlons: Sequence[Any]) -> List[float]:
+    """
+    Distances from the (lat, lon) pair latlon to each pair of latlons
+    """
+    np = _numpy()
+    if np is None or not len(latlons):
+        return [gps_distance(latlon, ll) for ll in latlons]
+    ecef = _ecef_from_latlons(np, [latlon])
+    return _norms(np, ecef - _ecef_from_latlons(np, latlons))
+
+
+def consecutive_gps_distances(latlons: Sequence[Any]) -> List[float]:
+    """
+    Distances between consecutive (lat, lon) pairs of a track
+    """
+    np = _numpy()
+    if np is None or len(latlons) < 2:
+        return [gps_distance(ll1, ll2) for ll1, ll2 in zip(latlons, latlons[1:])]
+    ecef = _ecef_from_latlons(np, latlons)
+    return _norms(np, ecef[:-1] - ecef[1:])
+
+
+class SpatialGrid:
+    """
+    Uniform grid over the ECEF coordinates of locations, in cubic cells of
+    cell_size meters, to find the items added near a location in constant
+    time
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        if cell_size <= 0:
+            raise ValueError(f"cell_size must be positive but got {cell_size}")
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int, int], List[Any]] = {}
+
+    def _cell(self, latlon: Sequence[float]) -> Tuple[int, int, int]:
+        x, y, z = ecef_from_lla(latlon[0], latlon[1], 0.0)
+        return (
+            math.floor(x / self.cell_size),
+            math.floor(y / self.cell_size),
+            math.floor(z / self.cell_size),
+        )
+
+    def add(self, latlon: Sequence[float], item: Any) -> None:
+        self._cells.setdefault(self._cell(latlon), []).append(item)
+
+    def neighbors(self, latlon: Sequence[float]) -> List[Any]:
+        """
+        Return the items added within cell_size meters (as gps_distance) of
+        latlon, and possibly some farther ones
+        """
+        x, y, z = self._cell(latlon)
+        items: List[Any] = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    items.extend(self._cells.get((x + dx, y + dy, z + dz), ()))
+        return items
+
+
 def get_max_distance_from_start(latlon_track):
     """
     Returns the radius of an entire GPS track. Used to calculate whether or not the entire sequence was just stationary video
@@ -63,12 +210,7 @@ def get_max_distance_from_start(latlon_track):
         latlon_list.append([lat, lon, alt])
 
     start_position = latlon_list[0]
-    max_distance = 0
-    for position in latlon_list:
-        distance = gps_distance(start_position, position)
-        if distance > max_distance:
-            max_distance = distance
-    return max_distance
+    return max([0] + gps_distances_from(start_position, latlon_list))
 
 
 def get_total_distance_traveled(latlon_track):
@@ -84,17 +226,20 @@ def get_total_distance_traveled(latlon_track):
         alt = latlon_track[idx][3]
         latlon_list.append([lat, lon, alt])
 
-    total_distance = 0
-    last_position = latlon_list[0]
-    for position in latlon_list:
-        total_distance += gps_distance(last_position, position)
-        last_position = position
-    return total_distance
+    return sum(consecutive_gps_distances(latlon_list))
 
 
 def gps_speed(distance: List[Any], delta_t: List[Any]) -> List[Any]:
     # Most timestamps have 1 second resolution so change zeros in delta_t for
     # 0.5 so that we don't divide by zero
+    np = _numpy()
+    if np is not None:
+        if not len(distance) or not len(delta_t):
+            return []
+        n = min(len(distance), len(delta_t))
+        delta_t_array = np.asarray(delta_t[:n], dtype=float)
+        delta_t_array[delta_t_array == 0] = 0.5
+        return (np.asarray(distance[:n], dtype=float) / delta_t_array).tolist()
     delta_t_corrected = [0.5 if x == 0 else x for x in delta_t]
     speed = [
         distance / delta_t_corrected
@@ -162,6 +307,37 @@ def compute_bearing(start_lat, start_lon, end_lat, end_lon) -> float:
     return bearing
 
 
+def consecutive_bearings(latlons: Sequence[Any]) -> List[float]:
+    """
+    Compass bearings between consecutive (lat, lon) pairs of a track, see
+    compute_bearing.
+
+    >>> [round(b) for b in consecutive_bearings([(0, 0), (1, 0), (1, 1), (0, 1)])]
+    [0, 90, 180]
+    """
+    np = _numpy()
+    if np is None or len(latlons) < 2:
+        return [
+            compute_bearing(ll1[0], ll1[1], ll2[0], ll2[1])
+            for ll1, ll2 in zip(latlons[:-1], latlons[1:])
+        ]
+    lats = np.radians(np.array([latlon[0] for latlon in latlons], dtype=float))
+    lons = np.radians(np.array([latlon[1] for latlon in latlons], dtype=float))
+    start_lat = lats[:-1]
+    end_lat = lats[1:]
+    dLong = lons[1:] - lons[:-1]
+    dLong = np.where(
+        dLong > math.pi,
+        -(2.0 * math.pi - dLong),
+        np.where(dLong < -math.pi, 2.0 * math.pi + dLong, dLong),
+    )
+    y = np.sin(dLong) * np.cos(end_lat)
+    x = np.cos(start_lat) * np.sin(end_lat) - np.sin(start_lat) * np.cos(
+        end_lat
+    ) * np.cos(dLong)
+    return ((np.degrees(np.arctan2(y, x)) + 360.0) % 360.0).tolist()
+
+
 def diff_bearing(b1, b2):
     """
     Compute difference between two bearings
@@ -197,12 +373,32 @@ class MapillaryInterpolationError(RuntimeError):
     pass
 
 
-def interpolate_lat_lon(points: list, t: datetime.datetime, tolerant=10):
+class _TraceTimes(Sequence[datetime.datetime]):
     """
-    Return interpolated lat, lon and compass bearing for time t.
+    The times of the trace points, for bisecting the trace without copying them
+    """
+
+    def __init__(self, points: Sequence[Any]) -> None:
+        self.points = points
+
+    def __getitem__(self, i):
+        return self.points[i][0]
+
+    def __len__(self) -> int:
+        return len(self.points)
 
-    Points is a list of tuples (time, lat, lon, elevation), t a datetime object.
+
+def _time_keys(points: Sequence[Any], times: Sequence[datetime.datetime]):
+    """
+    The keys to bisect the trace by for the trace and for times. The times of
+    a GpsTrace are compared as integers, without building datetimes.
     """
+    if isinstance(points, GpsTrace):
+        return points.times, [to_microseconds(t) for t in times]
+    return _TraceTimes(points), times
+
+
+def _check_trace(points: Sequence[Any], tolerant) -> None:
     if tolerant < 0:
         raise ValueError(f"tolerant must be non-negative in seconds but got {tolerant}")
 
@@ -214,17 +410,22 @@ def interpolate_lat_lon(points: list, t: datetime.datetime, tolerant=10):
             f"Expect trace's start time {min_time} <= trace's end time {max_time}"
         )
 
+
+def _interpolate_at(
+    points: Sequence[Any], t: datetime.datetime, after_idx: int, tolerant
+) -> Tuple[float, float, float, Any]:
+    """
+    Interpolate the point at time t of the trace, where after_idx is the index
+    of the first point later than t
+    """
+    min_time: datetime.datetime = points[0][0]
+    max_time: datetime.datetime = points[-1][0]
+
     max_dt = datetime.timedelta(seconds=tolerant)
 
     if min_time < t < max_time:
-        for i, point in enumerate(points):
-            if t < point[0]:
-                if i > 0:
-                    before = points[i - 1]
-                else:
-                    before = points[i]
-                after = points[i]
-                break
+        before = points[after_idx - 1]
+        after = points[after_idx]
     else:
         if t < min_time - max_dt:
             raise MapillaryInterpolationError(
@@ -278,38 +479,252 @@ def interpolate_lat_lon(points: list, t: datetime.datetime, tolerant=10):
     return lat, lon, bearing, ele
 
 
-def write_gpx(filename, gps_trace):
-    time_format = "%Y-%m-%dT%H:%M:%S.%f"
-    gpx = "<gpx>" + "\n"
-    gpx += "<trk>" + "\n"
-    gpx += "<name>Mapillary GPX</name>" + "\n"
-    gpx += "<trkseg>" + "\n"
+def interpolate_lat_lon(points: Sequence[Any], t: datetime.datetime, tolerant=10):
+    """
+    Return interpolated lat, lon and compass bearing for time t.
+
+    Points is a GpsTrace or a list of tuples (time, lat, lon, elevation),
+    sorted by time, t a datetime object.
+    """
+    _check_trace(points, tolerant)
+    point_keys, keys = _time_keys(points, [t])
+    return _interpolate_at(
+        points, t, bisect.bisect_right(point_keys, keys[0]), tolerant
+    )
+
+
+def interpolate_lat_lons(
+    points: Sequence[Any], times: Sequence[datetime.datetime], tolerant=10
+) -> List[Any]:
+    """
+    Interpolate the trace at all the times in one walk along the trace.
+
+    Return the result of interpolate_lat_lon for each time, in the order of
+    times, or the MapillaryInterpolationError it would raise. Times are best
+    sorted but need not be.
+    """
+    _check_trace(points, tolerant)
+    point_keys, keys = _time_keys(points, times)
+    results: List[Any] = [None] * len(times)
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    after_idx = 0
+    for i in order:
+        # the first point later than the time
+        while after_idx < len(point_keys) and not keys[i] < point_keys[after_idx]:
+            after_idx += 1
+        try:
+            results[i] = _interpolate_at(points, times[i], after_idx, tolerant)
+        except MapillaryInterpolationError as ex:
+            results[i] = ex
+    return results
+
+
+def _trace_points(gps_trace: Iterable[Any]) -> Iterator[Any]:
+    """
+    Yield the (time, lat, lon, elevation) points of gps_trace, skipping the
+    points without a position
+    """
     for point in gps_trace:
         lat = point[1]
         lon = point[2]
         if lat == 0 or lon == 0:
             continue
-        time = datetime.datetime.strftime(point[0], time_format)[:-3]
-        elevation = point[3] if len(point) > 3 else 0
-        gpx += '<trkpt lat="' + str(lat) + '" lon="' + str(lon) + '">' + "\n"
-        gpx += "<ele>" + str(elevation) + "</ele>" + "\n"
-        gpx += "<time>" + time + "</time>" + "\n"
-        gpx += "</trkpt>" + "\n"
-    gpx += "</trkseg>" + "\n"
-    gpx += "</trk>" + "\n"
-    gpx += "</gpx>" + "\n"
+        yield point[0], lat, lon, point[3] if len(point) > 3 else None
+
+
+def write_gpx(filename, gps_trace: Iterable[Any]) -> None:
+    """
+    Write a GPS trace to a GPX file. The points, (time, lat, lon[, elevation])
+    tuples, are written as they are iterated, so gps_trace can be a generator.
+    """
+    time_format = "%Y-%m-%dT%H:%M:%S.%f"
     with open(filename, "w") as fout:
-        fout.write(gpx)
+        fout.write("<gpx>\n<trk>\n<name>Mapillary GPX</name>\n<trkseg>\n")
+        for time, lat, lon, elevation in _trace_points(gps_trace):
+            fout.write(
+                f'<trkpt lat="{lat}" lon="{lon}">\n'
+                f"<ele>{0 if elevation is None else elevation}</ele>\n"
+                f"<time>{time.strftime(time_format)[:-3]}</time>\n"
+                "</trkpt>\n"
+            )
+        fout.write("</trkseg>\n</trk>\n</gpx>\n")
 
 
-def get_timezone_and_utc_offset(lat, lon):
-    # TODO Importing inside function because tzwhere is a temporary solution and dependency fails to install on windows
-    from tzwhere import tzwhere
+def write_trace_csv(filename, gps_trace: Iterable[Any]) -> None:
+    """
+    Write a GPS trace to a CSV file of time, lat, lon and elevation (empty
+    if unknown), see write_gpx
+    """
+    with open(filename, "w", newline="") as fout:
+        writer = csv.writer(fout)
+        writer.writerow(["time", "lat", "lon", "elevation"])
+        for time, lat, lon, elevation in _trace_points(gps_trace):
+            writer.writerow(
+                [time.strftime("%Y-%m-%dT%H:%M:%S.%f"), lat, lon, elevation]
+            )
+
+
+def write_trace_binary(filename, gps_trace: Iterable[Any]) -> None:
+    """
+    Write a GPS trace to a binary trace file, see write_gpx. The file is the
+    TRACE_MAGIC header followed by a TRACE_RECORD per point, and is read with
+    gps_parser.get_lat_lon_time_from_binary.
+    """
+    with open(filename, "wb") as fout:
+        fout.write(TRACE_MAGIC)
+        for time, lat, lon, elevation in _trace_points(gps_trace):
+            fout.write(
+                TRACE_RECORD.pack(
+                    to_microseconds(time),
+                    lat,
+                    lon,
+                    math.nan if elevation is None else elevation,
+                )
+            )
+
+
+def _tzwhere_polygon_rings(tz) -> Any:
+    """
+    Return a function of the timezone polygon rings, sequences of (lon, lat)
+    points, that tz.tzNameAt considers in the square of a degree at lat, lon
+    """
+
+    def polygon_rings(lat: int, lon: int) -> Iterator[Sequence[Any]]:
+        # the same polygons as tzNameAt, from its index of the polygons per
+        # degree of latitude and longitude
+        lat_options = tz.timezoneLatitudeShortcuts.get(str(float(lat)), {})
+        lon_options = tz.timezoneLongitudeShortcuts.get(str(float(lon)), {})
+        for name in set(lat_options).intersection(lon_options):
+            polygons = tz.timezoneNamesToPolygons[name]
+            for index in set(lat_options[name]).intersection(lon_options[name]):
+                # tzNameAt replaces the (exterior, interiors) rings of a
+                # timezone with prepared shapely polygons on its first lookup
+                polygon = getattr(polygons[index], "context", polygons[index])
+                if hasattr(polygon, "exterior"):
+                    yield polygon.exterior.coords
+                    for interior in polygon.interiors:
+                        yield interior.coords
+                else:
+                    yield polygon[0]
+                    yield from polygon[1]
+
+    return polygon_rings
 
-    tz = tzwhere.tzwhere(
-        forceTZ=True
-    )  # TODO: This library takes 2 seconds to initialize. Should be done only once if used for many videos
-    timezone_str = tz.tzNameAt(lat, lon)
+
+class TimezoneResolver:
+    """
+    Resolve the timezone names of locations with tzwhere, which takes seconds
+    to load its timezone polygons, so it is loaded once, on the first lookup.
+    The names are cached per cell of a grid of cell_size degrees, for the
+    cells that no timezone border crosses: those that the bounding box of no
+    edge of a timezone polygon overlaps. The whole cell is then in the
+    timezone of the location looked up. In the other cells every location is
+    looked up.
+    """
+
+    def __init__(
+        self, cell_size: float = 0.01, tz_name_at=None, polygon_rings=None
+    ) -> None:
+        self.cell_size = cell_size
+        # looks up the timezone name at lat, lon
+        self._tz_name_at = tz_name_at
+        # returns the timezone polygon rings in the square of a degree at lat,
+        # lon, see _tzwhere_polygon_rings; without it no cell is cached
+        self._polygon_rings = polygon_rings
+        # the name of the cells without a border, the cells on a border map
+        # to the names of the locations looked up in them
+        self._cells: Dict[Tuple[int, int], Any] = {}
+        # the cells the polygon edges overlap, in the degree squares indexed
+        self._border_cells: Set[Tuple[int, int]] = set()
+        self._squares: Set[Tuple[int, int]] = set()
+        self._lock = threading.Lock()
+
+    def _lookup(self):
+        with self._lock:
+            if self._tz_name_at is None:
+                # TODO Importing inside function because tzwhere is a temporary solution and dependency fails to install on windows
+                from tzwhere import tzwhere
+
+                tz = tzwhere.tzwhere(forceTZ=True)
+                self._tz_name_at = tz.tzNameAt
+                self._polygon_rings = _tzwhere_polygon_rings(tz)
+            return self._tz_name_at
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def _index_square(self, square: Tuple[int, int]) -> None:
+        # mark the cells of the square that the bounding boxes of the polygon
+        # edges overlap
+        lat0, lon0 = square
+        first = self._cell(lat0, lon0)
+        last = self._cell(lat0 + 1, lon0 + 1)
+        for ring in self._polygon_rings(lat0, lon0):
+            for (lon1, lat1), (lon2, lat2) in zip(ring, ring[1:]):
+                if (
+                    max(lat1, lat2) < lat0
+                    or lat0 + 1 < min(lat1, lat2)
+                    or max(lon1, lon2) < lon0
+                    or lon0 + 1 < min(lon1, lon2)
+                ):
+                    continue
+                low = self._cell(min(lat1, lat2), min(lon1, lon2))
+                high = self._cell(max(lat1, lat2), max(lon1, lon2))
+                for i in range(max(low[0], first[0]), min(high[0], last[0]) + 1):
+                    for j in range(max(low[1], first[1]), min(high[1], last[1]) + 1):
+                        self._border_cells.add((i, j))
+        self._squares.add(square)
+
+    def _on_border(self, cell: Tuple[int, int]) -> bool:
+        if self._polygon_rings is None:
+            return True
+        # the degree squares the cell, edges included, is in
+        lat_range = range(
+            math.floor(cell[0] * self.cell_size),
+            math.floor((cell[0] + 1) * self.cell_size) + 1,
+        )
+        lon_range = range(
+            math.floor(cell[1] * self.cell_size),
+            math.floor((cell[1] + 1) * self.cell_size) + 1,
+        )
+        for square in ((lat, lon) for lat in lat_range for lon in lon_range):
+            if square not in self._squares:
+                self._index_square(square)
+        return cell in self._border_cells
+
+    def timezone_at(self, lat: float, lon: float) -> Optional[str]:
+        """
+        Return the timezone name at lat, lon, None if it is unknown
+        """
+        cell = self._cell(lat, lon)
+        cached = self._cells.get(cell)
+        if isinstance(cached, dict):
+            if (lat, lon) not in cached:
+                cached[(lat, lon)] = self._lookup()(lat, lon)
+            return cached[(lat, lon)]
+        if cell in self._cells:
+            return cached
+
+        name = self._lookup()(lat, lon)
+        if self._on_border(cell):
+            self._cells[cell] = {(lat, lon): name}
+        else:
+            self._cells[cell] = name
+        return name
+
+    def timezones_at(self, latlons: Iterable[Any]) -> List[Optional[str]]:
+        """
+        Return the timezone names at the (lat, lon) locations, None where it
+        is unknown
+        """
+        return [self.timezone_at(lat, lon) for lat, lon in latlons]
+
+
+_TIMEZONE_RESOLVER = TimezoneResolver()
+
+
+def get_timezone_and_utc_offset(lat, lon):
+    timezone_str = _TIMEZONE_RESOLVER.timezone_at(lat, lon)
     if timezone_str is not None:
         timezone = pytz.timezone(timezone_str)
         dt = datetime.datetime.utcnow()
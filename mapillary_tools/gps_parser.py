@@ -3,8 +3,8 @@
 import datetime
 
 from .geo import utc_to_localtime
+from .gps_trace import TRACE_MAGIC, TRACE_RECORD, GpsTrace
 
-import typing as T
 import gpxpy
 import pynmea2
 
@@ -13,13 +13,11 @@ Methods for parsing gps data from various file format e.g. GPX, NMEA, SRT.
 """
 
 
-def get_lat_lon_time_from_gpx(
-    gpx_file, local_time=True
-) -> T.List[T.Tuple[datetime.datetime, float, float, float]]:
+def get_lat_lon_time_from_gpx(gpx_file, local_time=True) -> GpsTrace:
     """
     Read location and time stamps from a track in a GPX file.
 
-    Returns a list of tuples (time, lat, lon).
+    Returns a GpsTrace of (time, lat, lon, elevation).
 
     GPX stores time in UTC, by default we assume your camera used the local time
     and convert accordingly.
@@ -27,17 +25,17 @@ def get_lat_lon_time_from_gpx(
     with open(gpx_file, "r") as f:
         gpx = gpxpy.parse(f)
 
-    points = []
+    points = GpsTrace()
     if len(gpx.tracks) > 0:
         for track in gpx.tracks:
             for segment in track.segments:
                 for point in segment.points:
                     t = utc_to_localtime(point.time) if local_time else point.time
-                    points.append((t, point.latitude, point.longitude, point.elevation))
+                    points.append(t, point.latitude, point.longitude, point.elevation)
     if len(gpx.waypoints) > 0:
         for point in gpx.waypoints:
             t = utc_to_localtime(point.time) if local_time else point.time
-            points.append((t, point.latitude, point.longitude, point.elevation))
+            points.append(t, point.latitude, point.longitude, point.elevation)
 
     # sort by time just in case
     points.sort()
@@ -45,13 +43,11 @@ def get_lat_lon_time_from_gpx(
     return points
 
 
-def get_lat_lon_time_from_nmea(
-    nmea_file, local_time=True
-) -> T.List[T.Tuple[datetime.datetime, float, float, float]]:
+def get_lat_lon_time_from_nmea(nmea_file, local_time=True) -> GpsTrace:
     """
     Read location and time stamps from a track in a NMEA file.
 
-    Returns a list of tuples (time, lat, lon).
+    Returns a GpsTrace of (time, lat, lon, elevation).
 
     GPX stores time in UTC, by default we assume your camera used the local time
     and convert accordingly.
@@ -68,7 +64,7 @@ def get_lat_lon_time_from_nmea(
             break
 
     # Parse GPS trace
-    points = []
+    points = GpsTrace()
     for l in lines:
         if "GPRMC" in l:
             data = pynmea2.parse(l)
@@ -78,7 +74,33 @@ def get_lat_lon_time_from_nmea(
             data = pynmea2.parse(l)
             timestamp = datetime.datetime.combine(date, data.timestamp)
             lat, lon, alt = data.latitude, data.longitude, data.altitude
-            points.append((timestamp, lat, lon, alt))
+            points.append(timestamp, lat, lon, alt)
 
     points.sort()
     return points
+
+
+def get_lat_lon_time_from_binary(trace_file) -> GpsTrace:
+    """
+    Read location and time stamps from a binary trace file written by
+    geo.write_trace_binary.
+
+    Returns a GpsTrace of (time, lat, lon, elevation).
+    """
+    points = GpsTrace()
+    with open(trace_file, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{trace_file} is not a binary trace file")
+        data = f.read()
+    if len(data) % TRACE_RECORD.size:
+        raise ValueError(f"{trace_file} is truncated")
+    for time, lat, lon, elevation in TRACE_RECORD.iter_unpack(data):
+        points.times.append(time)
+        points.lats.append(lat)
+        points.lons.append(lon)
+        points.elevations.append(elevation)
+
+    # sort by time just in case
+    points.sort()
+
+    return points
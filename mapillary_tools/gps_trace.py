@@ -0,0 +1,194 @@
+import array
+import bisect
+import datetime
+import math
+import struct
+import typing as T
+
+"""
+Compact GPS traces.
+
+A full day of GoPro GPS at 18 Hz is millions of points, which as tuples of a
+datetime and floats take hundreds of MB. GpsTrace holds the points in parallel
+arrays instead: the times as microseconds since the epoch and the latitudes,
+longitudes and elevations as doubles, optionally with the GPS fix and
+precision. It is a sequence of (time, lat, lon, elevation) tuples, built
+on access, so it can be used wherever a list of such tuples is.
+"""
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+GpsPoint = T.Tuple[datetime.datetime, float, float, T.Optional[float]]
+
+# the binary trace format: the magic bytes, and then the time, lat, lon and
+# elevation (NaN if unknown) of each point, as in a GpsTrace
+TRACE_MAGIC = b"MLYTRACE\x01"
+TRACE_RECORD = struct.Struct("<qddd")
+
+
+def to_microseconds(t: datetime.datetime) -> int:
+    """
+    Microseconds since the epoch of t, aware times are converted to UTC
+    """
+    if t.tzinfo is not None:
+        t = t.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (t - EPOCH) // MICROSECOND
+
+
+def from_microseconds(microseconds: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=microseconds)
+
+
+class GpsTrace(T.Sequence[GpsPoint]):
+    """
+    A GPS trace of (time, lat, lon, elevation) points, held in arrays
+    """
+
+    def __init__(self, fixes: bool = False, precisions: bool = False) -> None:
+        self.times = array.array("q")
+        self.lats = array.array("d")
+        self.lons = array.array("d")
+        # NaN for unknown elevations
+        self.elevations = array.array("d")
+        # the GPS fix (0, 2 or 3) and precision (dilution of precision x 100)
+        # of the points, as reported by GoPro cameras
+        self.fixes: T.Optional["array.array[int]"] = array.array("B") if fixes else None
+        self.precisions: T.Optional["array.array[int]"] = (
+            array.array("H") if precisions else None
+        )
+
+    @classmethod
+    def from_points(cls, points: T.Iterable[T.Sequence[T.Any]]) -> "GpsTrace":
+        """
+        Build a trace from (time, lat, lon[, elevation]) tuples
+        """
+        trace = cls()
+        for point in points:
+            trace.append(point[0], point[1], point[2], *point[3:4])
+        return trace
+
+    def append(
+        self,
+        time: datetime.datetime,
+        lat: float,
+        lon: float,
+        elevation: T.Optional[float] = None,
+        fix: T.Optional[int] = None,
+        precision: T.Optional[int] = None,
+    ) -> None:
+        self.times.append(to_microseconds(time))
+        self.lats.append(lat)
+        self.lons.append(lon)
+        self.elevations.append(math.nan if elevation is None else elevation)
+        if self.fixes is not None:
+            self.fixes.append(fix or 0)
+        if self.precisions is not None:
+            self.precisions.append(precision or 0)
+
+    def _columns(self) -> T.List[T.Any]:
+        return [
+            self.times,
+            self.lats,
+            self.lons,
+            self.elevations,
+            self.fixes,
+            self.precisions,
+        ]
+
+    def _with_columns(self, columns: T.List[T.Any]) -> "GpsTrace":
+        trace = GpsTrace()
+        (
+            trace.times,
+            trace.lats,
+            trace.lons,
+            trace.elevations,
+            trace.fixes,
+            trace.precisions,
+        ) = columns
+        return trace
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @T.overload
+    def __getitem__(self, index: int) -> GpsPoint:
+        ...
+
+    @T.overload
+    def __getitem__(self, index: slice) -> "GpsTrace":
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._with_columns(
+                [None if c is None else c[index] for c in self._columns()]
+            )
+        elevation = self.elevations[index]
+        return (
+            from_microseconds(self.times[index]),
+            self.lats[index],
+            self.lons[index],
+            None if math.isnan(elevation) else elevation,
+        )
+
+    def __iter__(self) -> T.Iterator[GpsPoint]:
+        for microseconds, lat, lon, elevation in zip(
+            self.times, self.lats, self.lons, self.elevations
+        ):
+            yield (
+                from_microseconds(microseconds),
+                lat,
+                lon,
+                None if math.isnan(elevation) else elevation,
+            )
+
+    def __add__(self, other: "GpsTrace") -> "GpsTrace":
+        # the fixes and precisions are kept if both traces have them
+        return self._with_columns(
+            [
+                None if c is None or o is None else c + o
+                for c, o in zip(self._columns(), other._columns())
+            ]
+        )
+
+    def __repr__(self) -> str:
+        if not self:
+            return "GpsTrace()"
+        return f"GpsTrace({len(self)} points from {self[0][0]} to {self[-1][0]})"
+
+    def sort(self) -> None:
+        """
+        Sort the points by time, keeping the order of the points at the same
+        time
+        """
+        times = self.times
+        if all(times[i] <= times[i + 1] for i in range(len(times) - 1)):
+            return
+        order = sorted(range(len(times)), key=times.__getitem__)
+        for column, sorted_column in zip(self._columns(), self.take(order)._columns()):
+            if column is not None:
+                column[:] = sorted_column
+
+    def take(self, indices: T.Iterable[int]) -> "GpsTrace":
+        """
+        Return the trace of the points at indices
+        """
+        indices = list(indices)
+        return self._with_columns(
+            [
+                None if c is None else array.array(c.typecode, [c[i] for i in indices])
+                for c in self._columns()
+            ]
+        )
+
+    def searchsorted(self, t: datetime.datetime, side: str = "left") -> int:
+        """
+        Index where a point at time t would be inserted into the sorted trace,
+        before (side="left") or after (side="right") the points at time t
+        """
+        if side == "left":
+            return bisect.bisect_left(self.times, to_microseconds(t))
+        if side == "right":
+            return bisect.bisect_right(self.times, to_microseconds(t))
+        raise ValueError(f"Invalid side {side}")
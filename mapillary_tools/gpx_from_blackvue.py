@@ -11,6 +11,8 @@ from pymp4.parser import Box
 
 from .geo import get_max_distance_from_start
 from .geo import write_gpx
+from .gps_trace import MICROSECOND, GpsTrace
+from .trace_reduction import reduce_trace
 
 """
 Pulls geo data out of a BlackVue video files
@@ -18,7 +20,11 @@ Pulls geo data out of a BlackVue video files
 
 
 def get_points_from_bv(path, use_nmea_stream_timestamp=False):
-    points = []
+    # the points are added to the trace as they are parsed, except those
+    # before the first GPRMC date when using the NMEA timestamps, which are
+    # held back until the date is known
+    points = GpsTrace()
+    undated_points = []
     with open(path, "rb") as fd:
         fd.seek(0, io.SEEK_END)
         eof = fd.tell()
@@ -78,7 +84,7 @@ def get_points_from_bv(path, use_nmea_stream_timestamp=False):
                                             data.longitude,
                                             data.altitude,
                                         )
-                                        points.append((camera_date, lat, lon, alt))
+                                        points.append(camera_date, lat, lon, alt)
 
                             if use_nmea_stream_timestamp or not found_first_gps_date:
                                 if "GPRMC" in m:
@@ -106,12 +112,14 @@ def get_points_from_bv(path, use_nmea_stream_timestamp=False):
                                                 data.altitude,
                                             )
                                             if not date:
-                                                timestamp = data.timestamp
+                                                undated_points.append(
+                                                    (data.timestamp, lat, lon, alt)
+                                                )
                                             else:
                                                 timestamp = datetime.datetime.combine(
                                                     date, data.timestamp
                                                 )
-                                            points.append((timestamp, lat, lon, alt))
+                                                points.append(timestamp, lat, lon, alt)
 
                                     except Exception as e:
                                         print(
@@ -119,8 +127,8 @@ def get_points_from_bv(path, use_nmea_stream_timestamp=False):
                                         )
 
                         # If there are no points after parsing just return empty vector
-                        if not points:
-                            return []
+                        if not points and not undated_points:
+                            return GpsTrace()
 
                         # After parsing all points, fix timedate issues
                         if not use_nmea_stream_timestamp:
@@ -137,42 +145,36 @@ def get_points_from_bv(path, use_nmea_stream_timestamp=False):
                                 hours_diff_to_utc = (
                                     round(delta_t.total_seconds() / 3600) * -1
                                 )
-                            utc_points = []
-                            for idx, point in enumerate(points):
-                                delay_compensation = datetime.timedelta(
-                                    seconds=-1.8
-                                )  # Compensate for solution age when location gets timestamped by camera clock. Value is empirical from various cameras/recordings
-                                new_timestamp = (
-                                    points[idx][0]
-                                    + datetime.timedelta(hours=hours_diff_to_utc)
-                                    + delay_compensation
-                                )
-                                lat = points[idx][1]
-                                lon = points[idx][2]
-                                alt = points[idx][3]
-                                utc_points.append((new_timestamp, lat, lon, alt))
-
-                            points = utc_points
+                            delay_compensation = datetime.timedelta(
+                                seconds=-1.8
+                            )  # Compensate for solution age when location gets timestamped by camera clock. Value is empirical from various cameras/recordings
+                            shift = (
+                                datetime.timedelta(hours=hours_diff_to_utc)
+                                + delay_compensation
+                            ) // MICROSECOND
+                            times = points.times
+                            for idx in range(len(times)):
+                                times[idx] += shift
                             points.sort()
 
                         else:
                             # add date to points that don't have it yet, because GPRMC message came later
-                            utc_points = []
-                            for idx, point in enumerate(points):
-                                if type(points[idx][0]) != type(
-                                    datetime.datetime.today()
-                                ):
-                                    timestamp = datetime.datetime.combine(
-                                        first_gps_date, points[idx][0]
+                            if undated_points:
+                                points = (
+                                    GpsTrace.from_points(
+                                        (
+                                            datetime.datetime.combine(
+                                                first_gps_date, timestamp
+                                            ),
+                                            lat,
+                                            lon,
+                                            alt,
+                                        )
+                                        for timestamp, lat, lon, alt in undated_points
                                     )
-                                else:
-                                    timestamp = points[idx][0]
-                                lat = points[idx][1]
-                                lon = points[idx][2]
-                                alt = points[idx][3]
-                                utc_points.append((timestamp, lat, lon, alt))
-
-                            points = utc_points
+                                    + points
+                                )
+                                undated_points = []
                             points.sort()
 
                     offset += newb.end
@@ -191,12 +193,16 @@ def is_video_stationary(max_distance_from_start) -> bool:
     )
 
 
-def gpx_from_blackvue(bv_video, use_nmea_stream_timestamp=False) -> Tuple[str, bool]:
+def gpx_from_blackvue(
+    bv_video, use_nmea_stream_timestamp=False, trace_tolerance=0.0, trace_interval=0.0
+) -> Tuple[str, bool]:
     bv_data = get_points_from_bv(bv_video, use_nmea_stream_timestamp)
     if not bv_data:
         return "", True
     basename, extension = os.path.splitext(bv_video)
     gpx_path = basename + ".gpx"
-    bv_data.sort(key=lambda x: x[0])
-    write_gpx(gpx_path, bv_data)
+    bv_data.sort()
+    write_gpx(
+        gpx_path, reduce_trace(bv_data, bv_video, trace_tolerance, trace_interval)
+    )
     return gpx_path, is_video_stationary(get_max_distance_from_start(bv_data))
@@ -1,14 +1,17 @@
-from . import exif_read
+from . import exif_extract
 from .geo import write_gpx
+from .gps_trace import GpsTrace
 
 
-def get_points_from_exif(file_list, verbose=False):
-    data = []
-    for file in file_list:
-        point = ()
-        try:
-            exif = exif_read.ExifRead(file)
-        except:
+def get_points_from_exif(
+    file_list, verbose=False, workers=None, mode="thread"
+) -> GpsTrace:
+    data = GpsTrace()
+    geotags = exif_extract.extract_geotags(
+        file_list, workers, mode, desc="Reading gps data from image EXIF"
+    )
+    for file, exif in zip(file_list, geotags):
+        if exif is None:
             if verbose:
                 print(f"Warning, EXIF could not be read for image {file}.")
             continue
@@ -24,28 +27,19 @@ def get_points_from_exif(file_list, verbose=False):
             if verbose:
                 print(f"Warning {file} image capture time tag not in EXIF.")
             continue
-        if lon is not None and lat is not None and timestamp is not None:
-            point = point + (timestamp, lat, lon)
-        else:
+        if lon is None or lat is None or timestamp is None:
             continue
         try:
             altitude = exif.extract_altitude()
-            point = point + (altitude,)
-        except:
-            pass
-        try:
-            heading = exif.extract_direction()
-            point = point + (heading,)
         except:
-            pass
-        if point:
-            data.append(point)
+            altitude = None
+        data.append(timestamp, lat, lon, altitude)
     return data
 
 
-def gpx_from_exif(file_list, import_path, verbose=False):
-    data = get_points_from_exif(file_list, verbose)
-    data = sorted(data, key=lambda x: x[0])
+def gpx_from_exif(file_list, import_path, verbose=False, workers=None, mode="thread"):
+    data = get_points_from_exif(file_list, verbose, workers, mode)
+    data.sort()
     gpx_path = import_path + ".gpx"
     write_gpx(gpx_path, data)
     return gpx_path
@@ -1,9 +1,12 @@
 import datetime
 import os
+import typing as T
 
 from .ffmpeg import extract_stream, get_ffprobe
 from .geo import write_gpx
 from .gpmf import parse_bin, interpolate_times
+from .gps_trace import GpsTrace
+from .trace_reduction import reduce_trace
 
 # author https://github.com/stilldavid
 
@@ -38,13 +41,16 @@ def extract_bin(path: str) -> str:
     return bin_path
 
 
-def get_points_from_gpmf(path: str) -> list:
+def iter_points_from_gpmf(path: str) -> T.Iterator[T.Tuple]:
+    """
+    Yield the (time, lat, lon, elevation, fix, precision) points of the GoPro
+    video, in the order of the recording
+    """
     bin_path = extract_bin(path)
 
     gpmf_data = parse_bin(bin_path)
     rows = len(gpmf_data)
 
-    points = []
     for i, frame in enumerate(gpmf_data):
         t = frame["time"]
 
@@ -56,25 +62,51 @@ def get_points_from_gpmf(path: str) -> list:
         interpolate_times(frame, next_ts)
 
         for point in frame["gps"]:
-            points.append(
-                (
-                    point["time"],
-                    point["lat"],
-                    point["lon"],
-                    point["alt"],
-                    frame["gps_fix"],
-                )
+            yield (
+                point["time"],
+                point["lat"],
+                point["lon"],
+                point["alt"],
+                frame["gps_fix"],
+                frame.get("gps_precision"),
             )
 
+
+def get_points_from_gpmf(path: str) -> GpsTrace:
+    points = GpsTrace(fixes=True, precisions=True)
+    for point in iter_points_from_gpmf(path):
+        points.append(*point)
     return points
 
 
-def gpx_from_gopro(gopro_video):
-    gopro_data = get_points_from_gpmf(gopro_video)
+def _in_time_order(points: T.Iterable[T.Tuple], order: T.List[bool]) -> T.Iterator:
+    # yield the points, and record in order whether they were sorted by time
+    previous = None
+    for point in points:
+        if previous is not None and point[0] < previous:
+            order[0] = False
+        previous = point[0]
+        yield point
+
 
+def gpx_from_gopro(gopro_video, trace_tolerance=0.0, trace_interval=0.0):
     basename, extension = os.path.splitext(gopro_video)
     gpx_path = basename + ".gpx"
 
-    write_gpx(gpx_path, sorted(gopro_data))
+    if not (0 < trace_tolerance or 0 < trace_interval):
+        # GoPro records the points in time order, so they are streamed
+        # straight to the GPX file, which is rewritten from the sorted
+        # trace in the rare case they are not
+        in_order = [True]
+        write_gpx(
+            gpx_path, _in_time_order(iter_points_from_gpmf(gopro_video), in_order)
+        )
+        if in_order[0]:
+            return gpx_path
+
+    gopro_data = get_points_from_gpmf(gopro_video)
+    gopro_data.sort()
+    gopro_data = reduce_trace(gopro_data, gopro_video, trace_tolerance, trace_interval)
+    write_gpx(gpx_path, gopro_data)
 
     return gpx_path
@@ -0,0 +1,211 @@
+import contextlib
+import copy
+import os
+import typing as T
+
+from .exif_read import ExifRead
+
+"""
+In-memory catalog of the images of one run.
+
+The stages of process, process_and_upload and video_process_and_upload each
+list the import path, read the flags and JSON payloads of every image and parse
+its EXIF. While a catalog is active, these are read from disk once and kept in
+memory for the following stages, and state updates are written through to the
+state store, which stays the persistence layer.
+"""
+
+# ExifRead methods whose results are kept by the catalog
+EXIF_FIELDS = [
+    "extract_lon_lat",
+    "extract_capture_time",
+    "extract_altitude",
+    "extract_direction",
+    "extract_orientation",
+    "extract_make",
+    "extract_model",
+    "extract_image_history",
+]
+
+
+class ExifSubset:
+    """
+    The results of the EXIF_FIELDS methods of an ExifRead, with the same
+    interface. Exceptions raised while reading are raised again on access.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, exif: ExifRead) -> None:
+        self._values: T.Dict[str, T.Tuple[bool, T.Any]] = {}
+        for field in EXIF_FIELDS:
+            try:
+                self._values[field] = (True, getattr(exif, field)())
+            except Exception as ex:
+                self._values[field] = (False, ex)
+
+    def _get(self, field: str) -> T.Any:
+        ok, value = self._values[field]
+        if not ok:
+            raise value
+        return value
+
+    def extract_lon_lat(self):
+        return self._get("extract_lon_lat")
+
+    def extract_capture_time(self):
+        return self._get("extract_capture_time")
+
+    def extract_altitude(self):
+        return self._get("extract_altitude")
+
+    def extract_direction(self):
+        return self._get("extract_direction")
+
+    def extract_orientation(self):
+        return self._get("extract_orientation")
+
+    def extract_make(self):
+        return self._get("extract_make")
+
+    def extract_model(self):
+        return self._get("extract_model")
+
+    def extract_image_history(self):
+        return self._get("extract_image_history")
+
+
+class ImageCatalog:
+    """
+    File lists, flags, JSON payloads and EXIF of the images seen in this run,
+    keyed by absolute path. Payloads known to be missing are kept as None.
+    """
+
+    def __init__(self) -> None:
+        self.file_lists: T.Dict[T.Tuple[str, bool], T.List[str]] = {}
+        self.flags: T.Dict[str, T.Set[str]] = {}
+        self.payloads: T.Dict[str, T.Dict[str, T.Optional[T.Dict]]] = {}
+        self.exif: T.Dict[str, T.Union[ExifSubset, Exception]] = {}
+
+    def file_list(
+        self,
+        import_path: str,
+        skip_subfolders: bool,
+        list_files: T.Callable[[str, bool], T.List[str]],
+    ) -> T.List[str]:
+        key = (os.path.abspath(import_path), skip_subfolders)
+        files = self.file_lists.get(key)
+        if files is None:
+            files = list_files(import_path, skip_subfolders)
+            self.file_lists[key] = files
+        return list(files)
+
+    def bulk_flags(
+        self,
+        images: T.Iterable[str],
+        read_flags: T.Callable[[T.List[str]], T.Dict[str, T.Set[str]]],
+    ) -> T.Dict[str, T.Set[str]]:
+        images = list(images)
+        missing = [image for image in images if _key(image) not in self.flags]
+        if missing:
+            for image, flags in read_flags(missing).items():
+                self.flags[_key(image)] = set(flags)
+        return {image: set(self.flags[_key(image)]) for image in images}
+
+    def update_flag(self, image: str, flag: str, present: bool) -> None:
+        flags = self.flags.get(_key(image))
+        if flags is None:
+            return
+        if present:
+            flags.add(flag)
+        else:
+            flags.discard(flag)
+
+    def bulk_load_json(
+        self,
+        images: T.Iterable[str],
+        name: str,
+        read_payloads: T.Callable[[T.List[str], str], T.Dict[str, T.Dict]],
+    ) -> T.Dict[str, T.Dict]:
+        images = list(images)
+        missing = [
+            image for image in images if name not in self.payloads.get(_key(image), {})
+        ]
+        if missing:
+            loaded = read_payloads(missing, name)
+            for image in missing:
+                self.payloads.setdefault(_key(image), {})[name] = loaded.get(image)
+        result = {}
+        for image in images:
+            data = self.payloads[_key(image)][name]
+            if data is not None:
+                result[image] = copy.deepcopy(data)
+        return result
+
+    def update_json(self, image: str, name: str, data: T.Optional[T.Any]) -> None:
+        self.payloads.setdefault(_key(image), {})[name] = copy.deepcopy(data)
+
+    def read_exif(self, image: str) -> ExifSubset:
+        key = _key(image)
+        exif = self.exif.get(key)
+        if exif is None:
+            try:
+                exif = ExifSubset(ExifRead(image))
+            except Exception as ex:
+                exif = ex
+            self.exif[key] = exif
+        if isinstance(exif, Exception):
+            raise exif
+        return exif
+
+    def forget(self, image: str) -> None:
+        """
+        Drop everything known about image, e.g. after it was moved
+        """
+        key = _key(image)
+        self.flags.pop(key, None)
+        self.payloads.pop(key, None)
+        self.exif.pop(key, None)
+        self.file_lists.clear()
+
+
+def _key(image: str) -> str:
+    return os.path.abspath(image)
+
+
+_ACTIVE: T.Optional[ImageCatalog] = None
+
+
+def active() -> T.Optional[ImageCatalog]:
+    return _ACTIVE
+
+
+@contextlib.contextmanager
+def activate(catalog: ImageCatalog) -> T.Generator[ImageCatalog, None, None]:
+    """
+    Serve the reads of all stages run within from the catalog
+    """
+    global _ACTIVE
+    previous = _ACTIVE
+    _ACTIVE = catalog
+    try:
+        yield catalog
+    finally:
+        _ACTIVE = previous
+
+
+def read_exif(image: str) -> T.Union[ExifRead, ExifSubset]:
+    """
+    Read the EXIF of image, from the active catalog if there is one
+    """
+    if _ACTIVE is None:
+        return ExifRead(image)
+    return _ACTIVE.read_exif(image)
+
+
+def forget_exif(image: str) -> None:
+    """
+    Drop the EXIF of image from the active catalog, after it was written
+    """
+    if _ACTIVE is not None:
+        _ACTIVE.exif.pop(_key(image), None)
@@ -1,13 +1,170 @@
+import multiprocessing
 import os
 import sys
+import typing as T
 
 from tqdm import tqdm
 
+from . import exif_plan
+from . import exif_read
+from . import exif_write
+from . import image_catalog
 from . import processing
-from . import uploader
+from . import state_store
 from .error import print_error
 
 
+def insert_image_description(
+    image,
+    flags,
+    master_upload=False,
+    verbose=False,
+    skip_EXIF_insert=False,
+    keep_original=False,
+    overwrite_all_EXIF_tags=False,
+    overwrite_EXIF_time_tag=False,
+    overwrite_EXIF_gps_tag=False,
+    overwrite_EXIF_direction_tag=False,
+    overwrite_EXIF_orientation_tag=False,
+):
+    # check the processing logs
+    log_root = state_store.log_rootpath(image)
+
+    if "duplicate" in flags:
+        return
+
+    final_mapillary_image_description = (
+        processing.get_final_mapillary_image_description(
+            log_root,
+            image,
+            master_upload,
+            verbose,
+            skip_EXIF_insert,
+            keep_original,
+            overwrite_all_EXIF_tags,
+            overwrite_EXIF_time_tag,
+            overwrite_EXIF_gps_tag,
+            overwrite_EXIF_direction_tag,
+            overwrite_EXIF_orientation_tag,
+        )
+    )
+
+    processing.create_and_log_process(
+        image,
+        "mapillary_image_description",
+        "success",
+        final_mapillary_image_description,
+        verbose=verbose,
+    )
+
+
+def _describe_image(
+    task: T.Tuple[str, T.Tuple],
+) -> T.Tuple[str, T.Optional[T.Dict], T.Optional[str], exif_write.CopyInfo]:
+    """
+    Build the description of an image and insert it in its EXIF, in a worker
+    process. Failures are returned rather than raised, so one broken image
+    does not stop the pool.
+    """
+    image, options = task
+    exif_write.reset_copy_info()
+    try:
+        # the plan of the parent process is not shared, write right away
+        with exif_plan.activate(None):
+            description = processing.get_final_mapillary_image_description(
+                state_store.log_rootpath(image), image, *options
+            )
+    except Exception as ex:
+        return image, None, f"{type(ex).__name__}: {ex}", exif_write.copy_info()
+    return image, description, None, exif_write.copy_info()
+
+
+def insert_image_descriptions_parallel(
+    images: T.List[str],
+    workers: int,
+    master_upload=False,
+    verbose=False,
+    skip_EXIF_insert=False,
+    keep_original=False,
+    overwrite_all_EXIF_tags=False,
+    overwrite_EXIF_time_tag=False,
+    overwrite_EXIF_gps_tag=False,
+    overwrite_EXIF_direction_tag=False,
+    overwrite_EXIF_orientation_tag=False,
+) -> T.Dict[str, str]:
+    """
+    Insert the descriptions of images on a pool of worker processes. The
+    workers build the descriptions and write the EXIF, the descriptions are
+    logged here in the order of images. Returns the error of every image
+    that raised.
+    """
+    options = (
+        master_upload,
+        verbose,
+        skip_EXIF_insert,
+        keep_original,
+        overwrite_all_EXIF_tags,
+        overwrite_EXIF_time_tag,
+        overwrite_EXIF_gps_tag,
+        overwrite_EXIF_direction_tag,
+        overwrite_EXIF_orientation_tag,
+    )
+    tasks = [(image, options) for image in images]
+    # a few chunks per worker balances the load without paying the IPC
+    # round trip for every image
+    chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+
+    failures: T.Dict[str, str] = {}
+    # the workers read the images from disk
+    exif_plan.commit()
+    # the pool is started before the transaction, so the workers do not
+    # inherit (and flush) its pending state updates
+    with multiprocessing.Pool(workers) as pool:
+        with state_store.transaction():
+            for image, description, error, copy_info in tqdm(
+                pool.imap(_describe_image, tasks, chunksize),
+                total=len(tasks),
+                desc="Inserting mapillary image description in image EXIF",
+            ):
+                if error is not None:
+                    failures[image] = error
+                exif_write.add_copy_info(copy_info)
+                # the EXIF was rewritten in the worker, the (size, mtime) of a
+                # file patched in place on a coarse mtime filesystem may not
+                # change, so the tags read here before are dropped
+                for path in [image, processing.processed_images_rootpath(image)]:
+                    image_catalog.forget_exif(path)
+                    exif_read.invalidate_exif_cache(path)
+                processing.create_and_log_process(
+                    image,
+                    "mapillary_image_description",
+                    "success",
+                    description,
+                    verbose=verbose,
+                )
+    return failures
+
+
+def print_insert_failures(failures: T.Dict[str, str], total: int) -> None:
+    for image, error in failures.items():
+        print_error(f"Error inserting the description of {image}: {error}")
+    if failures:
+        print_error(
+            f"Failed to insert the description of {len(failures)} of {total} images"
+        )
+
+
+def print_copy_info() -> None:
+    info = exif_write.copy_info()
+    if not info.cloned and not info.copied:
+        return
+    print(
+        f"Kept the original images: {info.cloned} processed images cloned, "
+        f"{info.copied} copied, {info.bytes_saved / (1024 * 1024):.1f} MB saved "
+        "by cloning"
+    )
+
+
 def insert_MAPJson(
     import_path,
     master_upload=False,
@@ -22,6 +179,7 @@ def insert_MAPJson(
     overwrite_EXIF_gps_tag=False,
     overwrite_EXIF_direction_tag=False,
     overwrite_EXIF_orientation_tag=False,
+    workers=None,
 ):
     # sanity check if video file is passed
     if (
@@ -65,21 +223,36 @@ def insert_MAPJson(
             "If the images have already been processed and not yet uploaded, they can be processed again, by passing the argument --rerun"
         )
 
-    for image in tqdm(
-        process_file_list, desc="Inserting mapillary image description in image EXIF"
-    ):
-        # check the processing logs
-        log_root = uploader.log_rootpath(image)
-
-        duplicate_path = os.path.join(log_root, "duplicate")
+    flags = state_store.bulk_flags(process_file_list)
+    exif_write.reset_copy_info()
 
-        if os.path.isfile(duplicate_path):
-            continue
+    if workers is not None and workers > 1 and len(process_file_list) > 1:
+        failures = insert_image_descriptions_parallel(
+            [image for image in process_file_list if "duplicate" not in flags[image]],
+            workers,
+            master_upload,
+            verbose,
+            skip_EXIF_insert,
+            keep_original,
+            overwrite_all_EXIF_tags,
+            overwrite_EXIF_time_tag,
+            overwrite_EXIF_gps_tag,
+            overwrite_EXIF_direction_tag,
+            overwrite_EXIF_orientation_tag,
+        )
+        print_insert_failures(failures, len(process_file_list))
+        print_copy_info()
+        print("Sub process ended")
+        return
 
-        final_mapillary_image_description = (
-            processing.get_final_mapillary_image_description(
-                log_root,
+    with state_store.transaction():
+        for image in tqdm(
+            process_file_list,
+            desc="Inserting mapillary image description in image EXIF",
+        ):
+            insert_image_description(
                 image,
+                flags[image],
                 master_upload,
                 verbose,
                 skip_EXIF_insert,
@@ -90,14 +263,6 @@ def insert_MAPJson(
                 overwrite_EXIF_direction_tag,
                 overwrite_EXIF_orientation_tag,
             )
-        )
-
-        processing.create_and_log_process(
-            image,
-            "mapillary_image_description",
-            "success",
-            final_mapillary_image_description,
-            verbose=verbose,
-        )
 
+    print_copy_info()
     print("Sub process ended")
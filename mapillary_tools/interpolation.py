@@ -5,13 +5,13 @@ import sys
 
 from tqdm import tqdm
 
+from . import exif_plan
 from . import process_csv
 from . import processing
 from . import uploader
 from .error import print_error
 from .exif_read import ExifRead
-from .exif_write import ExifEdit
-from .geo import interpolate_lat_lon
+from .geo import interpolate_lat_lons
 from .process_import_meta_properties import add_meta_tag
 
 EPOCH = datetime.datetime.utcfromtimestamp(0)
@@ -145,21 +145,33 @@ def interpolation(
                 f"Interpolating gps for {len(missing_geotags)} images missing geotags."
             )
 
-            for image, timestamp in tqdm(
-                missing_geotags, desc="Interpolating missing gps"
+            # the geotagged images make up the trace, in the order of capture
+            geotags.sort(key=lambda geotag: geotag[0])
+            try:
+                interpolations = interpolate_lat_lons(
+                    geotags,
+                    [timestamp for _, timestamp in missing_geotags],
+                    max_time_delta,
+                )
+            except Exception as e:
+                print_error(
+                    f"Error, {e}, interpolation of latitude and longitude failed, exiting..."
+                )
+                sys.exit(1)
+
+            for (image, timestamp), interpolation in tqdm(
+                zip(missing_geotags, interpolations),
+                total=len(missing_geotags),
+                desc="Interpolating missing gps",
             ):
-                # interpolate
-                try:
-                    lat, lon, bearing, elevation = interpolate_lat_lon(
-                        geotags, timestamp, max_time_delta
-                    )
-                except Exception as e:
+                if isinstance(interpolation, Exception):
                     print_error(
-                        f"Error, {e}, interpolation of latitude and longitude failed for image {image}"
+                        f"Error, {interpolation}, interpolation of latitude and longitude failed for image {image}"
                     )
                     continue
+                lat, lon, bearing, elevation = interpolation
                 # insert into exif
-                exif_edit = ExifEdit(image)
+                exif_edit = exif_plan.edit(image)
                 if lat and lon:
                     exif_edit.add_lat_lon(lat, lon)
                 else:
@@ -184,7 +196,7 @@ def interpolation(
                 exif_edit.add_image_history(meta["MAPMetaTags"])
 
                 file_out = image if not keep_original else image[:-4] + "_processed."
-                exif_edit.write(filename=file_out)
+                exif_plan.write(exif_edit, filename=file_out)
 
         elif data == "identical_timestamps":
 
@@ -224,12 +236,12 @@ def interpolation(
                     print("")
 
                 # load exif
-                exif_edit = ExifEdit(image)
+                exif_edit = exif_plan.edit(image)
                 exif_edit.add_date_time_original(timestamp)
 
                 # write to exif
                 file_out = image if not keep_original else image[:-4] + "_processed."
-                exif_edit.write(filename=file_out)
+                exif_plan.write(exif_edit, filename=file_out)
 
             sys.exit()
         else:
@@ -8,22 +8,20 @@ from tqdm import tqdm
 from . import exif_read
 from . import ipc
 from . import processing
+from . import state_store
 from . import uploader
 
 
 def map_images_to_sequences(destination_mapping, total_files):
     unique_sequence_uuids = []
     sequence_counter = 0
+    sequence_data_per_image = state_store.bulk_load_json(
+        total_files, "sequence_process"
+    )
     for image in tqdm(
         total_files, desc="Reading sequence information stored in log files"
     ):
-        log_root = uploader.log_rootpath(image)
-        sequence_data_path = os.path.join(log_root, "sequence_process.json")
-
-        if os.path.isfile(sequence_data_path):
-            sequence_data = processing.load_json(sequence_data_path)
-        else:
-            sequence_data = None
+        sequence_data = sequence_data_per_image.get(image)
 
         if sequence_data and "MAPSequenceUUID" in sequence_data:
             sequence_uuid = sequence_data["MAPSequenceUUID"]
@@ -48,15 +46,14 @@ def get_local_mapping(import_path):
     total_files = uploader.get_total_file_list(import_path)
 
     local_mapping = []
+    descriptions = state_store.bulk_load_json(
+        total_files, "mapillary_image_description"
+    )
     for file in tqdm(total_files, desc="Reading image uuids"):
         image_file_uuid = None
         relative_path = file.lstrip(os.path.abspath(import_path))
-        log_rootpath = uploader.log_rootpath(file)
-        image_description_json_path = os.path.join(
-            log_rootpath, "mapillary_image_description.json"
-        )
-        if os.path.isfile(image_description_json_path):
-            image_description_json = processing.load_json(image_description_json_path)
+        if file in descriptions:
+            image_description_json = descriptions[file]
             if "MAPPhotoUUID" in image_description_json:
                 image_file_uuid = image_description_json["MAPPhotoUUID"]
             else:
@@ -170,41 +167,40 @@ def post_process(
             import_path, skip_subfolders
         )
         params = {}
+        upload_params = state_store.bulk_load_json(
+            to_be_pushed_files, "upload_params_process"
+        )
         for image in tqdm(to_be_pushed_files, desc="Pushing images"):
-            log_root = uploader.log_rootpath(image)
-            upload_params_path = os.path.join(log_root, "upload_params_process.json")
-            if os.path.isfile(upload_params_path):
-                with open(upload_params_path, "rb") as jf:
-                    params[image] = json.load(jf)
+            if image in upload_params:
+                params[image] = upload_params[image]
 
         # flag finalization for each file
         uploader.flag_finalization(to_be_pushed_files)
 
-    if summarize or list_file_status or move_uploaded:
+    if (
+        summarize
+        or list_file_status
+        or move_uploaded
+        or move_sequences
+        or move_duplicates
+    ):
+        # classify all images with a single pass over the import path
+        import_status = uploader.get_import_status(import_path, skip_subfolders)
+
         # upload logs
-        uploaded_files = uploader.get_success_upload_file_list(
-            import_path, skip_subfolders
-        )
+        uploaded_files = import_status.uploaded
         uploaded_files_count = len(uploaded_files)
-        failed_upload_files = uploader.get_failed_upload_file_list(
-            import_path, skip_subfolders
-        )
+        failed_upload_files = import_status.failed_upload
         failed_upload_files_count = len(failed_upload_files)
-        to_be_finalized_files = uploader.get_finalize_file_list(import_path)
+        to_be_finalized_files = import_status.to_finalize
         to_be_finalized_files_count = len(to_be_finalized_files)
-        to_be_uploaded_files = uploader.get_upload_file_list(
-            import_path, skip_subfolders
-        )
+        to_be_uploaded_files = import_status.to_upload
         to_be_uploaded_files_count = len(to_be_uploaded_files)
 
-    if summarize or move_sequences:
-        total_files = uploader.get_total_file_list(import_path)
+        total_files = import_status.total
         total_files_count = len(total_files)
 
-    if summarize or move_duplicates or list_file_status:
-        duplicates_file_list = processing.get_duplicate_file_list(
-            import_path, skip_subfolders
-        )
+        duplicates_file_list = import_status.duplicates
         duplicates_file_list_count = len(duplicates_file_list)
 
     if summarize:
@@ -227,16 +223,8 @@ def post_process(
             "mapillary_image_description",
         ]
         for step in process_steps:
-            process_success = len(
-                processing.get_process_status_file_list(
-                    import_path, step, "success", skip_subfolders
-                )
-            )
-            process_failed = len(
-                processing.get_process_status_file_list(
-                    import_path, step, "failed", skip_subfolders
-                )
-            )
+            process_success = len(import_status.process_success.get(step, []))
+            process_failed = len(import_status.process_failed.get(step, []))
             summary_dict["process summary"][step] = {
                 "failed": process_failed,
                 "success": process_success,
@@ -341,10 +329,4 @@ def post_process(
         if not os.path.isdir(os.path.dirname(image_destination_path)):
             os.makedirs(os.path.dirname(image_destination_path))
         os.rename(image, image_destination_path)
-        image_logs_dir = uploader.log_rootpath(image)
-        destination_logs_dir = uploader.log_rootpath(image_destination_path)
-        if not os.path.isdir(image_logs_dir):
-            continue
-        if not os.path.isdir(os.path.dirname(destination_logs_dir)):
-            os.makedirs(os.path.dirname(destination_logs_dir))
-        os.rename(image_logs_dir, destination_logs_dir)
+        state_store.move(image, image_destination_path)
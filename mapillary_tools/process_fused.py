@@ -0,0 +1,257 @@
+import os
+
+from tqdm import tqdm
+
+from . import exif_extract
+from . import login
+from . import processing
+from . import state_store
+from . import uploader
+from .insert_MAPJson import (
+    insert_image_description,
+    insert_image_descriptions_parallel,
+    print_insert_failures,
+)
+from .process_geotag_properties import process_geotag_properties
+from .process_import_meta_properties import (
+    finalize_import_properties_process,
+    get_import_meta_properties_exif,
+)
+from .process_sequence_properties import process_sequence_properties
+from .process_upload_params import finalize_upload_params_process
+from .process_user_properties import get_checked_user_properties
+
+
+def process_fused(
+    import_path,
+    user_name,
+    organization_username=None,
+    organization_key=None,
+    private=False,
+    master_upload=False,
+    orientation=None,
+    device_make=None,
+    device_model=None,
+    GPS_accuracy=None,
+    add_file_name=False,
+    add_import_date=False,
+    custom_meta_data=None,
+    camera_uuid=None,
+    windows_path=False,
+    exclude_import_path=False,
+    exclude_path=None,
+    geotag_source="exif",
+    geotag_source_path=None,
+    offset_time=0.0,
+    offset_angle=0.0,
+    local_time=False,
+    sub_second_interval=0.0,
+    use_gps_start_time=False,
+    trace_tolerance=0.0,
+    trace_interval=0.0,
+    cutoff_distance=600.0,
+    cutoff_time=60.0,
+    interpolate_directions=False,
+    keep_duplicates=False,
+    duplicate_distance=0.1,
+    duplicate_angle=5,
+    duplicates_across_sequences=False,
+    skip_EXIF_insert=False,
+    keep_original=False,
+    overwrite_all_EXIF_tags=False,
+    overwrite_EXIF_time_tag=False,
+    overwrite_EXIF_gps_tag=False,
+    overwrite_EXIF_direction_tag=False,
+    overwrite_EXIF_orientation_tag=False,
+    verbose=False,
+    rerun=False,
+    skip_subfolders=False,
+    workers=None,
+    exif_read_mode="thread",
+):
+    """
+    Run the process stages in two passes over the images instead of one pass
+    per stage. The per image stages run back to back for each image, and only
+    the sequence process, which needs all images, runs in between:
+
+    1. user, import meta and (EXIF) geotag process
+    2. sequence process and duplicate flagging
+    3. upload params process and image description insertion
+
+    Geotagging from a GPS trace or a video needs the whole trace, so it keeps
+    its own pass after the first one. With more than 1 workers, the EXIF is
+    read for geotagging, and the image descriptions are inserted, in parallel,
+    each in a pass of its own.
+    """
+    if not import_path or not os.path.isdir(import_path):
+        raise RuntimeError(
+            f"Error, import directory {import_path} does not exist, exiting..."
+        )
+
+    user_properties = get_checked_user_properties(
+        user_name, organization_username, organization_key, private
+    )
+    if orientation is not None:
+        orientation = processing.format_orientation(orientation)
+    geotag_per_image = geotag_source == "exif" and offset_time == 0
+
+    file_list = uploader.get_total_file_list(import_path, skip_subfolders)
+
+    parallel = workers is not None and workers > 1
+
+    flags = state_store.bulk_flags(file_list)
+    geotags = {}
+    if geotag_per_image and parallel:
+        geotag_list = [
+            image
+            for image in file_list
+            if processing.preform_process(image, "geotag_process", rerun, flags[image])
+        ]
+        geotags = dict(
+            zip(
+                geotag_list,
+                exif_extract.extract_geotags(geotag_list, workers, exif_read_mode),
+            )
+        )
+
+    with state_store.transaction():
+        for image in tqdm(file_list, desc="Processing image properties"):
+            if processing.preform_process(image, "user_process", rerun, flags[image]):
+                processing.create_and_log_process(
+                    image, "user_process", "success", user_properties, verbose
+                )
+
+            if processing.preform_process(
+                image, "import_meta_data_process", rerun, flags[image]
+            ):
+                finalize_import_properties_process(
+                    image,
+                    import_path,
+                    orientation,
+                    device_make,
+                    device_model,
+                    GPS_accuracy,
+                    add_file_name,
+                    add_import_date,
+                    verbose,
+                    get_import_meta_properties_exif(image, verbose),
+                    custom_meta_data,
+                    camera_uuid,
+                    windows_path,
+                    exclude_import_path,
+                    exclude_path,
+                )
+
+            if geotag_per_image and processing.preform_process(
+                image, "geotag_process", rerun, flags[image]
+            ):
+                if image in geotags:
+                    geotag_properties = processing.get_geotag_properties(
+                        image, geotags[image], offset_angle, verbose
+                    )
+                else:
+                    geotag_properties = processing.get_geotag_properties_from_exif(
+                        image, offset_angle, verbose
+                    )
+                processing.create_and_log_process(
+                    image, "geotag_process", "success", geotag_properties, verbose
+                )
+
+    if not geotag_per_image:
+        process_geotag_properties(
+            import_path,
+            geotag_source=geotag_source,
+            geotag_source_path=geotag_source_path,
+            offset_time=offset_time,
+            offset_angle=offset_angle,
+            local_time=local_time,
+            sub_second_interval=sub_second_interval,
+            use_gps_start_time=use_gps_start_time,
+            verbose=verbose,
+            rerun=rerun,
+            skip_subfolders=skip_subfolders,
+            trace_tolerance=trace_tolerance,
+            trace_interval=trace_interval,
+            workers=workers,
+            exif_read_mode=exif_read_mode,
+        )
+
+    process_sequence_properties(
+        import_path,
+        cutoff_distance=cutoff_distance,
+        cutoff_time=cutoff_time,
+        interpolate_directions=interpolate_directions,
+        keep_duplicates=keep_duplicates,
+        duplicate_distance=duplicate_distance,
+        duplicate_angle=duplicate_angle,
+        duplicates_across_sequences=duplicates_across_sequences,
+        offset_angle=offset_angle,
+        verbose=verbose,
+        rerun=rerun,
+        skip_subfolders=skip_subfolders,
+    )
+
+    user_upload_token = None
+    user_key = None
+    if not master_upload:
+        credentials = login.authenticate_user(user_name)
+        user_upload_token = credentials["user_upload_token"]
+        user_key = credentials["MAPSettingsUserKey"]
+
+    flags = state_store.bulk_flags(file_list)
+    description_list = []
+    with state_store.transaction():
+        for image in tqdm(file_list, desc="Finalizing image descriptions"):
+            if processing.preform_process(
+                image, "upload_params_process", rerun, flags[image]
+            ):
+                finalize_upload_params_process(
+                    image,
+                    flags[image],
+                    user_name,
+                    user_upload_token,
+                    user_key,
+                    master_upload,
+                    verbose,
+                )
+
+            if not processing.preform_process(
+                image, "mapillary_image_description", rerun, flags[image]
+            ):
+                continue
+            if parallel:
+                if "duplicate" not in flags[image]:
+                    description_list.append(image)
+            else:
+                insert_image_description(
+                    image,
+                    flags[image],
+                    master_upload,
+                    verbose,
+                    skip_EXIF_insert,
+                    keep_original,
+                    overwrite_all_EXIF_tags,
+                    overwrite_EXIF_time_tag,
+                    overwrite_EXIF_gps_tag,
+                    overwrite_EXIF_direction_tag,
+                    overwrite_EXIF_orientation_tag,
+                )
+
+    if description_list:
+        # the workers read the upload params logged above
+        failures = insert_image_descriptions_parallel(
+            description_list,
+            workers,
+            master_upload,
+            verbose,
+            skip_EXIF_insert,
+            keep_original,
+            overwrite_all_EXIF_tags,
+            overwrite_EXIF_time_tag,
+            overwrite_EXIF_gps_tag,
+            overwrite_EXIF_direction_tag,
+            overwrite_EXIF_orientation_tag,
+        )
+        print_insert_failures(failures, len(description_list))
+
+    print("Sub process ended")
@@ -18,6 +18,10 @@ def process_geotag_properties(
     rerun=False,
     skip_subfolders=False,
     video_import_path=None,
+    workers=None,
+    exif_read_mode="thread",
+    trace_tolerance=0.0,
+    trace_interval=0.0,
 ):
     # sanity check if video file is passed
     if (
@@ -63,7 +67,13 @@ def process_geotag_properties(
     # function calls
     if geotag_source == "exif":
         processing.geotag_from_exif(
-            process_file_list, import_path, offset_time, offset_angle, verbose
+            process_file_list,
+            import_path,
+            offset_time,
+            offset_angle,
+            verbose,
+            workers,
+            exif_read_mode,
         )
 
     elif geotag_source == "gpx" or geotag_source == "nmea":
@@ -77,6 +87,8 @@ def process_geotag_properties(
             sub_second_interval,
             use_gps_start_time,
             verbose,
+            trace_tolerance,
+            trace_interval,
         )
     elif geotag_source == "gopro_videos":
         processing.geotag_from_gopro_video(
@@ -89,6 +101,8 @@ def process_geotag_properties(
             sub_second_interval,
             use_gps_start_time,
             verbose,
+            trace_tolerance,
+            trace_interval,
         )
     elif geotag_source == "blackvue_videos":
         processing.geotag_from_blackvue_video(
@@ -101,5 +115,7 @@ def process_geotag_properties(
             sub_second_interval,
             use_gps_start_time,
             verbose,
+            trace_tolerance,
+            trace_interval,
         )
     print("Sub process ended")
@@ -6,7 +6,7 @@ from tqdm import tqdm
 
 from . import processing
 from .error import print_error
-from .exif_read import ExifRead
+from . import image_catalog
 from . import VERSION
 
 META_DATA_TYPES = {
@@ -123,7 +123,7 @@ def finalize_import_properties_process(
 def get_import_meta_properties_exif(image, verbose=False):
     import_meta_data_properties = {}
     try:
-        exif = ExifRead(image)
+        exif = image_catalog.read_exif(image)
     except:
         if verbose:
             print(
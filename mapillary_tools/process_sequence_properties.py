@@ -1,14 +1,20 @@
 import typing as T
 import datetime
 import os
-import time
 import uuid
 
 from tqdm import tqdm
 
 from . import processing
-from . import uploader
-from .geo import compute_bearing, gps_distance, diff_bearing, gps_speed
+from . import state_store
+from .geo import (
+    consecutive_bearings,
+    consecutive_gps_distances,
+    gps_distance,
+    diff_bearing,
+    gps_speed,
+    SpatialGrid,
+)
 
 MAX_SEQUENCE_LENGTH = 500
 MAX_CAPTURE_SPEED = 45  # in m/s
@@ -21,23 +27,46 @@ def finalize_sequence_processing(
     final_capture_times,
     verbose=False,
 ):
-    for image, direction, capture_time in tqdm(
-        zip(final_file_list, final_directions, final_capture_times),
-        desc="Finalizing sequence process",
-    ):
-        mapillary_description = {
-            "MAPSequenceUUID": sequence,
-            "MAPCompassHeading": {
-                "TrueHeading": direction,
-                "MagneticHeading": direction,
-            },
-            "MAPCaptureTime": datetime.datetime.strftime(
-                capture_time, "%Y_%m_%d_%H_%M_%S_%f"
-            )[:-3],
-        }
-        processing.create_and_log_process(
-            image, "sequence_process", "success", mapillary_description, verbose=verbose
-        )
+    with state_store.transaction():
+        for image, direction, capture_time in tqdm(
+            zip(final_file_list, final_directions, final_capture_times),
+            desc="Finalizing sequence process",
+        ):
+            mapillary_description = {
+                "MAPSequenceUUID": sequence,
+                "MAPCompassHeading": {
+                    "TrueHeading": direction,
+                    "MagneticHeading": direction,
+                },
+                "MAPCaptureTime": datetime.datetime.strftime(
+                    capture_time, "%Y_%m_%d_%H_%M_%S_%f"
+                )[:-3],
+            }
+            processing.create_and_log_process(
+                image,
+                "sequence_process",
+                "success",
+                mapillary_description,
+                verbose=verbose,
+            )
+
+
+def is_duplicate(
+    latlon,
+    direction,
+    prev_latlon,
+    prev_direction,
+    duplicate_distance=0.1,
+    duplicate_angle=5,
+) -> bool:
+    distance = gps_distance(latlon, prev_latlon)
+    if direction is not None and prev_direction is not None:
+        direction_diff = diff_bearing(direction, prev_direction)
+    else:
+        # dont use bearing difference if no bearings are
+        # available
+        direction_diff = 360
+    return distance < duplicate_distance and direction_diff < duplicate_angle
 
 
 def process_sequence_properties(
@@ -48,6 +77,7 @@ def process_sequence_properties(
     keep_duplicates=False,
     duplicate_distance=0.1,
     duplicate_angle=5,
+    duplicates_across_sequences=False,
     offset_angle=0.0,
     verbose=False,
     rerun=False,
@@ -87,6 +117,15 @@ def process_sequence_properties(
         cutoff_distance, cutoff_time, import_path, rerun, skip_subfolders, verbose
     )
 
+    # the kept images of all sequences, to flag duplicates across sequences
+    grid = (
+        SpatialGrid(duplicate_distance)
+        if duplicates_across_sequences
+        and not keep_duplicates
+        and 0 < duplicate_distance
+        else None
+    )
+
     # process for each sequence
     for sequence in sequences:
         file_list = sequence["file_list"]
@@ -95,10 +134,7 @@ def process_sequence_properties(
         capture_times = sequence["capture_times"]
 
         # COMPUTE DIRECTIONS --------------------------------------
-        interpolated_directions = [
-            compute_bearing(ll1[0], ll1[1], ll2[0], ll2[1])
-            for ll1, ll2 in zip(latlons[:-1], latlons[1:])
-        ]
+        interpolated_directions = consecutive_bearings(latlons)
         if len(interpolated_directions):
             interpolated_directions.append(interpolated_directions[-1])
         else:
@@ -118,9 +154,7 @@ def process_sequence_properties(
             (t1 - t0).total_seconds()
             for t0, t1 in zip(capture_times[:-1], capture_times[1:])
         ]
-        computed_distances = [
-            gps_distance(l1, l0) for l0, l1 in zip(latlons[:-1], latlons[1:])
-        ]
+        computed_distances = consecutive_gps_distances(latlons)
         computed_speed = gps_speed(
             computed_distances, computed_delta_ts
         )  # in meters/second
@@ -138,37 +172,36 @@ def process_sequence_properties(
 
         # FLAG DUPLICATES --------------------------------------
         if not keep_duplicates:
-            final_file_list = [file_list[0]]
-            final_directions = [directions[0]]
-            final_capture_times = [capture_times[0]]
-            prev_latlon = latlons[0]
-            prev_direction = directions[0]
-            for i, filename in enumerate(file_list[1:]):
-                log_root = uploader.log_rootpath(filename)
-                duplicate_flag_path = os.path.join(log_root, "duplicate")
-                sequence_process_success_path = os.path.join(
-                    log_root, "sequence_process_success"
-                )
-                k = i + 1
-                distance = gps_distance(latlons[k], prev_latlon)
-                if directions[k] is not None and prev_direction is not None:
-                    direction_diff = diff_bearing(directions[k], prev_direction)
-                else:
-                    # dont use bearing difference if no bearings are
-                    # available
-                    direction_diff = 360
-                if distance < duplicate_distance and direction_diff < duplicate_angle:
-                    open(duplicate_flag_path, "w").close()
-                    open(sequence_process_success_path, "w").close()
-                    open(
-                        sequence_process_success_path
-                        + "_"
-                        + str(time.strftime("%Y_%m_%d_%H_%M_%S", time.gmtime())),
-                        "w",
-                    ).close()
+            final_file_list = []
+            final_directions = []
+            final_capture_times = []
+            # the previous kept image of the sequence
+            kept: T.List[T.Tuple[T.Any, T.Any]] = []
+            for k, filename in enumerate(file_list):
+                if grid is not None:
+                    # the kept images of the import near this one
+                    kept = grid.neighbors(latlons[k])
+                if any(
+                    is_duplicate(
+                        latlons[k],
+                        directions[k],
+                        prev_latlon,
+                        prev_direction,
+                        duplicate_distance,
+                        duplicate_angle,
+                    )
+                    for prev_latlon, prev_direction in kept
+                ):
+                    with state_store.get_store(filename).transaction():
+                        state_store.set_flag(filename, "duplicate")
+                        state_store.set_flag(
+                            filename, "sequence_process_success", history=True
+                        )
                 else:
-                    prev_latlon = latlons[k]
-                    prev_direction = directions[k]
+                    if grid is not None:
+                        grid.add(latlons[k], (latlons[k], directions[k]))
+                    else:
+                        kept = [(latlons[k], directions[k])]
                     final_file_list.append(filename)
                     final_directions.append(directions[k])
                     final_capture_times.append(capture_times[k])
@@ -5,10 +5,41 @@ from tqdm import tqdm
 
 from . import login
 from . import processing
-from . import uploader
+from . import state_store
 from .error import print_error
 
 
+def finalize_upload_params_process(
+    image,
+    flags,
+    user_name,
+    user_upload_token=None,
+    user_key=None,
+    master_upload=False,
+    verbose=False,
+):
+    # check the status of the sequence processing
+    log_root = state_store.log_rootpath(image)
+    state_store.remove_json(image, "upload_params_process")
+
+    if "duplicate" in flags or master_upload:
+        return
+
+    upload_params_properties = processing.get_upload_param_properties(
+        log_root, image, user_name, user_upload_token, user_key, verbose
+    )
+
+    processing.create_and_log_process(
+        image,
+        "upload_params_process",
+        "success",
+        upload_params_properties,
+        verbose=verbose,
+    )
+    # flag manual upload
+    state_store.set_flag(image, "manual_upload")
+
+
 def process_upload_params(
     import_path,
     user_name,
@@ -67,36 +98,25 @@ def process_upload_params(
         )
         sys.exit(1)
 
+    user_upload_token = None
+    user_key = None
     if not master_upload:
         credentials = login.authenticate_user(user_name)
         user_upload_token = credentials["user_upload_token"]
         user_key = credentials["MAPSettingsUserKey"]
 
-    for image in tqdm(process_file_list, desc="Processing image upload parameters"):
-        # check the status of the sequence processing
-        log_root = uploader.log_rootpath(image)
-        duplicate_flag_path = os.path.join(log_root, "duplicate")
-        upload_params_path = os.path.join(log_root, "upload_params_process.json")
-
-        if os.path.isfile(upload_params_path):
-            os.remove(upload_params_path)
+    flags = state_store.bulk_flags(process_file_list)
 
-        if os.path.isfile(duplicate_flag_path) or master_upload:
-            continue
-
-        upload_params_properties = processing.get_upload_param_properties(
-            log_root, image, user_name, user_upload_token, user_key, verbose
-        )
-
-        processing.create_and_log_process(
-            image,
-            "upload_params_process",
-            "success",
-            upload_params_properties,
-            verbose=verbose,
-        )
-        # flag manual upload
-        log_manual_upload = os.path.join(log_root, "manual_upload")
-        open(log_manual_upload, "a").close()
+    with state_store.transaction():
+        for image in tqdm(process_file_list, desc="Processing image upload parameters"):
+            finalize_upload_params_process(
+                image,
+                flags[image],
+                user_name,
+                user_upload_token,
+                user_key,
+                master_upload,
+                verbose,
+            )
 
     print("Sub process ended")
@@ -40,6 +40,28 @@ def get_user_properties(
     return user_items
 
 
+def get_checked_user_properties(
+    user_name: str,
+    organization_username: T.Optional[str] = None,
+    organization_key: T.Optional[str] = None,
+    private: bool = False,
+) -> T.Optional[T.Dict]:
+    # sanity checks
+    if not user_name:
+        raise RuntimeError("Error, must provide a valid user name, exiting...")
+
+    if private and not organization_username and not organization_key:
+        raise RuntimeError(
+            "Error, if the import belongs to a private repository, you need to provide a valid organization user name or key to which the private repository belongs to, exiting..."
+        )
+
+    return get_user_properties(
+        user_name,
+        organization_key,
+        private,
+    )
+
+
 def process_user_properties(
     import_path,
     user_name,
@@ -93,19 +115,8 @@ def process_user_properties(
             "If the images have already been processed and not yet uploaded, they can be processed again, by passing the argument --rerun"
         )
 
-    # sanity checks
-    if not user_name:
-        raise RuntimeError("Error, must provide a valid user name, exiting...")
-
-    if private and not organization_username and not organization_key:
-        raise RuntimeError(
-            "Error, if the import belongs to a private repository, you need to provide a valid organization user name or key to which the private repository belongs to, exiting..."
-        )
-
-    user_properties = get_user_properties(
-        user_name,
-        organization_key,
-        private,
+    user_properties = get_checked_user_properties(
+        user_name, organization_username, organization_key, private
     )
 
     # write data and logs
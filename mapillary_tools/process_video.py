@@ -7,9 +7,9 @@ import subprocess
 from pymp4.parser import Box
 from tqdm import tqdm
 
+from . import exif_plan
 from . import processing
 from . import uploader
-from .exif_write import ExifEdit
 from .ffprobe import FFProbe
 
 ZERO_PADDING = 6
@@ -192,9 +192,9 @@ def insert_video_frame_timestamp(
     for image, timestamp in tqdm(
         zip(frame_list, video_frame_timestamps), desc="Inserting frame capture time"
     ):
-        exif_edit = ExifEdit(image)
+        exif_edit = exif_plan.edit(image)
         exif_edit.add_date_time_original(timestamp)
-        exif_edit.write()
+        exif_plan.write(exif_edit)
 
 
 def get_video_end_time(video_file) -> datetime.datetime:
@@ -1,5 +1,5 @@
 import base64
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 
 import datetime
 import hashlib
@@ -13,21 +13,26 @@ import logging
 from dateutil.tz import tzlocal
 from tqdm import tqdm
 
+from . import exif_extract
+from . import exif_plan
+from . import image_catalog
 from . import ipc
+from . import state_store
 from . import uploader
 from .error import print_error
 from .exif_read import ExifRead
-from .exif_write import ExifEdit
 from .geo import (
     normalize_bearing,
     interpolate_lat_lon,
-    gps_distance,
+    interpolate_lat_lons,
+    consecutive_gps_distances,
     MapillaryInterpolationError,
 )
 from .gps_parser import get_lat_lon_time_from_gpx, get_lat_lon_time_from_nmea
 from .gpx_from_blackvue import gpx_from_blackvue
 from .gpx_from_exif import gpx_from_exif
 from .gpx_from_gopro import gpx_from_gopro
+from .trace_reduction import reduce_trace
 from .utils import force_decode
 
 """
@@ -44,21 +49,27 @@ def geotag_from_exif(
     offset_time: float = 0.0,
     offset_angle: float = 0.0,
     verbose: bool = False,
+    workers: Optional[int] = None,
+    exif_read_mode: str = "thread",
 ) -> None:
     if offset_time == 0:
-        for image in tqdm(
-            process_file_list, desc="Extracting gps data from image EXIF"
-        ):
-            geotag_properties = get_geotag_properties_from_exif(
-                image, offset_angle, verbose
-            )
+        geotags = exif_extract.extract_geotags(
+            process_file_list, workers, exif_read_mode
+        )
+        with state_store.transaction():
+            for image, geotag in zip(process_file_list, geotags):
+                geotag_properties = get_geotag_properties(
+                    image, geotag, offset_angle, verbose
+                )
 
-            create_and_log_process(
-                image, "geotag_process", "success", geotag_properties, verbose
-            )
+                create_and_log_process(
+                    image, "geotag_process", "success", geotag_properties, verbose
+                )
     else:
         try:
-            geotag_source_path = gpx_from_exif(process_file_list, import_path, verbose)
+            geotag_source_path = gpx_from_exif(
+                process_file_list, import_path, verbose, workers, exif_read_mode
+            )
             if not geotag_source_path or not os.path.isfile(geotag_source_path):
                 raise Exception
         except Exception as e:
@@ -81,8 +92,23 @@ def get_geotag_properties_from_exif(
     image: str, offset_angle: float = 0.0, verbose: bool = False
 ) -> Optional[Dict]:
     try:
-        exif = ExifRead(image)
+        exif = image_catalog.read_exif(image)
     except:
+        exif = None
+    return get_geotag_properties(image, exif, offset_angle, verbose)
+
+
+def get_geotag_properties(
+    image: str,
+    exif: Optional[Any],
+    offset_angle: float = 0.0,
+    verbose: bool = False,
+) -> Optional[Dict]:
+    """
+    Build the geotag properties of image from its EXIF (an ExifRead or an
+    ExifGeotag), None if the EXIF could not be read
+    """
+    if exif is None:
         print_error(
             "Error, EXIF could not be read for image "
             + image
@@ -166,6 +192,8 @@ def geotag_from_gopro_video(
     sub_second_interval,
     use_gps_start_time=False,
     verbose=False,
+    trace_tolerance=0.0,
+    trace_interval=0.0,
 ):
     if geotag_source_path is None:
         raise RuntimeError(
@@ -182,7 +210,7 @@ def geotag_from_gopro_video(
     gopro_videos = uploader.get_video_file_list(geotag_source_path)
     for gopro_video in gopro_videos:
         gopro_video_filename, _ = os.path.splitext(os.path.basename(gopro_video))
-        gpx_path = gpx_from_gopro(gopro_video)
+        gpx_path = gpx_from_gopro(gopro_video, trace_tolerance, trace_interval)
 
         process_file_sublist = [
             x
@@ -222,6 +250,8 @@ def geotag_from_blackvue_video(
     sub_second_interval,
     use_gps_start_time=False,
     verbose=False,
+    trace_tolerance=0.0,
+    trace_interval=0.0,
 ):
     if geotag_source_path is None:
         raise RuntimeError(
@@ -241,7 +271,10 @@ def geotag_from_blackvue_video(
             os.path.basename(blackvue_video).replace(".mp4", "").replace(".MP4", "")
         )
         [gpx_path, is_stationary_video] = gpx_from_blackvue(
-            blackvue_video, use_nmea_stream_timestamp=False
+            blackvue_video,
+            use_nmea_stream_timestamp=False,
+            trace_tolerance=trace_tolerance,
+            trace_interval=trace_interval,
         )
 
         if not gpx_path or not os.path.isfile(gpx_path):
@@ -289,6 +322,8 @@ def geotag_from_gps_trace(
     sub_second_interval=0.0,
     use_gps_start_time=False,
     verbose=False,
+    trace_tolerance=0.0,
+    trace_interval=0.0,
 ):
     if geotag_source == "gpx":
         file_desc = "a GPX file"
@@ -336,7 +371,14 @@ def geotag_from_gps_trace(
         )
         return
 
-    pairs = [(ExifRead(f).extract_capture_time(), f) for f in process_file_list]
+    gps_trace = reduce_trace(
+        gps_trace, geotag_source_path, trace_tolerance, trace_interval
+    )
+
+    pairs = [
+        (image_catalog.read_exif(f).extract_capture_time(), f)
+        for f in process_file_list
+    ]
 
     if use_gps_start_time:
         filtered_pairs: List[Tuple[datetime.datetime, str]] = [
@@ -350,44 +392,71 @@ def geotag_from_gps_trace(
                 f"Use GPS start time, which is same as using offset_time={offset_time}"
             )
 
-    for capture_time, image in tqdm(
-        pairs,
-        desc="Inserting gps data into image EXIF",
-    ):
-        if capture_time is None:
-            print_error(f"Error, capture time could not be extracted for image {image}")
-            create_and_log_process(image, "geotag_process", "failed", verbose=verbose)
-        else:
-            try:
-                geotag_properties = get_geotag_properties_from_gps_trace(
-                    image, capture_time, gps_trace, offset_angle, offset_time
+    # interpolate all the capture times in one walk along the trace
+    shift = datetime.timedelta(seconds=offset_time)
+    interpolated = iter(
+        interpolate_lat_lons(
+            gps_trace,
+            [
+                capture_time - shift
+                for capture_time, _ in pairs
+                if capture_time is not None
+            ],
+        )
+    )
+
+    with state_store.transaction():
+        for capture_time, image in tqdm(
+            pairs,
+            desc="Inserting gps data into image EXIF",
+        ):
+            if capture_time is None:
+                print_error(
+                    f"Error, capture time could not be extracted for image {image}"
                 )
-            except MapillaryInterpolationError as ex:
-                raise RuntimeError(
-                    f"""Failed to interpolate image {image} with the geotag source file {geotag_source_path}. Try the following fixes:
+                create_and_log_process(
+                    image, "geotag_process", "failed", verbose=verbose
+                )
+            else:
+                interpolation = next(interpolated)
+                if isinstance(interpolation, MapillaryInterpolationError):
+                    raise RuntimeError(
+                        f"""Failed to interpolate image {image} with the geotag source file {geotag_source_path}. Try the following fixes:
 1. Specify --local_time to read the timestamps from the geotag source file as local time
 2. Use --use_gps_start_time to align the start time
 3. Manually shift the timestamps in the geotag source file with --offset_time OFFSET_IN_SECONDS
 """
-                ) from ex
+                    ) from interpolation
+                geotag_properties = get_geotag_properties_from_interpolation(
+                    capture_time - shift, interpolation, offset_angle
+                )
 
-            create_and_log_process(
-                image, "geotag_process", "success", geotag_properties, verbose
-            )
+                create_and_log_process(
+                    image, "geotag_process", "success", geotag_properties, verbose
+                )
 
 
 def get_geotag_properties_from_gps_trace(
     image,
     capture_time: datetime.datetime,
-    gps_trace: list,
+    gps_trace: Sequence[Any],
     offset_angle=0.0,
     offset_time=0.0,
 ) -> dict:
     capture_time = capture_time - datetime.timedelta(seconds=offset_time)
+    return get_geotag_properties_from_interpolation(
+        capture_time, interpolate_lat_lon(gps_trace, capture_time), offset_angle
+    )
+
 
-    lat, lon, bearing, elevation = interpolate_lat_lon(gps_trace, capture_time)
+def get_geotag_properties_from_interpolation(
+    capture_time: datetime.datetime,
+    interpolation: Tuple[float, float, float, Optional[float]],
+    offset_angle=0.0,
+) -> dict:
+    lat, lon, bearing, elevation = interpolation
 
-    geotag_properties = {
+    geotag_properties: Dict[str, Any] = {
         "MAPLatitude": lat,
         "MAPLongitude": lon,
     }
@@ -416,7 +485,8 @@ def get_upload_param_properties(
     user_key: str,
     verbose: bool = False,
 ) -> Optional[Dict]:
-    if not os.path.isdir(log_root):
+    flags = state_store.get_flags(image)
+    if not flags:
         print(
             "Warning, sequence process has not been done for image "
             + image
@@ -425,8 +495,7 @@ def get_upload_param_properties(
         return None
 
     # check if geotag process was a success
-    log_sequence_process_success = os.path.join(log_root, "sequence_process_success")
-    if not os.path.isfile(log_sequence_process_success):
+    if "sequence_process_success" not in flags:
         print(
             "Warning, sequence process failed for image "
             + image
@@ -434,23 +503,14 @@ def get_upload_param_properties(
         )
         return None
 
-    upload_params_process_success_path = os.path.join(
-        log_root, "upload_params_process_success"
-    )
+    payloads = state_store.load_jsons(image, ["user_process", "sequence_process"])
 
     # load the sequence json
-    user_process_json_path = os.path.join(log_root, "user_process.json")
-    try:
-        user_data = load_json(user_process_json_path)
-    except:
-        print(
-            f"Warning, user data not read for image {image}, therefore it will not be included in the upload params processing."
-        )
-        return None
+    user_data = payloads.get("user_process", {})
 
     if "MAPSettingsUserKey" not in user_data:
         print(
-            "Warning, user key not in user data for image {image}, therefore it will not be included in the upload params processing."
+            f"Warning, user key not in user data for image {image}, therefore it will not be included in the upload params processing."
         )
         return None
 
@@ -459,16 +519,7 @@ def get_upload_param_properties(
     private = user_data.get("MAPPrivate", False)
 
     # load the sequence json
-    sequence_process_json_path = os.path.join(log_root, "sequence_process.json")
-    try:
-        sequence_data = load_json(sequence_process_json_path)
-    except:
-        print(
-            "Warning, sequence data not read for image "
-            + image
-            + ", therefore it will not be included in the upload params processing."
-        )
-        return None
+    sequence_data = payloads.get("sequence_process", {})
 
     if "MAPSequenceUUID" not in sequence_data:
         print(
@@ -492,9 +543,8 @@ def get_upload_param_properties(
     x = base64.b64encode(image.encode("utf-8")).decode("utf-8")
     s = f"{user_upload_token}{user_key}{x}"
     settings_upload_hash = hashlib.sha256(s.encode("utf-8")).hexdigest()
-    save_json(
-        {"MAPSettingsUploadHash": settings_upload_hash},
-        os.path.join(log_root, "settings_upload_hash.json"),
+    state_store.save_json(
+        image, "settings_upload_hash", {"MAPSettingsUploadHash": settings_upload_hash}
     )
     return upload_params
 
@@ -522,11 +572,12 @@ def get_final_mapillary_image_description(
     ]
     final_mapillary_image_description = {}
 
-    for sub_command in sub_commands:
-        sub_command_status = os.path.join(log_root, sub_command + "_failed")
+    flags = state_store.get_flags(image)
+    payloads = state_store.load_jsons(image, sub_commands)
 
+    for sub_command in sub_commands:
         if (
-            os.path.isfile(sub_command_status)
+            sub_command + "_failed" in flags
             and sub_command != "import_meta_data_process"
         ):
             LOG.warning(
@@ -535,11 +586,7 @@ def get_final_mapillary_image_description(
             )
             return None
 
-        sub_command_data_path = os.path.join(log_root, sub_command + ".json")
-        if (
-            not os.path.isfile(sub_command_data_path)
-            and sub_command != "import_meta_data_process"
-        ):
+        if sub_command not in payloads and sub_command != "import_meta_data_process":
             if (
                 sub_command == "settings_upload_hash"
                 or sub_command == "upload_params_process"
@@ -556,30 +603,13 @@ def get_final_mapillary_image_description(
             or sub_command == "upload_params_process"
         ):
             continue
-        try:
-            sub_command_data = load_json(sub_command_data_path)
-            if not sub_command_data:
-                if verbose:
-                    LOG.warning(
-                        f"Warning, no data read from json file {sub_command_data_path}",
-                        exc_info=True,
-                    )
-                return None
+        sub_command_data = payloads.get(sub_command)
+        if not sub_command_data:
+            if verbose:
+                LOG.warning(f"Warning, no {sub_command} data read for image {image}")
+            return None
 
-            final_mapillary_image_description.update(sub_command_data)
-        except Exception:
-            if sub_command == "import_meta_data_process":
-                LOG.warning(
-                    "Warning, could not load json file " + sub_command_data_path,
-                    exc_info=True,
-                )
-                continue
-            else:
-                LOG.warning(
-                    "Warning, could not load json file " + sub_command_data_path,
-                    exc_info=True,
-                )
-                return None
+        final_mapillary_image_description.update(sub_command_data)
 
     # a unique photo ID to check for duplicates in the backend in case the
     # image gets uploaded more than once
@@ -588,7 +618,7 @@ def get_final_mapillary_image_description(
     if skip_EXIF_insert:
         return final_mapillary_image_description
 
-    image_exif = ExifEdit(image)
+    image_exif = exif_plan.edit(image)
 
     image_exif.add_image_description(final_mapillary_image_description)
 
@@ -633,20 +663,21 @@ def get_final_mapillary_image_description(
     else:
         target = image
 
-    image_exif.write(filename=target)
+    exif_plan.write(image_exif, filename=target)
+    image_catalog.forget_exif(target)
 
     return final_mapillary_image_description
 
 
 def get_geotag_data(log_root: str, image: str, verbose: bool = False) -> Optional[Dict]:
-    if not os.path.isdir(log_root):
+    flags = state_store.get_flags(image)
+    if not flags:
         if verbose:
             print("Warning, no logs for image " + image)
         return None
 
     # check if geotag process was a success
-    log_geotag_process_success = os.path.join(log_root, "geotag_process_success")
-    if not os.path.isfile(log_geotag_process_success):
+    if "geotag_process_success" not in flags:
         print(
             "Warning, geotag process failed for image "
             + image
@@ -654,11 +685,8 @@ def get_geotag_data(log_root: str, image: str, verbose: bool = False) -> Optiona
         )
         return None
     # load the geotag json
-    geotag_process_json_path = os.path.join(log_root, "geotag_process.json")
-    try:
-        geotag_data = load_json(geotag_process_json_path)
-        return geotag_data
-    except:
+    geotag_data = state_store.load_json(image, "geotag_process")
+    if not geotag_data:
         if verbose:
             print(
                 "Warning, geotag data not read for image "
@@ -666,6 +694,7 @@ def get_geotag_data(log_root: str, image: str, verbose: bool = False) -> Optiona
                 + ", therefore it will not be included in the sequence processing."
             )
         return None
+    return geotag_data
 
 
 def format_orientation(orientation):
@@ -715,13 +744,27 @@ def get_process_file_list(
     rerun: bool = False,
     skip_subfolders: bool = False,
 ) -> List[str]:
-    files = uploader.iterate_files(import_path, not skip_subfolders)
-    sorted_files = sorted(
-        file
-        for file in files
-        if uploader.is_image_file(file) and preform_process(file, process, rerun)
-    )
-    return sorted_files
+    return [
+        entry.path
+        for entry in get_process_file_entries(
+            import_path, process, rerun, skip_subfolders
+        )
+    ]
+
+
+def get_process_file_entries(
+    import_path: str,
+    process: str,
+    rerun: bool = False,
+    skip_subfolders: bool = False,
+) -> List[uploader.FileEntry]:
+    entries = uploader.get_total_file_entries(import_path, skip_subfolders)
+    flags = state_store.bulk_flags(entry.path for entry in entries)
+    return [
+        entry
+        for entry in entries
+        if preform_process(entry.path, process, rerun, flags[entry.path])
+    ]
 
 
 def get_process_status_file_list(
@@ -730,41 +773,45 @@ def get_process_status_file_list(
     status: str,
     skip_subfolders: bool = False,
 ) -> List[str]:
-    files = uploader.iterate_files(import_path, not skip_subfolders)
-    return sorted(
-        file
-        for file in files
-        if uploader.is_image_file(file) and process_status(file, process, status)
-    )
+    files = uploader.get_total_file_list(import_path, skip_subfolders)
+    flags = state_store.bulk_flags(files)
+    return [
+        file for file in files if process_status(file, process, status, flags[file])
+    ]
 
 
-def process_status(file_path: str, process: str, status: str) -> bool:
-    log_root = uploader.log_rootpath(file_path)
-    status_file = os.path.join(log_root, process + "_" + status)
-    return os.path.isfile(status_file)
+def process_status(
+    file_path: str, process: str, status: str, flags: Optional[Set[str]] = None
+) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
+    return process + "_" + status in flags
 
 
 def get_duplicate_file_list(
     import_path: str, skip_subfolders: bool = False
 ) -> List[str]:
-    files = uploader.iterate_files(import_path, not skip_subfolders)
-    return sorted(
-        file for file in files if uploader.is_image_file(file) and is_duplicate(file)
-    )
+    files = uploader.get_total_file_list(import_path, skip_subfolders)
+    flags = state_store.bulk_flags(files)
+    return [file for file in files if is_duplicate(file, flags[file])]
 
 
-def is_duplicate(file_path: str) -> bool:
-    log_root = uploader.log_rootpath(file_path)
-    duplicate_flag_path = os.path.join(log_root, "duplicate")
-    return os.path.isfile(duplicate_flag_path)
+def is_duplicate(file_path: str, flags: Optional[Set[str]] = None) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
+    return "duplicate" in flags
 
 
-def preform_process(file_path: str, process: str, rerun: bool = False) -> bool:
-    log_root = uploader.log_rootpath(file_path)
-    process_succes = os.path.join(log_root, process + "_success")
-    upload_succes = os.path.join(log_root, "upload_success")
-    preform = not os.path.isfile(upload_succes) and (
-        not os.path.isfile(process_succes) or rerun
+def preform_process(
+    file_path: str,
+    process: str,
+    rerun: bool = False,
+    flags: Optional[Set[str]] = None,
+) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
+    preform = "upload_success" not in flags and (
+        process + "_success" not in flags or rerun
     )
     return preform
 
@@ -798,28 +845,18 @@ def video_upload(video_file, import_path, verbose=False):
 
 
 def create_and_log_video_process(video_file, import_path):
-    log_root = uploader.log_rootpath(video_file)
-    if not os.path.isdir(log_root):
-        os.makedirs(log_root)
     # set the log flags for process
-    log_process = os.path.join(log_root, "video_process.json")
     import_paths = video_import_paths(video_file)
     if import_path in import_paths:
         return
     import_paths.append(import_path)
-    video_process = load_json(log_process)
+    video_process = state_store.load_json(video_file, "video_process")
     video_process.update({"sample_paths": import_paths})
-    save_json(video_process, log_process)
+    state_store.save_json(video_file, "video_process", video_process)
 
 
 def video_import_paths(video_file):
-    log_root = uploader.log_rootpath(video_file)
-    if not os.path.isdir(log_root):
-        return []
-    log_process = os.path.join(log_root, "video_process.json")
-    if not os.path.isfile(log_process):
-        return []
-    video_process = load_json(log_process)
+    video_process = state_store.load_json(video_file, "video_process")
     if "sample_paths" in video_process:
         return video_process["sample_paths"]
     return []
@@ -834,8 +871,11 @@ def create_and_log_process_in_list(
 ) -> None:
     if mapillary_description is None:
         mapillary_description = {}
-    for image in tqdm(process_file_list, desc="Logging"):
-        create_and_log_process(image, process, status, mapillary_description, verbose)
+    with state_store.transaction():
+        for image in tqdm(process_file_list, desc="Logging"):
+            create_and_log_process(
+                image, process, status, mapillary_description, verbose
+            )
 
 
 def create_and_log_process(
@@ -848,43 +888,26 @@ def create_and_log_process(
     if mapillary_description is None:
         mapillary_description = {}
 
-    # set log path
-    log_root = uploader.log_rootpath(image)
-    # make all the dirs if not there
-    if not os.path.isdir(log_root):
-        os.makedirs(log_root)
-
-    # set the log flags for process
-    log_process = os.path.join(log_root, process)
-    log_process_succes = f"{log_process}_success"
-    log_process_failed = f"{log_process}_failed"
-    log_MAPJson = os.path.join(log_root, process + ".json")
-
     if not mapillary_description:
         status = "failed"
 
-    if status == "success":
-        suffix = str(time.strftime("%Y_%m_%d_%H_%M_%S", time.gmtime()))
-        save_json(mapillary_description, log_MAPJson)
-        open(log_process_succes, "w").close()
-        open(f"{log_process_succes}_{suffix}", "w").close()
-        # if there is a failed log from before, remove it
-        if os.path.isfile(log_process_failed):
-            os.remove(log_process_failed)
-    else:
-        open(log_process_failed, "w").close()
-        suffix = str(time.strftime("%Y_%m_%d_%H_%M_%S", time.gmtime()))
-        open(f"{log_process_failed}_{suffix}", "w").close()
-        # if there is a success log from before, remove it
-        if os.path.isfile(log_process_succes):
-            os.remove(log_process_succes)
-        # if there is meta data from before, remove it
-        if os.path.isfile(log_MAPJson):
-            if verbose:
-                print(
-                    f"Warning, {process} in this run has failed, previously generated properties will be removed."
-                )
-            os.remove(log_MAPJson)
+    with state_store.get_store(image).transaction():
+        if status == "success":
+            state_store.save_json(image, process, mapillary_description)
+            state_store.set_flag(image, f"{process}_success", history=True)
+            # if there is a failed log from before, remove it
+            state_store.clear_flag(image, f"{process}_failed")
+        else:
+            state_store.set_flag(image, f"{process}_failed", history=True)
+            # if there is a success log from before, remove it
+            state_store.clear_flag(image, f"{process}_success")
+            # if there is meta data from before, remove it
+            if state_store.has_json(image, process):
+                if verbose:
+                    print(
+                        f"Warning, {process} in this run has failed, previously generated properties will be removed."
+                    )
+                state_store.remove_json(image, process)
 
     decoded_image = force_decode(image)
 
@@ -928,9 +951,7 @@ def load_geotag_points(
         ) if "MAPCompassHeading" in geotag_data else directions.append(0.0)
 
         # remove previously created duplicate flags
-        duplicate_flag_path = os.path.join(log_root, "duplicate")
-        if os.path.isfile(duplicate_flag_path):
-            os.remove(duplicate_flag_path)
+        state_store.clear_flag(image, "duplicate")
 
     return file_list, capture_times, lats, lons, directions
 
@@ -970,7 +991,7 @@ def split_sequences(
         capture_deltas = [t2 - t1 for t1, t2 in zip(capture_times, capture_times[1:])]
 
         # distance between consecutive images
-        distances = [gps_distance(ll1, ll2) for ll1, ll2 in zip(latlons, latlons[1:])]
+        distances = consecutive_gps_distances(latlons)
 
         # if cutoff time is given use that, else assume cutoff is
         # 1.5x median time delta
@@ -996,9 +1017,9 @@ def split_sequences(
                 sequences.append(
                     {
                         "file_list": [filepath],
-                        "directions": [directions[1:][i]],
-                        "latlons": [latlons[1:][i]],
-                        "capture_times": [capture_times[1:][i]],
+                        "directions": [directions[i + 1]],
+                        "latlons": [latlons[i + 1]],
+                        "capture_times": [capture_times[i + 1]],
                     }
                 )
                 if verbose:
@@ -1014,9 +1035,9 @@ def split_sequences(
                 # delta not too big, continue with current
                 # group
                 sequences[sequence_index]["file_list"].append(filepath)
-                sequences[sequence_index]["directions"].append(directions[1:][i])
-                sequences[sequence_index]["latlons"].append(latlons[1:][i])
-                sequences[sequence_index]["capture_times"].append(capture_times[1:][i])
+                sequences[sequence_index]["directions"].append(directions[i + 1])
+                sequences[sequence_index]["latlons"].append(latlons[i + 1])
+                sequences[sequence_index]["capture_times"].append(capture_times[i + 1])
     return sequences
 
 
@@ -0,0 +1,202 @@
+import json
+import os
+import time
+import typing as T
+
+from . import state_store
+
+"""
+Optional index that makes rescans of large, mostly unchanged import paths cheap.
+
+The index is kept at <import_path>/.mapillary/scan_index.json and remembers:
+- for every directory its mtime and listing, so an unchanged directory costs
+  one stat instead of a full listing
+- for every image with a .mapillary/logs entry the mtime of that log directory
+  and the flags found in it, so the state of an unchanged image does not have
+  to be read again
+
+Adding, removing or renaming entries changes the mtime of the directory
+holding them, which is what invalidates a cached listing or set of flags.
+"""
+
+SCAN_INDEX_FILENAME = "scan_index.json"
+SCAN_INDEX_VERSION = 1
+
+# a directory modified within this window before it was read may be modified
+# again within the same mtime tick without its mtime changing, so it is not cached
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def scan_index_path(root: str) -> str:
+    return os.path.join(root, ".mapillary", SCAN_INDEX_FILENAME)
+
+
+def _now_ns() -> int:
+    return int(time.time() * 1e9)
+
+
+class ScanIndex:
+    """
+    Directory listings and image flags of one import path, keyed by their
+    path relative to root
+    """
+
+    root: str
+    path: str
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.abspath(root)
+        self.path = scan_index_path(self.root)
+        # relative directory -> [mtime_ns, files, subdirectories]
+        self.directories: T.Dict[str, T.List] = {}
+        # relative log directory -> [mtime_ns, flags]
+        self.logs: T.Dict[str, T.List] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("version") != SCAN_INDEX_VERSION:
+            return
+        self.directories = data.get("directories", {})
+        self.logs = data.get("logs", {})
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "version": SCAN_INDEX_VERSION,
+                    "directories": self.directories,
+                    "logs": self.logs,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def contains(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def _cache(self, table: T.Dict[str, T.List], key: str, value: T.List) -> None:
+        if value[0] < _now_ns() - _RACY_WINDOW_NS:
+            if table.get(key) != value:
+                table[key] = value
+                self.dirty = True
+        elif key in table:
+            del table[key]
+            self.dirty = True
+
+    def list_directory(self, dirpath: str) -> T.Tuple[T.List[str], T.List[str]]:
+        """
+        Return the file names and the names of the non-hidden subdirectories
+        (symlinks excluded) of dirpath
+        """
+        try:
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return [], []
+        key = self._key(dirpath)
+        cached = self.directories.get(key)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1], cached[2]
+        files: T.List[str] = []
+        subdirs: T.List[str] = []
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if not entry.name.startswith(".") and not entry.is_symlink():
+                            subdirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return [], []
+        self._cache(self.directories, key, [mtime_ns, files, subdirs])
+        return files, subdirs
+
+    def iterate_files(
+        self, root: str, recursive: bool = False
+    ) -> T.Generator[str, None, None]:
+        stack = [root]
+        while stack:
+            dirpath = stack.pop()
+            files, subdirs = self.list_directory(dirpath)
+            for name in files:
+                yield os.path.join(dirpath, name)
+            if recursive:
+                stack.extend(os.path.join(dirpath, name) for name in reversed(subdirs))
+
+    def log_flags(
+        self, image: str, log_entry: os.DirEntry, read_flags: T.Callable[[str], T.Set]
+    ) -> T.Set[str]:
+        """
+        Return the flags of image from the index if its log directory did not
+        change since they were read, otherwise read them with read_flags
+        """
+        try:
+            mtime_ns = log_entry.stat().st_mtime_ns
+        except FileNotFoundError:
+            return set()
+        key = self._key(log_entry.path)
+        cached = self.logs.get(key)
+        if cached is not None and cached[0] == mtime_ns:
+            return set(cached[1])
+        flags = read_flags(image)
+        self._cache(self.logs, key, [mtime_ns, sorted(flags)])
+        return flags
+
+
+class IndexedFileStateStore(state_store.FileStateStore):
+    """
+    Flag file store that reuses the flags recorded in the scan index
+    """
+
+    def _logged_flags(self, image: str, log_entry: os.DirEntry) -> T.Set[str]:
+        index = find_index(image)
+        if index is None:
+            return self.flags(image)
+        return index.log_flags(image, log_entry, self.flags)
+
+
+_INDEXES: T.Dict[str, ScanIndex] = {}
+
+
+def find_index(path: str) -> T.Optional[ScanIndex]:
+    for index in _INDEXES.values():
+        if index.contains(path):
+            return index
+    return None
+
+
+def enable(root: str) -> ScanIndex:
+    """
+    Use (and keep up to date) the scan index of root for all paths under it
+    """
+    root = os.path.abspath(root)
+    index = _INDEXES.get(root)
+    if index is None:
+        # create .mapillary up front, creating it when saving would change
+        # the mtime of root and invalidate its listing
+        os.makedirs(os.path.dirname(scan_index_path(root)), exist_ok=True)
+        index = ScanIndex(root)
+        _INDEXES[root] = index
+    if not isinstance(state_store.get_file_store(), IndexedFileStateStore):
+        state_store.use_file_store(IndexedFileStateStore())
+    return index
+
+
+def save_all() -> None:
+    for index in _INDEXES.values():
+        index.save()
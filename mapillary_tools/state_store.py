@@ -0,0 +1,958 @@
+"""
+Per-image processing state: status flags (e.g. geotag_process_success, duplicate,
+upload_success) and the JSON payloads produced by the processing stages.
+
+Two backends are available:
+- FileStateStore keeps the state as flag and JSON files in .mapillary/logs/<image>
+  next to each image (the default)
+- SQLiteStateStore keeps the state of a whole import path in a single database
+  at <import_path>/.mapillary/mapillary_state.db
+
+The backend of an image is resolved from its location: if any parent directory
+contains a state database, that database is used, otherwise the flag files.
+"""
+
+import contextlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+import typing as T
+
+from . import image_catalog
+
+STATE_DB_FILENAME = "mapillary_state.db"
+HISTORY_TIME_FORMAT = "%Y_%m_%d_%H_%M_%S"
+# timestamped flags folded into one file by compact_logs
+HISTORY_RECORD_FILENAME = "history.json"
+# number of buffered updates after which a batch of the file store is flushed
+JOURNAL_BATCH_SIZE = 1000
+# images per query of the bulk reads of the SQLite store, within the default
+# limit of 999 parameters of old SQLite versions
+SQLITE_BATCH_SIZE = 500
+_HISTORY_SUFFIX = re.compile(r"_\d{4}_\d{2}_\d{2}_\d{2}_\d{2}_\d{2}$")
+
+
+class ImageState(T.NamedTuple):
+    flags: T.Set[str]
+    payloads: T.Dict[str, T.Any]
+    history: T.List[T.Tuple[str, str]]
+
+
+def log_rootpath(filepath: str) -> str:
+    return os.path.join(
+        os.path.dirname(filepath),
+        ".mapillary",
+        "logs",
+        os.path.splitext(os.path.basename(filepath))[0],
+    )
+
+
+def state_db_path(root: str) -> str:
+    return os.path.join(root, ".mapillary", STATE_DB_FILENAME)
+
+
+def journal_dirpath(filepath: str) -> str:
+    return os.path.join(os.path.dirname(filepath), ".mapillary", "journal")
+
+
+def history_suffix() -> str:
+    return time.strftime(HISTORY_TIME_FORMAT, time.gmtime())
+
+
+def is_history_entry(name: str) -> bool:
+    return _HISTORY_SUFFIX.search(name) is not None
+
+
+def split_history_entry(name: str) -> T.Tuple[str, str]:
+    """
+    Split a timestamped flag name into the flag and its timestamp
+
+    >>> split_history_entry("upload_success_2021_06_01_12_30_00")
+    ('upload_success', '2021_06_01_12_30_00')
+    """
+    match = _HISTORY_SUFFIX.search(name)
+    if match is None:
+        raise ValueError(f"{name} is not a timestamped flag")
+    return name[: match.start()], match.group(0)[1:]
+
+
+def read_history_record(log_root: str) -> T.List[T.Tuple[str, str]]:
+    try:
+        with open(os.path.join(log_root, HISTORY_RECORD_FILENAME), "r") as f:
+            return [(flag, created_at) for flag, created_at in json.load(f)]
+    except FileNotFoundError:
+        return []
+
+
+def write_history_record(log_root: str, history: T.Iterable[T.Tuple[str, str]]) -> None:
+    record_path = os.path.join(log_root, HISTORY_RECORD_FILENAME)
+    # keep the .json extension so that a leftover file is never taken for a flag
+    tmp_path = os.path.join(log_root, "history.tmp.json")
+    with open(tmp_path, "w") as f:
+        json.dump(sorted(set(history)), f)
+    os.replace(tmp_path, record_path)
+
+
+class StateStore:
+    """
+    Base class of the image state backends
+    """
+
+    def flags(self, image: str) -> T.Set[str]:
+        raise NotImplementedError
+
+    def bulk_flags(self, images: T.Iterable[str]) -> T.Dict[str, T.Set[str]]:
+        return {image: self.flags(image) for image in images}
+
+    def set_flag(self, image: str, flag: str, history: bool = False) -> None:
+        raise NotImplementedError
+
+    def clear_flag(self, image: str, flag: str) -> None:
+        raise NotImplementedError
+
+    def has_json(self, image: str, name: str) -> bool:
+        raise NotImplementedError
+
+    def load_json(self, image: str, name: str) -> T.Dict:
+        raise NotImplementedError
+
+    def load_jsons(self, image: str, names: T.Iterable[str]) -> T.Dict[str, T.Dict]:
+        """
+        Load several payloads of one image, missing payloads are left out
+        """
+        return {
+            name: self.load_json(image, name)
+            for name in names
+            if self.has_json(image, name)
+        }
+
+    def bulk_load_json(self, images: T.Iterable[str], name: str) -> T.Dict[str, T.Dict]:
+        return {
+            image: self.load_json(image, name)
+            for image in images
+            if self.has_json(image, name)
+        }
+
+    def save_json(self, image: str, name: str, data: T.Any) -> None:
+        raise NotImplementedError
+
+    def remove_json(self, image: str, name: str) -> None:
+        raise NotImplementedError
+
+    def export_state(self, image: str) -> T.Optional[ImageState]:
+        raise NotImplementedError
+
+    def import_state(self, image: str, state: ImageState) -> None:
+        raise NotImplementedError
+
+    def delete(self, image: str) -> None:
+        raise NotImplementedError
+
+    def move(self, image: str, destination: str) -> None:
+        state = self.export_state(image)
+        if state is None:
+            return
+        self.import_state(destination, state)
+        self.delete(image)
+
+    @contextlib.contextmanager
+    def transaction(self) -> T.Generator[None, None, None]:
+        yield
+
+
+class FileStateStore(StateStore):
+    """
+    State kept as flag files and JSON files under .mapillary/logs/<image>
+
+    Within batch(), updates are buffered and written to a journal under
+    .mapillary/journal with one fsync per directory and batch, then applied to
+    the log files. A journal left behind by a crash is replayed the next time
+    an image of that directory is accessed. The journals are named by the pid
+    of their process, those of processes still running are left to them.
+    """
+
+    def __init__(self) -> None:
+        self._batch_depth = 0
+        self._pending: T.List[T.Tuple[str, str, T.Tuple]] = []
+        self._pending_images: T.Set[str] = set()
+        self._recovered_dirs: T.Set[str] = set()
+
+    @contextlib.contextmanager
+    def batch(self) -> T.Generator[None, None, None]:
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        self._pending_images = set()
+
+        journals: T.Dict[str, T.List[str]] = {}
+        for op, image, args in pending:
+            image = os.path.abspath(image)
+            journals.setdefault(journal_dirpath(image), []).append(
+                json.dumps([op, image, *args])
+            )
+        journal_paths = []
+        for journal_dir, lines in journals.items():
+            os.makedirs(journal_dir, exist_ok=True)
+            journal_path = os.path.join(journal_dir, f"{os.getpid()}.jsonl")
+            with open(journal_path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            journal_paths.append(journal_path)
+
+        for op, image, args in pending:
+            self._apply(op, image, args)
+
+        for journal_path in journal_paths:
+            _remove_journal(journal_path)
+
+    def _recover(self, image: str) -> None:
+        journal_dir = journal_dirpath(os.path.abspath(image))
+        if journal_dir in self._recovered_dirs:
+            return
+        self._recovered_dirs.add(journal_dir)
+        try:
+            names = sorted(os.listdir(journal_dir))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        for name in names:
+            pid = os.path.splitext(name)[0]
+            # a journal of this pid is from a crashed process before it
+            if pid.isdigit() and int(pid) != os.getpid() and _process_exists(int(pid)):
+                continue
+            journal_path = os.path.join(journal_dir, name)
+            with open(journal_path, "r") as f:
+                for line in f:
+                    try:
+                        op, logged_image, *args = json.loads(line)
+                    except ValueError:
+                        # the tail of a journal whose write was interrupted
+                        break
+                    self._apply(op, logged_image, tuple(args))
+            _remove_journal(journal_path)
+
+    def _sync(self, image: str) -> None:
+        """
+        Replay the journal of the directory of image and flush the buffered
+        updates of image, so that reads see all of its updates
+        """
+        self._recover(image)
+        if image in self._pending_images:
+            self.flush()
+
+    def _write(self, op: str, image: str, *args) -> None:
+        self._recover(image)
+        if self._batch_depth:
+            self._pending.append((op, image, args))
+            self._pending_images.add(image)
+            if len(self._pending) >= JOURNAL_BATCH_SIZE:
+                self.flush()
+        else:
+            self._apply(op, image, args)
+
+    def _apply(self, op: str, image: str, args: T.Tuple) -> None:
+        getattr(self, f"_{op}")(image, *args)
+
+    def flags(self, image: str) -> T.Set[str]:
+        self._sync(image)
+        try:
+            names = os.listdir(log_rootpath(image))
+        except (FileNotFoundError, NotADirectoryError):
+            return set()
+        return {
+            name
+            for name in names
+            if not name.endswith(".json") and not is_history_entry(name)
+        }
+
+    def bulk_flags(self, images: T.Iterable[str]) -> T.Dict[str, T.Set[str]]:
+        # list each .mapillary/logs once so images without a log directory
+        # (e.g. all of them before the first run) cost no system call
+        logged: T.Dict[str, T.Dict[str, os.DirEntry]] = {}
+        result: T.Dict[str, T.Set[str]] = {}
+        for image in images:
+            self._sync(image)
+            logs_dir = os.path.dirname(log_rootpath(image))
+            entries = logged.get(logs_dir)
+            if entries is None:
+                try:
+                    with os.scandir(logs_dir) as it:
+                        entries = {entry.name: entry for entry in it if entry.is_dir()}
+                except (FileNotFoundError, NotADirectoryError):
+                    entries = {}
+                logged[logs_dir] = entries
+            log_entry = entries.get(os.path.splitext(os.path.basename(image))[0])
+            if log_entry is None:
+                result[image] = set()
+            else:
+                result[image] = self._logged_flags(image, log_entry)
+        return result
+
+    def _logged_flags(self, image: str, log_entry: os.DirEntry) -> T.Set[str]:
+        return self.flags(image)
+
+    def _read_json(self, image: str, name: str) -> T.Optional[T.Dict]:
+        self._sync(image)
+        try:
+            with open(os.path.join(log_rootpath(image), name + ".json"), "rb") as f:
+                return json.load(f)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except:
+            return {}
+
+    def load_jsons(self, image: str, names: T.Iterable[str]) -> T.Dict[str, T.Dict]:
+        payloads = {}
+        for name in names:
+            data = self._read_json(image, name)
+            if data is not None:
+                payloads[name] = data
+        return payloads
+
+    def bulk_load_json(self, images: T.Iterable[str], name: str) -> T.Dict[str, T.Dict]:
+        payloads = {}
+        for image in images:
+            data = self._read_json(image, name)
+            if data is not None:
+                payloads[image] = data
+        return payloads
+
+    def set_flag(self, image: str, flag: str, history: bool = False) -> None:
+        # the timestamp is taken now, so that replaying the journal creates
+        # the same history entry
+        self._write("set_flag", image, flag, history_suffix() if history else None)
+
+    def _set_flag(self, image: str, flag: str, created_at: T.Optional[str]) -> None:
+        log_root = log_rootpath(image)
+        os.makedirs(log_root, exist_ok=True)
+        flag_path = os.path.join(log_root, flag)
+        open(flag_path, "w").close()
+        if created_at is not None:
+            open(f"{flag_path}_{created_at}", "w").close()
+
+    def clear_flag(self, image: str, flag: str) -> None:
+        self._write("clear_flag", image, flag)
+
+    def _clear_flag(self, image: str, flag: str) -> None:
+        flag_path = os.path.join(log_rootpath(image), flag)
+        if os.path.isfile(flag_path):
+            os.remove(flag_path)
+
+    def has_json(self, image: str, name: str) -> bool:
+        self._sync(image)
+        return os.path.isfile(os.path.join(log_rootpath(image), name + ".json"))
+
+    def load_json(self, image: str, name: str) -> T.Dict:
+        self._sync(image)
+        try:
+            with open(os.path.join(log_rootpath(image), name + ".json"), "rb") as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def save_json(self, image: str, name: str, data: T.Any) -> None:
+        try:
+            buf = json.dumps(data, indent=4)
+        except Exception:
+            raise RuntimeError(f"Error JSON serializing {data}")
+        self._write("write_json", image, name, buf)
+
+    def _write_json(self, image: str, name: str, buf: str) -> None:
+        log_root = log_rootpath(image)
+        os.makedirs(log_root, exist_ok=True)
+        with open(os.path.join(log_root, name + ".json"), "w") as f:
+            f.write(buf)
+
+    def remove_json(self, image: str, name: str) -> None:
+        self._write("remove_json", image, name)
+
+    def _remove_json(self, image: str, name: str) -> None:
+        json_path = os.path.join(log_rootpath(image), name + ".json")
+        if os.path.isfile(json_path):
+            os.remove(json_path)
+
+    def export_state(self, image: str) -> T.Optional[ImageState]:
+        self._sync(image)
+        log_root = log_rootpath(image)
+        if not os.path.isdir(log_root):
+            return None
+        state = ImageState(set(), {}, [])
+        for name in sorted(os.listdir(log_root)):
+            if not os.path.isfile(os.path.join(log_root, name)):
+                continue
+            if name == HISTORY_RECORD_FILENAME:
+                state.history.extend(read_history_record(log_root))
+            elif name.endswith(".json"):
+                state.payloads[name[: -len(".json")]] = self.load_json(
+                    image, name[: -len(".json")]
+                )
+            elif is_history_entry(name):
+                state.history.append(split_history_entry(name))
+            else:
+                state.flags.add(name)
+        state.history.sort()
+        return state
+
+    def import_state(self, image: str, state: ImageState) -> None:
+        self._sync(image)
+        log_root = log_rootpath(image)
+        os.makedirs(log_root, exist_ok=True)
+        for flag in state.flags:
+            open(os.path.join(log_root, flag), "w").close()
+        for flag, created_at in state.history:
+            open(os.path.join(log_root, f"{flag}_{created_at}"), "w").close()
+        for name, data in state.payloads.items():
+            self._write_json(image, name, json.dumps(data, indent=4))
+
+    def delete(self, image: str) -> None:
+        self._sync(image)
+        log_root = log_rootpath(image)
+        if os.path.isdir(log_root):
+            shutil.rmtree(log_root)
+
+    def move(self, image: str, destination: str) -> None:
+        self._sync(image)
+        self._sync(destination)
+        log_root = log_rootpath(image)
+        if not os.path.isdir(log_root):
+            return
+        destination_log_root = log_rootpath(destination)
+        os.makedirs(os.path.dirname(destination_log_root), exist_ok=True)
+        os.rename(log_root, destination_log_root)
+
+
+def _process_exists(pid: int) -> bool:
+    if sys.platform == "win32":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        # STILL_ACTIVE
+        return exit_code.value == 259
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running as another user
+        return True
+    return True
+
+
+def _remove_journal(journal_path: str) -> None:
+    try:
+        os.remove(journal_path)
+    except FileNotFoundError:
+        # replayed and removed by another process
+        pass
+    try:
+        os.rmdir(os.path.dirname(journal_path))
+    except OSError:
+        pass
+
+
+class SQLiteStateStore(StateStore):
+    """
+    State of all images under root kept in one SQLite database
+    """
+
+    root: str
+    db_path: str
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.abspath(root)
+        self.db_path = state_db_path(self.root)
+        self._conn: T.Optional[sqlite3.Connection] = None
+        self._pid: T.Optional[int] = None
+        self._in_transaction = False
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # connections must not be shared with forked worker processes
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(
+                self.db_path, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS flags (
+                    image TEXT NOT NULL,
+                    flag TEXT NOT NULL,
+                    PRIMARY KEY (image, flag)
+                );
+                CREATE TABLE IF NOT EXISTS payloads (
+                    image TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (image, name)
+                );
+                CREATE TABLE IF NOT EXISTS history (
+                    image TEXT NOT NULL,
+                    flag TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS history_image ON history (image);
+                """
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+            self._in_transaction = False
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def key(self, image: str) -> str:
+        return os.path.relpath(os.path.abspath(image), self.root).replace(os.sep, "/")
+
+    def contains(self, path: str) -> bool:
+        relpath = os.path.relpath(os.path.abspath(path), self.root)
+        return relpath != os.pardir and not relpath.startswith(os.pardir + os.sep)
+
+    def flags(self, image: str) -> T.Set[str]:
+        rows = self.conn.execute(
+            "SELECT flag FROM flags WHERE image = ?", (self.key(image),)
+        )
+        return {row[0] for row in rows}
+
+    def _select_images(
+        self, query: str, keys: T.List[str], *params: T.Any
+    ) -> T.Iterator[T.Tuple]:
+        """
+        Run query, whose last parameter is the list of image keys, with
+        batches of keys
+        """
+        for i in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = keys[i : i + SQLITE_BATCH_SIZE]
+            yield from self.conn.execute(
+                query.format(", ".join("?" * len(batch))), (*params, *batch)
+            )
+
+    def bulk_flags(self, images: T.Iterable[str]) -> T.Dict[str, T.Set[str]]:
+        keys = {self.key(image): image for image in images}
+        result: T.Dict[str, T.Set[str]] = {image: set() for image in keys.values()}
+        for key, flag in self._select_images(
+            "SELECT image, flag FROM flags WHERE image IN ({})", list(keys)
+        ):
+            result[keys[key]].add(flag)
+        return result
+
+    def set_flag(self, image: str, flag: str, history: bool = False) -> None:
+        key = self.key(image)
+        with self.transaction():
+            self.conn.execute(
+                "INSERT OR IGNORE INTO flags (image, flag) VALUES (?, ?)", (key, flag)
+            )
+            if history:
+                self.conn.execute(
+                    "INSERT INTO history (image, flag, created_at) VALUES (?, ?, ?)",
+                    (key, flag, history_suffix()),
+                )
+
+    def clear_flag(self, image: str, flag: str) -> None:
+        self.conn.execute(
+            "DELETE FROM flags WHERE image = ? AND flag = ?", (self.key(image), flag)
+        )
+
+    def has_json(self, image: str, name: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM payloads WHERE image = ? AND name = ?",
+            (self.key(image), name),
+        ).fetchone()
+        return row is not None
+
+    def load_json(self, image: str, name: str) -> T.Dict:
+        row = self.conn.execute(
+            "SELECT data FROM payloads WHERE image = ? AND name = ?",
+            (self.key(image), name),
+        ).fetchone()
+        if row is None:
+            return {}
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return {}
+
+    def load_jsons(self, image: str, names: T.Iterable[str]) -> T.Dict[str, T.Dict]:
+        names = list(names)
+        rows = self.conn.execute(
+            "SELECT name, data FROM payloads WHERE image = ?", (self.key(image),)
+        )
+        payloads = {}
+        for name, data in rows:
+            if name in names:
+                try:
+                    payloads[name] = json.loads(data)
+                except ValueError:
+                    payloads[name] = {}
+        return payloads
+
+    def bulk_load_json(self, images: T.Iterable[str], name: str) -> T.Dict[str, T.Dict]:
+        keys = {self.key(image): image for image in images}
+        payloads = {}
+        rows = self._select_images(
+            "SELECT image, data FROM payloads WHERE name = ? AND image IN ({})",
+            list(keys),
+            name,
+        )
+        for key, data in rows:
+            image = keys[key]
+            try:
+                payloads[image] = json.loads(data)
+            except ValueError:
+                payloads[image] = {}
+        return payloads
+
+    def save_json(self, image: str, name: str, data: T.Any) -> None:
+        try:
+            buf = json.dumps(data)
+        except Exception:
+            raise RuntimeError(f"Error JSON serializing {data}")
+        self.conn.execute(
+            "INSERT OR REPLACE INTO payloads (image, name, data) VALUES (?, ?, ?)",
+            (self.key(image), name, buf),
+        )
+
+    def remove_json(self, image: str, name: str) -> None:
+        self.conn.execute(
+            "DELETE FROM payloads WHERE image = ? AND name = ?",
+            (self.key(image), name),
+        )
+
+    def export_state(self, image: str) -> T.Optional[ImageState]:
+        key = self.key(image)
+        state = ImageState(
+            self.flags(image),
+            self.load_jsons(
+                image,
+                [
+                    row[0]
+                    for row in self.conn.execute(
+                        "SELECT name FROM payloads WHERE image = ?", (key,)
+                    )
+                ],
+            ),
+            [
+                (row[0], row[1])
+                for row in self.conn.execute(
+                    "SELECT flag, created_at FROM history WHERE image = ? ORDER BY rowid",
+                    (key,),
+                )
+            ],
+        )
+        if not state.flags and not state.payloads and not state.history:
+            return None
+        return state
+
+    def import_state(self, image: str, state: ImageState) -> None:
+        key = self.key(image)
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO flags (image, flag) VALUES (?, ?)",
+                [(key, flag) for flag in state.flags],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO payloads (image, name, data) VALUES (?, ?, ?)",
+                [
+                    (key, name, json.dumps(data))
+                    for name, data in state.payloads.items()
+                ],
+            )
+            self.conn.executemany(
+                "INSERT INTO history (image, flag, created_at) VALUES (?, ?, ?)",
+                [(key, flag, created_at) for flag, created_at in state.history],
+            )
+
+    def delete(self, image: str) -> None:
+        key = self.key(image)
+        with self.transaction():
+            for table in ["flags", "payloads", "history"]:
+                self.conn.execute(f"DELETE FROM {table} WHERE image = ?", (key,))
+
+    def move(self, image: str, destination: str) -> None:
+        if not self.contains(destination):
+            super().move(image, destination)
+            return
+        key, destination_key = self.key(image), self.key(destination)
+        with self.transaction():
+            for table in ["flags", "payloads", "history"]:
+                self.conn.execute(
+                    f"UPDATE {table} SET image = ? WHERE image = ?",
+                    (destination_key, key),
+                )
+
+    @contextlib.contextmanager
+    def transaction(self) -> T.Generator[None, None, None]:
+        conn = self.conn
+        if self._in_transaction:
+            yield
+            return
+        conn.execute("BEGIN")
+        self._in_transaction = True
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._in_transaction = False
+
+
+_FILE_STORE = FileStateStore()
+# opened SQLite stores keyed by their root directory
+_SQLITE_STORES: T.Dict[str, SQLiteStateStore] = {}
+# resolved store for each directory seen so far
+_DIRECTORY_STORES: T.Dict[str, StateStore] = {}
+
+
+def get_file_store() -> FileStateStore:
+    return _FILE_STORE
+
+
+def use_file_store(store: FileStateStore) -> None:
+    """
+    Replace the store used for images outside of any state database
+    """
+    global _FILE_STORE
+    _FILE_STORE = store
+    _DIRECTORY_STORES.clear()
+
+
+def _find_store(dirname: str) -> StateStore:
+    current = dirname
+    while True:
+        store = _SQLITE_STORES.get(current)
+        if store is not None:
+            return store
+        if os.path.isfile(state_db_path(current)):
+            store = SQLiteStateStore(current)
+            _SQLITE_STORES[current] = store
+            return store
+        parent = os.path.dirname(current)
+        if parent == current:
+            return _FILE_STORE
+        current = parent
+
+
+def get_store(path: str) -> StateStore:
+    """
+    Return the state store of the image (or video) at path
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    store = _DIRECTORY_STORES.get(dirname)
+    if store is None:
+        store = _find_store(dirname)
+        _DIRECTORY_STORES[dirname] = store
+    return store
+
+
+def group_by_store(
+    paths: T.Iterable[str],
+) -> T.List[T.Tuple[StateStore, T.List[str]]]:
+    groups: T.Dict[int, T.Tuple[StateStore, T.List[str]]] = {}
+    for path in paths:
+        store = get_store(path)
+        groups.setdefault(id(store), (store, []))[1].append(path)
+    return list(groups.values())
+
+
+def get_flags(path: str) -> T.Set[str]:
+    if image_catalog.active() is not None:
+        return bulk_flags([path])[path]
+    return get_store(path).flags(path)
+
+
+def _read_bulk_flags(paths: T.Iterable[str]) -> T.Dict[str, T.Set[str]]:
+    result: T.Dict[str, T.Set[str]] = {}
+    for store, group in group_by_store(paths):
+        result.update(store.bulk_flags(group))
+    return result
+
+
+def bulk_flags(paths: T.Iterable[str]) -> T.Dict[str, T.Set[str]]:
+    catalog = image_catalog.active()
+    if catalog is not None:
+        return catalog.bulk_flags(paths, _read_bulk_flags)
+    return _read_bulk_flags(paths)
+
+
+def _read_bulk_json(paths: T.Iterable[str], name: str) -> T.Dict[str, T.Dict]:
+    result: T.Dict[str, T.Dict] = {}
+    for store, group in group_by_store(paths):
+        result.update(store.bulk_load_json(group, name))
+    return result
+
+
+def bulk_load_json(paths: T.Iterable[str], name: str) -> T.Dict[str, T.Dict]:
+    catalog = image_catalog.active()
+    if catalog is not None:
+        return catalog.bulk_load_json(paths, name, _read_bulk_json)
+    return _read_bulk_json(paths, name)
+
+
+def load_jsons(path: str, names: T.Iterable[str]) -> T.Dict[str, T.Dict]:
+    """
+    Load several payloads of one image, missing payloads are left out
+    """
+    if image_catalog.active() is not None:
+        payloads = {}
+        for name in names:
+            payloads.update(
+                {name: data for data in bulk_load_json([path], name).values()}
+            )
+        return payloads
+    return get_store(path).load_jsons(path, names)
+
+
+def has_flag(path: str, flag: str) -> bool:
+    return flag in get_flags(path)
+
+
+def set_flag(path: str, flag: str, history: bool = False) -> None:
+    get_store(path).set_flag(path, flag, history)
+    catalog = image_catalog.active()
+    if catalog is not None:
+        catalog.update_flag(path, flag, True)
+
+
+def clear_flag(path: str, flag: str) -> None:
+    get_store(path).clear_flag(path, flag)
+    catalog = image_catalog.active()
+    if catalog is not None:
+        catalog.update_flag(path, flag, False)
+
+
+def has_json(path: str, name: str) -> bool:
+    if image_catalog.active() is not None:
+        return path in bulk_load_json([path], name)
+    return get_store(path).has_json(path, name)
+
+
+def load_json(path: str, name: str) -> T.Dict:
+    if image_catalog.active() is not None:
+        return bulk_load_json([path], name).get(path, {})
+    return get_store(path).load_json(path, name)
+
+
+def save_json(path: str, name: str, data: T.Any) -> None:
+    get_store(path).save_json(path, name, data)
+    catalog = image_catalog.active()
+    if catalog is not None:
+        catalog.update_json(path, name, data)
+
+
+def remove_json(path: str, name: str) -> None:
+    get_store(path).remove_json(path, name)
+    catalog = image_catalog.active()
+    if catalog is not None:
+        catalog.update_json(path, name, None)
+
+
+def move(path: str, destination: str) -> None:
+    """
+    Move the state of the image at path to the image at destination
+    """
+    catalog = image_catalog.active()
+    if catalog is not None:
+        catalog.forget(path)
+        catalog.forget(destination)
+    store = get_store(path)
+    destination_store = get_store(destination)
+    if store is destination_store:
+        store.move(path, destination)
+    else:
+        state = store.export_state(path)
+        if state is not None:
+            destination_store.import_state(destination, state)
+            store.delete(path)
+
+
+@contextlib.contextmanager
+def transaction() -> T.Generator[None, None, None]:
+    """
+    Group the state updates of all opened databases into one transaction each,
+    and the updates of the flag files into journaled batches
+    """
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(_FILE_STORE.batch())
+        for store in list(_SQLITE_STORES.values()):
+            stack.enter_context(store.transaction())
+        yield
+
+
+def iterate_log_dirs(root: str) -> T.Generator[T.Tuple[str, str], None, None]:
+    """
+    Yield (file path, log directory) for every file under root that has a
+    .mapillary/logs directory
+    """
+    for dirpath, dirnames, files in os.walk(root, topdown=True):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        logs_dir = os.path.join(dirpath, ".mapillary", "logs")
+        if not os.path.isdir(logs_dir):
+            continue
+        stems = {os.path.splitext(file)[0]: file for file in sorted(files)}
+        for name in sorted(os.listdir(logs_dir)):
+            file = stems.get(name)
+            if file is not None and os.path.isdir(os.path.join(logs_dir, name)):
+                yield os.path.join(dirpath, file), os.path.join(logs_dir, name)
+
+
+def migrate_file_logs(store: SQLiteStateStore, root: str) -> int:
+    """
+    Import the existing .mapillary/logs trees under root into the database.
+    The log files are left untouched.
+    """
+    count = 0
+    with store.transaction():
+        for path, _ in iterate_log_dirs(root):
+            state = _FILE_STORE.export_state(path)
+            if state is not None:
+                store.import_state(path, state)
+                count += 1
+    return count
+
+
+def enable_sqlite(root: str) -> SQLiteStateStore:
+    """
+    Use a SQLite state database for all images under root, creating it and
+    importing the existing logs if it does not exist yet
+    """
+    root = os.path.abspath(root)
+    db_exists = os.path.isfile(state_db_path(root))
+    store = _SQLITE_STORES.get(root)
+    if store is None:
+        store = SQLiteStateStore(root)
+        _SQLITE_STORES[root] = store
+    _DIRECTORY_STORES.clear()
+    if not db_exists:
+        count = migrate_file_logs(store, root)
+        if count:
+            print(f"Imported the logs of {count} files into {store.db_path}")
+    return store
@@ -0,0 +1,165 @@
+import array
+import typing as T
+
+from .geo import _numpy, ecef_from_lla_array
+from .gps_trace import GpsTrace
+
+"""
+Reduction of dense GPS traces.
+
+GoPro cameras record GPS at 18 Hz and BlackVue cameras at up to 10 Hz, far
+denser than needed to geotag frames sampled every few seconds. A trace can be
+resampled at a fixed rate, and simplified with the Ramer-Douglas-Peucker
+algorithm, before it is written to GPX and interpolated.
+
+The simplification measures the error of a dropped point as its distance to
+where the simplified trace places it at its time (the synchronized euclidean
+distance), rather than its distance to the simplified line, so that it keeps
+the points where the speed changes too, which time interpolation depends on.
+"""
+
+
+def _time_offsets(trace: GpsTrace) -> T.List[float]:
+    # seconds since the first point
+    start = trace.times[0] if trace.times else 0
+    return [(t - start) / 1e6 for t in trace.times]
+
+
+def _farthest_point(
+    ts: T.Sequence[float], xyz: T.Sequence[T.Sequence[float]], i: int, j: int
+) -> T.Tuple[int, float]:
+    """
+    Return the index of the point between i and j farthest from where the
+    segment from i to j places it at its time, and its squared distance
+    """
+    duration = ts[j] - ts[i]
+    farthest, max_d2 = i, -1.0
+    for k in range(i + 1, j):
+        f = (ts[k] - ts[i]) / duration if duration else 0.0
+        d2 = 0.0
+        for c in xyz:
+            d = c[k] - (c[i] + f * (c[j] - c[i]))
+            d2 += d * d
+        if max_d2 < d2:
+            farthest, max_d2 = k, d2
+    return farthest, max_d2
+
+
+def _farthest_point_numpy(np, ts, xyz, i: int, j: int) -> T.Tuple[int, float]:
+    duration = ts[j] - ts[i]
+    if duration:
+        f = (ts[i + 1 : j] - ts[i]) / duration
+    else:
+        f = np.zeros(j - i - 1)
+    d2 = np.zeros(j - i - 1)
+    for c in xyz:
+        d = c[i + 1 : j] - (c[i] + f * (c[j] - c[i]))
+        d2 += d * d
+    k = int(np.argmax(d2))
+    return i + 1 + k, float(d2[k])
+
+
+def simplify(trace: GpsTrace, tolerance: float) -> GpsTrace:
+    """
+    Drop the points of the trace that the simplified trace places within
+    tolerance meters of where they were recorded
+    """
+    n = len(trace)
+    if n < 3 or tolerance <= 0:
+        return trace
+
+    np = _numpy()
+    ts: T.Any = _time_offsets(trace)
+    xyz: T.Any = ecef_from_lla_array(trace.lats, trace.lons, [0.0] * n)
+    if np is not None:
+        ts = np.asarray(ts)
+
+    keep = bytearray(n)
+    keep[0] = keep[-1] = 1
+    tolerance2 = tolerance * tolerance
+    segments = [(0, n - 1)]
+    while segments:
+        i, j = segments.pop()
+        if j - i < 2:
+            continue
+        if np is None:
+            k, d2 = _farthest_point(ts, xyz, i, j)
+        else:
+            k, d2 = _farthest_point_numpy(np, ts, xyz, i, j)
+        if tolerance2 < d2:
+            keep[k] = 1
+            segments.append((i, k))
+            segments.append((k, j))
+
+    return trace.take(i for i in range(n) if keep[i])
+
+
+def resample(trace: GpsTrace, interval: float) -> GpsTrace:
+    """
+    Resample the trace every interval seconds from its first point, with the
+    positions interpolated linearly in time. The last point is kept, so the
+    trace covers the same time span. The fix and precision of a resampled
+    point are those of the point before it.
+    """
+    n = len(trace)
+    interval_us = int(interval * 1e6)
+    if n < 2 or interval_us <= 0:
+        return trace
+
+    times = trace.times
+    resampled_times = array.array("q", range(times[0], times[-1], interval_us))
+    resampled_times.append(times[-1])
+
+    resampled = GpsTrace()
+    resampled.times = resampled_times
+    # the index of the point before each resampled point
+    befores = []
+    before = 0
+    for t in resampled_times:
+        while before < n - 2 and times[before + 1] <= t:
+            before += 1
+        befores.append(before)
+
+    weights = []
+    for t, before in zip(resampled_times, befores):
+        duration = times[before + 1] - times[before]
+        weights.append((t - times[before]) / duration if duration else 0.0)
+
+    for name in ("lats", "lons", "elevations"):
+        column = getattr(trace, name)
+        setattr(
+            resampled,
+            name,
+            array.array(
+                column.typecode,
+                [
+                    column[before] + w * (column[before + 1] - column[before])
+                    for before, w in zip(befores, weights)
+                ],
+            ),
+        )
+    if trace.fixes is not None:
+        resampled.fixes = array.array("B", [trace.fixes[i] for i in befores])
+    if trace.precisions is not None:
+        resampled.precisions = array.array("H", [trace.precisions[i] for i in befores])
+    return resampled
+
+
+def reduce_trace(
+    trace: GpsTrace,
+    name: str,
+    tolerance: float = 0.0,
+    interval: float = 0.0,
+) -> GpsTrace:
+    """
+    Resample the trace every interval seconds and then simplify it with the
+    tolerance in meters, if given, and report the points dropped
+    """
+    if not (0 < tolerance or 0 < interval):
+        return trace
+    reduced = simplify(resample(trace, interval), tolerance)
+    dropped = len(trace) - len(reduced)
+    print(
+        f"Reduced the GPS trace {name} from {len(trace)} to {len(reduced)} points ({dropped} dropped)"
+    )
+    return reduced
@@ -1,10 +1,10 @@
-import json
 import os
 import sys
 
 from . import uploader
 from . import processing
 from . import exif_read
+from . import state_store
 
 
 def verify_mapillary_tag(filepath):
@@ -17,6 +17,15 @@ def verify_mapillary_tag(filepath):
     return exif_read.ExifRead(filepath).mapillary_tag_exists()
 
 
+def verify_mapillary_description(filepath, descriptions):
+    """
+    Check that the image description stored by process has the required
+    Mapillary tags
+    """
+    description = descriptions.get(filepath)
+    return description is not None and exif_read.mapillary_tags_exist(description)
+
+
 def upload(
     import_path,
     skip_subfolders=False,
@@ -24,6 +33,7 @@ def upload(
     max_attempts=None,
     video_import_path=None,
     dry_run=False,
+    inject_descriptions=False,
 ):
     """
     Upload local images to Mapillary
@@ -31,6 +41,9 @@ def upload(
         import_path: Directory path to where the images are stored.
         verbose: Print extra warnings and errors.
         skip_subfolders: Skip images stored in subdirectories.
+        inject_descriptions: Insert the image descriptions stored by process
+            in the uploaded copies of the images, instead of requiring them
+            in the image EXIF. The image files are not modified.
 
     Returns:
         Images are uploaded to Mapillary and flagged locally as uploaded.
@@ -66,21 +79,30 @@ def upload(
         sys.exit(1)
 
     # get list of file to process
-    total_file_list = uploader.get_total_file_list(import_path, skip_subfolders)
-    upload_file_list = uploader.get_upload_file_list(import_path, skip_subfolders)
-    success_file_list = uploader.get_success_upload_file_list(
-        import_path, skip_subfolders
-    )
-    to_finalize_file_list = uploader.get_finalize_file_list(
-        import_path, skip_subfolders
-    )
+    import_status = uploader.get_import_status(import_path, skip_subfolders)
+    total_file_list = import_status.total
+    upload_file_list = import_status.to_upload
+    success_file_list = import_status.uploaded
+    to_finalize_file_list = import_status.to_finalize
 
     if len(success_file_list) == len(total_file_list):
         print("All images have already been uploaded")
     else:
         # verify the images in the upload list, they need to have the image
         # description and certain MAP properties
-        upload_file_list = [f for f in upload_file_list if verify_mapillary_tag(f)]
+        descriptions = None
+        if inject_descriptions:
+            # loaded once, for the check and for the upload
+            descriptions = state_store.bulk_load_json(
+                upload_file_list, "mapillary_image_description"
+            )
+            upload_file_list = [
+                f
+                for f in upload_file_list
+                if verify_mapillary_description(f, descriptions)
+            ]
+        else:
+            upload_file_list = [f for f in upload_file_list if verify_mapillary_tag(f)]
 
         if not len(upload_file_list) and not len(to_finalize_file_list):
             print("No images to upload.")
@@ -95,31 +117,28 @@ def upload(
             params = {}
             list_per_sequence_mapping = {}
             direct_upload_file_list = []
+            upload_params = state_store.bulk_load_json(
+                upload_file_list, "upload_params_process"
+            )
+            if descriptions is None:
+                descriptions = state_store.bulk_load_json(
+                    upload_file_list, "mapillary_image_description"
+                )
             for image in upload_file_list:
-                log_root = uploader.log_rootpath(image)
-
                 # read upload params
-                upload_params_path = os.path.join(
-                    log_root, "upload_params_process.json"
-                )
-                if os.path.isfile(upload_params_path):
-                    with open(upload_params_path, "r") as fp:
-                        params[image] = json.load(fp)
+                if image in upload_params:
+                    params[image] = upload_params[image]
                     sequence = params[image]["key"]
                     list_per_sequence_mapping.setdefault(sequence, []).append(image)
                 else:
                     direct_upload_file_list.append(image)
 
                 # read image descriptions
-                description_path = os.path.join(
-                    log_root, "mapillary_image_description.json"
-                )
-                if not os.path.isfile(description_path):
+                if image not in descriptions:
                     raise RuntimeError(
-                        f"Please run process first because {description_path} is not generated"
+                        f"Please run process first because the image description of {image} is not generated"
                     )
-                with open(description_path, "r") as fp:
-                    description = json.load(fp)
+                description = descriptions[image]
                 assert not set(description).intersection(
                     params.get(image, {})
                 ), f"Parameter conflicting {description} and {params.get(image, {})}"
@@ -149,23 +168,22 @@ def upload(
                     params,
                     metadata=metadata,
                     dry_run=dry_run,
+                    descriptions=descriptions if inject_descriptions else None,
                 )
 
         if to_finalize_file_list:
             params = {}
             sequences = []
+            upload_params = state_store.bulk_load_json(
+                to_finalize_file_list, "upload_params_process"
+            )
             for image in to_finalize_file_list:
-                log_root = uploader.log_rootpath(image)
-                upload_params_path = os.path.join(
-                    log_root, "upload_params_process.json"
-                )
-                if os.path.isfile(upload_params_path):
-                    with open(upload_params_path, "rb") as jf:
-                        image_params = json.load(jf)
-                        sequence = image_params["key"]
-                        if sequence not in sequences:
-                            params[image] = image_params
-                            sequences.append(sequence)
+                if image in upload_params:
+                    image_params = upload_params[image]
+                    sequence = image_params["key"]
+                    if sequence not in sequences:
+                        params[image] = image_params
+                        sequences.append(sequence)
 
             uploader.flag_finalization(to_finalize_file_list)
 
@@ -1,5 +1,5 @@
 import io
-from typing import List, Optional, Iterable, Generator
+from typing import Callable, Dict, List, NamedTuple, Optional, Iterable, Generator, Set
 import os
 import sys
 import tempfile
@@ -14,6 +14,10 @@ from tqdm import tqdm
 
 from . import upload_api_v4
 from . import ipc
+from . import state_store
+from . import scan_index
+from . import image_catalog
+from .exif_write import ExifEdit
 from .login import authenticate_user, wrap_http_exception
 
 
@@ -33,26 +37,109 @@ def is_video_file(path: str) -> bool:
 
 
 def flag_finalization(finalize_file_list):
-    for file in finalize_file_list:
-        finalize_flag = os.path.join(log_rootpath(file), "upload_finalized")
-        open(finalize_flag, "a").close()
+    with state_store.transaction():
+        for file in finalize_file_list:
+            state_store.set_flag(file, "upload_finalized")
+
+
+def scan_files(root: str, recursive=False) -> Generator[os.DirEntry, None, None]:
+    """
+    Yield the directory entries of all files under root, skipping hidden
+    directories. The file types come with the entries, so listing a directory
+    costs no system call per file on most platforms.
+    """
+    stack = [root]
+    while stack:
+        dirpath = stack.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir():
+                # like os.walk, symlinks to directories are not followed
+                if (
+                    recursive
+                    and not entry.name.startswith(".")
+                    and not entry.is_symlink()
+                ):
+                    subdirs.append(entry.path)
+            else:
+                yield entry
+        stack.extend(reversed(subdirs))
+
+
+class FileEntry:
+    """
+    A file found under an import path, like os.DirEntry: the stat result is
+    read on first use and kept, from the directory entry of the scan when
+    there is one, so the size, mtime and inode cost at most one system call
+    """
+
+    __slots__ = ("path", "_entry", "_stat")
+
+    def __init__(self, path: str, entry: Optional[os.DirEntry] = None) -> None:
+        self.path = path
+        self._entry = entry
+        self._stat: Optional[os.stat_result] = None
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    def stat(self) -> os.stat_result:
+        if self._stat is None:
+            if self._entry is not None:
+                self._stat = self._entry.stat()
+            else:
+                self._stat = os.stat(self.path)
+        return self._stat
+
+    def inode(self) -> int:
+        # the directory entry has it without a system call on POSIX
+        if self._entry is not None:
+            return self._entry.inode()
+        return self.stat().st_ino
+
+    @property
+    def size(self) -> int:
+        return self.stat().st_size
+
+    @property
+    def mtime_ns(self) -> int:
+        return self.stat().st_mtime_ns
+
+    def __repr__(self) -> str:
+        return f"FileEntry({self.path!r})"
+
+
+def iterate_file_entries(
+    root: str, recursive=False
+) -> Generator[FileEntry, None, None]:
+    index = scan_index.find_index(root)
+    if index is not None:
+        for path in index.iterate_files(root, recursive):
+            yield FileEntry(path)
+        return
+    for entry in scan_files(root, recursive):
+        yield FileEntry(entry.path, entry)
 
 
 def iterate_files(root: str, recursive=False) -> Generator[str, None, None]:
-    for dirpath, dirnames, files in os.walk(root, topdown=True):
-        if not recursive:
-            dirnames.clear()
-        else:
-            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
-        for file in files:
-            yield os.path.join(dirpath, file)
+    for entry in iterate_file_entries(root, recursive):
+        yield entry.path
 
 
 def get_upload_file_list(import_path: str, skip_subfolders: bool = False) -> List[str]:
-    files = iterate_files(import_path, not skip_subfolders)
-    return sorted(
-        file for file in files if is_image_file(file) and preform_upload(file)
-    )
+    return _paths(get_upload_file_entries(import_path, skip_subfolders))
+
+
+def get_upload_file_entries(
+    import_path: str, skip_subfolders: bool = False
+) -> List[FileEntry]:
+    return _filter_by_flags(import_path, skip_subfolders, preform_upload)
 
 
 # get a list of video files in a video_file
@@ -62,80 +149,108 @@ def get_video_file_list(video_file, skip_subfolders=False):
 
 
 def get_total_file_list(import_path: str, skip_subfolders: bool = False) -> List[str]:
-    files = iterate_files(import_path, not skip_subfolders)
-    return sorted(file for file in files if is_image_file(file))
+    catalog = image_catalog.active()
+    if catalog is not None:
+        return catalog.file_list(import_path, skip_subfolders, _list_image_files)
+    return _list_image_files(import_path, skip_subfolders)
+
+
+def get_total_file_entries(
+    import_path: str, skip_subfolders: bool = False
+) -> List[FileEntry]:
+    """
+    The entries of the images under import_path, sorted by path
+    """
+    catalog = image_catalog.active()
+    if catalog is not None:
+        # the catalog keeps the paths only, the stat results of the images
+        # change as the stages write them
+        files = catalog.file_list(import_path, skip_subfolders, _list_image_files)
+        return [FileEntry(file) for file in files]
+    return _list_image_entries(import_path, skip_subfolders)
+
+
+def _list_image_entries(import_path: str, skip_subfolders: bool) -> List[FileEntry]:
+    entries = iterate_file_entries(import_path, not skip_subfolders)
+    return sorted(
+        (entry for entry in entries if is_image_file(entry.path)),
+        key=lambda entry: entry.path,
+    )
+
+
+def _list_image_files(import_path: str, skip_subfolders: bool) -> List[str]:
+    return _paths(_list_image_entries(import_path, skip_subfolders))
+
+
+def _paths(entries: Iterable[FileEntry]) -> List[str]:
+    return [entry.path for entry in entries]
+
+
+def _filter_by_flags(
+    import_path: str,
+    skip_subfolders: bool,
+    predicate: Callable[[str, Optional[Set[str]]], bool],
+) -> List[FileEntry]:
+    entries = get_total_file_entries(import_path, skip_subfolders)
+    flags = state_store.bulk_flags(_paths(entries))
+    return [entry for entry in entries if predicate(entry.path, flags[entry.path])]
 
 
 def get_failed_upload_file_list(
     import_path: str, skip_subfolders: bool = False
 ) -> List[str]:
-    files = iterate_files(import_path, not skip_subfolders)
-    return sorted(file for file in files if is_image_file(file) and failed_upload(file))
+    return _paths(_filter_by_flags(import_path, skip_subfolders, failed_upload))
 
 
 def get_success_upload_file_list(
     import_path: str, skip_subfolders: bool = False
 ) -> List[str]:
-    files = iterate_files(import_path, not skip_subfolders)
-    return sorted(
-        file for file in files if is_image_file(file) and success_upload(file)
-    )
+    return _paths(_filter_by_flags(import_path, skip_subfolders, success_upload))
 
 
-def success_upload(file_path: str) -> bool:
-    log_root = log_rootpath(file_path)
-    upload_success = os.path.join(log_root, "upload_success")
-    upload_finalization = os.path.join(log_root, "upload_finalized")
-    manual_upload = os.path.join(log_root, "manual_upload")
-    success = (
-        os.path.isfile(upload_success) and not os.path.isfile(manual_upload)
-    ) or (
-        os.path.isfile(upload_success)
-        and os.path.isfile(manual_upload)
-        and os.path.isfile(upload_finalization)
+def success_upload(file_path: str, flags: Optional[Set[str]] = None) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
+    success = ("upload_success" in flags and "manual_upload" not in flags) or (
+        "upload_success" in flags
+        and "manual_upload" in flags
+        and "upload_finalized" in flags
     )
     return success
 
 
 def get_success_only_manual_upload_file_list(import_path, skip_subfolders=False):
-    files = iterate_files(import_path, not skip_subfolders)
-    return sorted(
-        file
-        for file in files
-        if is_image_file(file) and success_only_manual_upload(file)
+    return _paths(
+        _filter_by_flags(import_path, skip_subfolders, success_only_manual_upload)
     )
 
 
-def success_only_manual_upload(file_path: str):
-    log_root = log_rootpath(file_path)
-    upload_success = os.path.join(log_root, "upload_success")
-    manual_upload = os.path.join(log_root, "manual_upload")
-    success = os.path.isfile(upload_success) and os.path.isfile(manual_upload)
-    return success
+def success_only_manual_upload(
+    file_path: str, flags: Optional[Set[str]] = None
+) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
+    return "upload_success" in flags and "manual_upload" in flags
 
 
-def preform_upload(file_path: str) -> bool:
-    log_root = log_rootpath(file_path)
-    process_success = os.path.join(log_root, "mapillary_image_description_success")
-    duplicate = os.path.join(log_root, "duplicate")
-    upload_succes = os.path.join(log_root, "upload_success")
+def preform_upload(file_path: str, flags: Optional[Set[str]] = None) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
     upload = (
-        not os.path.isfile(upload_succes)
-        and os.path.isfile(process_success)
-        and not os.path.isfile(duplicate)
+        "upload_success" not in flags
+        and "mapillary_image_description_success" in flags
+        and "duplicate" not in flags
     )
     return upload
 
 
-def failed_upload(file_path: str) -> bool:
-    log_root = log_rootpath(file_path)
-    process_failed = os.path.join(log_root, "mapillary_image_description_failed")
-    duplicate = os.path.join(log_root, "duplicate")
-    upload_failed = os.path.join(log_root, "upload_failed")
+def failed_upload(file_path: str, flags: Optional[Set[str]] = None) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
     failed = (
-        os.path.isfile(upload_failed)
-        and not os.path.isfile(process_failed)
-        and not os.path.isfile(duplicate)
+        "upload_failed" in flags
+        and "mapillary_image_description_failed" not in flags
+        and "duplicate" not in flags
     )
     return failed
 
@@ -143,25 +258,65 @@ def failed_upload(file_path: str) -> bool:
 def get_finalize_file_list(
     import_path: str, skip_subfolders: bool = False
 ) -> List[str]:
-    files = iterate_files(import_path, not skip_subfolders)
-    return sorted(
-        file for file in files if is_image_file(file) and preform_finalize(file)
-    )
+    return _paths(_filter_by_flags(import_path, skip_subfolders, preform_finalize))
 
 
-def preform_finalize(file_path: str) -> bool:
-    log_root = log_rootpath(file_path)
-    upload_succes = os.path.join(log_root, "upload_success")
-    upload_finalized = os.path.join(log_root, "upload_finalized")
-    manual_upload = os.path.join(log_root, "manual_upload")
+def preform_finalize(file_path: str, flags: Optional[Set[str]] = None) -> bool:
+    if flags is None:
+        flags = state_store.get_flags(file_path)
     finalize = (
-        os.path.isfile(upload_succes)
-        and not os.path.isfile(upload_finalized)
-        and os.path.isfile(manual_upload)
+        "upload_success" in flags
+        and "upload_finalized" not in flags
+        and "manual_upload" in flags
     )
     return finalize
 
 
+class ImportStatus(NamedTuple):
+    total: List[str]
+    to_upload: List[str]
+    uploaded: List[str]
+    failed_upload: List[str]
+    to_finalize: List[str]
+    uploaded_manual: List[str]
+    duplicates: List[str]
+    # image lists per process name, e.g. "geotag_process"
+    process_success: Dict[str, List[str]]
+    process_failed: Dict[str, List[str]]
+
+
+def get_import_status(import_path: str, skip_subfolders: bool = False) -> ImportStatus:
+    """
+    Classify all images in the import path into every status bucket with a
+    single walk and a single state lookup per image
+    """
+    total = get_total_file_list(import_path, skip_subfolders)
+    flags_per_file = state_store.bulk_flags(total)
+    status = ImportStatus(total, [], [], [], [], [], [], {}, {})
+    for file in total:
+        flags = flags_per_file[file]
+        if preform_upload(file, flags):
+            status.to_upload.append(file)
+        if success_upload(file, flags):
+            status.uploaded.append(file)
+        if failed_upload(file, flags):
+            status.failed_upload.append(file)
+        if preform_finalize(file, flags):
+            status.to_finalize.append(file)
+        if success_only_manual_upload(file, flags):
+            status.uploaded_manual.append(file)
+        if "duplicate" in flags:
+            status.duplicates.append(file)
+        for flag in flags:
+            if flag.endswith("_success"):
+                process = flag[: -len("_success")]
+                status.process_success.setdefault(process, []).append(file)
+            elif flag.endswith("_failed"):
+                process = flag[: -len("_failed")]
+                status.process_failed.setdefault(process, []).append(file)
+    return status
+
+
 def print_summary(file_list):
     # inform upload has finished and print out the summary
     print(f"Done uploading {len(file_list)} images.")  # improve upload summary
@@ -182,13 +337,34 @@ def find_root_dir(file_list: Iterable[str]) -> Optional[str]:
         return find_root_dir(dirs)
 
 
+def write_described_image(
+    ziph: zipfile.ZipFile, fullpath: str, relpath: str, description: dict
+) -> None:
+    """
+    Write the image to the zip with the description inserted in the EXIF of
+    the entry, the image file itself is left untouched
+    """
+    zinfo = zipfile.ZipInfo.from_file(fullpath, relpath)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    exif_edit = ExifEdit(fullpath)
+    exif_edit.add_image_description(description)
+    with ziph.open(zinfo, "w") as dst:
+        exif_edit.write_to(dst)
+
+
 def upload_sequence_v4(
     file_list: list,
     sequence_uuid: str,
     file_params: dict,
     metadata: Optional[dict] = None,
     dry_run=False,
+    descriptions: Optional[Dict[str, dict]] = None,
 ):
+    """
+    Zip the images of a sequence and upload the zip. With descriptions, the
+    images are zipped with their description inserted on the fly, instead
+    of read from the image EXIF.
+    """
     if metadata is None:
         metadata = {}
 
@@ -245,7 +421,12 @@ def upload_sequence_v4(
             ) as pbar:
                 for fullpath in file_list:
                     relpath = os.path.relpath(fullpath, root_dir)
-                    ziph.write(fullpath, relpath)
+                    if descriptions is None:
+                        ziph.write(fullpath, relpath)
+                    else:
+                        write_described_image(
+                            ziph, fullpath, relpath, descriptions[fullpath]
+                        )
                     pbar.update(1)
         fp.seek(0, io.SEEK_END)
         entity_size = fp.tell()
@@ -313,8 +494,7 @@ def upload_sequence_v4(
                         time.sleep(sleep_for)
                     else:
                         if not dry_run:
-                            for path in file_list:
-                                create_upload_log(path, "upload_failed")
+                            create_upload_logs(file_list, "upload_failed")
                         raise wrap_http_exception(ex) if isinstance(
                             ex, requests.HTTPError
                         ) else ex
@@ -344,56 +524,41 @@ def upload_sequence_v4(
     try:
         finish_resp.raise_for_status()
     except requests.HTTPError as ex:
-        for path in file_list:
-            create_upload_log(path, "upload_failed")
+        create_upload_logs(file_list, "upload_failed")
         raise wrap_http_exception(ex)
 
     # check cluster id
     finish_data = finish_resp.json()
     cluster_id = finish_data.get("cluster_id")
     if cluster_id is None:
-        for path in file_list:
-            create_upload_log(path, "upload_failed")
+        create_upload_logs(file_list, "upload_failed")
         raise RuntimeError(
             f"Upload server error: failed to create the cluster {finish_resp.text}"
         )
     else:
         print(f"Cluster {cluster_id} created")
 
-    for path in file_list:
-        create_upload_log(path, "upload_success")
+    create_upload_logs(file_list, "upload_success")
 
     flag_finalization(file_list)
 
 
 def log_rootpath(filepath: str) -> str:
-    return os.path.join(
-        os.path.dirname(filepath),
-        ".mapillary",
-        "logs",
-        os.path.splitext(os.path.basename(filepath))[0],
-    )
+    return state_store.log_rootpath(filepath)
 
 
 def create_upload_log(filepath: str, status: str) -> None:
     assert status in ["upload_success", "upload_failed"], f"invalid status {status}"
-    upload_log_root = log_rootpath(filepath)
-    upload_log_filepath = os.path.join(upload_log_root, status)
     opposite_status = {
         "upload_success": "upload_failed",
         "upload_failed": "upload_success",
     }
-    upload_opposite_log_filepath = os.path.join(
-        upload_log_root, opposite_status[status]
-    )
-    suffix = str(time.strftime("%Y_%m_%d_%H_%M_%S", time.gmtime()))
-    if not os.path.isdir(upload_log_root):
-        os.makedirs(upload_log_root)
-        open(upload_log_filepath, "w").close()
-        open(f"{upload_log_filepath}_{suffix}", "w").close()
-    else:
-        if not os.path.isfile(upload_log_filepath):
-            open(upload_log_filepath, "w").close()
-            open(f"{upload_log_filepath}_{suffix}", "w").close()
-        if os.path.isfile(upload_opposite_log_filepath):
-            os.remove(upload_opposite_log_filepath)
+    if status not in state_store.get_flags(filepath):
+        state_store.set_flag(filepath, status, history=True)
+    state_store.clear_flag(filepath, opposite_status[status])
+
+
+def create_upload_logs(file_list: Iterable[str], status: str) -> None:
+    with state_store.transaction():
+        for filepath in file_list:
+            create_upload_log(filepath, status)
@@ -28,4 +28,6 @@ setup(name='mapillary_tools',
       mapillary_tools=mapillary_tools.__main__:main
       ''',
       install_requires=read_requirements(),
+      # NumPy speeds up the sequence processing and the reduction of long GPS traces
+      extras_require={'fast': ['numpy']},
 )
@@ -0,0 +1,493 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import typing as T
+
+import piexif
+
+from mapillary_tools import VERSION
+from mapillary_tools import exif_header
+from mapillary_tools import exif_read
+from mapillary_tools import state_store
+from mapillary_tools.exif_read import ExifRead
+from mapillary_tools.exif_write import ExifEdit
+from mapillary_tools.insert_MAPJson import insert_MAPJson
+
+"""
+EXIF read/write benchmarks over a synthetic JPEG corpus.
+
+    python -m tests.benchmark.exif_benchmark --count 500 --tag_mix full \
+        --output results.json --baseline previous_results.json
+
+Every benchmark runs in a fresh process, so that the EXIF cache is its own and
+its peak RSS is not raised by an earlier benchmark. Besides that peak, the
+memory of a benchmark is reported as the increase of the peak over the RSS of
+the process, with the interpreter and its imports, just before the benchmark
+runs. The throughput is reported in images/s and in MB/s, of the header bytes
+the reads parse and of the image bytes the writes produce. The results are
+written as JSON, to compare the EXIF backends between versions.
+"""
+
+TAG_MIXES = ["none", "minimal", "gps", "full"]
+BENCHMARKS = ["read", "write", "insert"]
+
+START_TIME = datetime.datetime(2021, 6, 1, 12, 0, 0)
+
+# the payloads of the processing stages that insert_MAPJson merges
+PAYLOADS = {
+    "user_process": {
+        "MAPSettingsUsername": "benchmark",
+        "MAPSettingsUserKey": "benchmark_key",
+    },
+    "sequence_process": {"MAPSequenceUUID": "benchmark_sequence"},
+    "upload_params_process": {"key": "benchmark_sequence"},
+    "settings_upload_hash": {"MAPSettingsUploadHash": "benchmark_hash"},
+    "import_meta_data_process": {"MAPOrientation": 1},
+}
+
+
+def _jpeg(width: int, height: int, rng: random.Random, quality: int = 90) -> bytes:
+    from PIL import Image
+
+    size = width * height * 3
+    pixels = rng.getrandbits(8 * size).to_bytes(size, "little")
+    output = io.BytesIO()
+    Image.frombytes("RGB", (width, height), pixels).save(
+        output, "JPEG", quality=quality
+    )
+    return output.getvalue()
+
+
+def _rational(value: float, precision: int = 1000) -> T.Tuple[int, int]:
+    return int(abs(value) * precision), precision
+
+
+def _dms(value: float) -> T.Tuple[T.Tuple[int, int], ...]:
+    degrees = int(abs(value))
+    minutes = int((abs(value) - degrees) * 60)
+    seconds = (abs(value) - degrees - minutes / 60) * 3600
+    return (degrees, 1), (minutes, 1), _rational(seconds)
+
+
+def build_exif(
+    index: int, tag_mix: str, rng: random.Random, thumbnail: bytes
+) -> T.Optional[T.Dict]:
+    """
+    The piexif dict of the index-th image of the corpus, None for no EXIF
+    """
+    if tag_mix == "none":
+        return None
+    capture_time = START_TIME + datetime.timedelta(seconds=index)
+    exif: T.Dict = {
+        "0th": {},
+        "Exif": {
+            piexif.ExifIFD.DateTimeOriginal: capture_time.strftime("%Y:%m:%d %H:%M:%S")
+        },
+        "GPS": {},
+    }
+    if tag_mix in ["gps", "full"]:
+        lat = 48.1 + index * 1e-5 + rng.uniform(-1e-6, 1e-6)
+        lon = 11.5 + index * 1e-5 + rng.uniform(-1e-6, 1e-6)
+        exif["GPS"] = {
+            piexif.GPSIFD.GPSLatitudeRef: "N",
+            piexif.GPSIFD.GPSLatitude: _dms(lat),
+            piexif.GPSIFD.GPSLongitudeRef: "E",
+            piexif.GPSIFD.GPSLongitude: _dms(lon),
+            piexif.GPSIFD.GPSAltitudeRef: 0,
+            piexif.GPSIFD.GPSAltitude: _rational(rng.uniform(400, 600)),
+            piexif.GPSIFD.GPSImgDirection: _rational(rng.uniform(0, 360)),
+            piexif.GPSIFD.GPSImgDirectionRef: "T",
+            piexif.GPSIFD.GPSDateStamp: capture_time.strftime("%Y:%m:%d"),
+            piexif.GPSIFD.GPSTimeStamp: (
+                (capture_time.hour, 1),
+                (capture_time.minute, 1),
+                (capture_time.second, 1),
+            ),
+        }
+    if tag_mix == "full":
+        # what a phone camera writes: maker data, a thumbnail and a
+        # description from an earlier processing run
+        exif["0th"] = {
+            piexif.ImageIFD.Make: "Benchmark",
+            piexif.ImageIFD.Model: "Synthetic",
+            piexif.ImageIFD.Orientation: 1,
+            piexif.ImageIFD.ImageDescription: json.dumps(
+                {"MAPCaptureTime": capture_time.strftime("%Y_%m_%d_%H_%M_%S_000")}
+            ),
+        }
+        exif["Exif"][piexif.ExifIFD.SubSecTimeOriginal] = "%03d" % (index % 1000)
+        exif["Exif"][piexif.ExifIFD.LensMake] = "Benchmark"
+        exif["Exif"][piexif.ExifIFD.MakerNote] = bytes(
+            rng.getrandbits(8) for _ in range(8192)
+        )
+        exif["1st"] = {piexif.ImageIFD.Compression: 6}
+        exif["thumbnail"] = thumbnail
+    return exif
+
+
+def generate_corpus(
+    directory: str,
+    count: int,
+    width: int = 1024,
+    height: int = 768,
+    tag_mix: str = "gps",
+    seed: int = 0,
+) -> T.List[str]:
+    """
+    Write count synthetic JPEGs of width x height with the tags of tag_mix
+    to directory. The images share their (noise) image data, so generating
+    large corpora is fast.
+    """
+    if tag_mix not in TAG_MIXES:
+        raise ValueError(f"Unknown tag mix {tag_mix}, expected one of {TAG_MIXES}")
+    rng = random.Random(seed)
+    image = _jpeg(width, height, rng)
+    thumbnail = _jpeg(160, 120, rng, quality=70)
+    os.makedirs(directory, exist_ok=True)
+    images = []
+    for index in range(count):
+        path = os.path.join(directory, f"image_{index:06d}.jpg")
+        exif = build_exif(index, tag_mix, rng, thumbnail)
+        if exif is None:
+            with open(path, "wb") as fp:
+                fp.write(image)
+        else:
+            piexif.insert(piexif.dump(exif), image, path)
+        images.append(path)
+    return images
+
+
+def _copy_corpus(corpus: str, work_dir: str) -> T.List[str]:
+    if os.path.isdir(work_dir):
+        shutil.rmtree(work_dir)
+    shutil.copytree(corpus, work_dir)
+    return sorted(
+        os.path.join(work_dir, name)
+        for name in os.listdir(work_dir)
+        if name.endswith(".jpg")
+    )
+
+
+def _header_bytes(image: str) -> int:
+    # the bytes of the JPEG header that the EXIF reader reads, up to the end
+    # of the EXIF segment
+    with open(image, "rb") as fp:
+        try:
+            exif_header._read_exif_segment(fp)
+        except exif_header.UnsupportedExif:
+            pass
+        return fp.tell()
+
+
+def _file_bytes(images: T.List[str]) -> int:
+    return sum(os.path.getsize(image) for image in images)
+
+
+def bench_read(
+    corpus: str, work_dir: str, workers: T.Optional[int]
+) -> T.Tuple[float, int]:
+    images = _copy_corpus(corpus, work_dir)
+    header_bytes = sum(_header_bytes(image) for image in images)
+    exif_read.clear_exif_cache()
+    start = time.perf_counter()
+    for image in images:
+        exif = ExifRead(image)
+        exif.extract_capture_time()
+        exif.extract_lon_lat()
+        exif.extract_altitude()
+        exif.extract_direction()
+        exif.extract_orientation()
+        exif.extract_make()
+        exif.extract_model()
+        exif.mapillary_tag_exists()
+    return time.perf_counter() - start, header_bytes
+
+
+def bench_write(
+    corpus: str, work_dir: str, workers: T.Optional[int]
+) -> T.Tuple[float, int]:
+    images = _copy_corpus(corpus, work_dir)
+    start = time.perf_counter()
+    for index, image in enumerate(images):
+        exif_edit = ExifEdit(image)
+        exif_edit.add_image_description(
+            {"MAPSequenceUUID": "benchmark_sequence", "MAPPhotoIndex": index}
+        )
+        exif_edit.add_lat_lon(48.1, 11.5)
+        exif_edit.add_direction(90.0)
+        exif_edit.write()
+    seconds = time.perf_counter() - start
+    return seconds, _file_bytes(images)
+
+
+def bench_insert(
+    corpus: str, work_dir: str, workers: T.Optional[int]
+) -> T.Tuple[float, int]:
+    images = _copy_corpus(corpus, work_dir)
+    with state_store.transaction():
+        for index, image in enumerate(images):
+            capture_time = START_TIME + datetime.timedelta(seconds=index)
+            geotag = {
+                "MAPLatitude": 48.1 + index * 1e-5,
+                "MAPLongitude": 11.5 + index * 1e-5,
+                "MAPCaptureTime": capture_time.strftime("%Y_%m_%d_%H_%M_%S_000"),
+                "MAPCompassHeading": {"TrueHeading": 90.0, "MagneticHeading": 90.0},
+            }
+            state_store.save_json(image, "geotag_process", geotag)
+            for name, payload in PAYLOADS.items():
+                state_store.save_json(image, name, payload)
+    start = time.perf_counter()
+    insert_MAPJson(work_dir, rerun=True, workers=workers)
+    seconds = time.perf_counter() - start
+    return seconds, _file_bytes(images)
+
+
+# the benchmarks return their time and the bytes they read or wrote
+_BENCHMARK_FUNCTIONS: T.Dict[
+    str, T.Callable[[str, str, T.Optional[int]], T.Tuple[float, int]]
+] = {
+    "read": bench_read,
+    "write": bench_write,
+    "insert": bench_insert,
+}
+
+
+def _proc_status_bytes(field: str) -> T.Optional[int]:
+    # a memory field of /proc/self/status, in bytes, on Linux
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> T.Optional[int]:
+    """
+    Reset the peak resident set size of this process to its current one, and
+    return the current one in bytes. None where it can not be reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as fp:
+            fp.write("5")
+    except OSError:
+        return None
+    return _proc_status_bytes("VmRSS")
+
+
+def peak_rss() -> T.Optional[int]:
+    """
+    Peak resident set size in bytes of this process, None where it can not be
+    measured
+    """
+    peak = _proc_status_bytes("VmHWM")
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_benchmark(connection, name, corpus, repeat, workers) -> None:
+    try:
+        work_dir = tempfile.mkdtemp()
+        try:
+            # without a reset, the increase of the peak is only measured
+            # above the peak of the imports
+            baseline_rss = reset_peak_rss() or peak_rss()
+            with open(os.devnull, "w") as devnull:
+                # keep the progress output of the stages out of the results
+                with contextlib.redirect_stdout(devnull):
+                    seconds, processed_bytes = min(
+                        _BENCHMARK_FUNCTIONS[name](
+                            corpus, os.path.join(work_dir, "images"), workers
+                        )
+                        for _ in range(repeat)
+                    )
+        finally:
+            shutil.rmtree(work_dir)
+        end_rss = peak_rss()
+        connection.send(
+            {
+                "seconds": seconds,
+                "bytes": processed_bytes,
+                "peak_rss_bytes": end_rss,
+                "rss_increase_bytes": None
+                if baseline_rss is None or end_rss is None
+                else end_rss - baseline_rss,
+            }
+        )
+    except Exception:
+        connection.send({"error": traceback.format_exc()})
+    finally:
+        connection.close()
+
+
+def run_benchmark(
+    name: str, corpus: str, repeat: int = 1, workers: T.Optional[int] = None
+) -> T.Dict:
+    """
+    Run the benchmark name over the images in corpus in a new process, and
+    return its best time of repeat runs, the bytes read or written in it, and
+    its peak RSS and the increase of that peak.
+    The RSS of the insert_MAPJson workers is not included.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    receiver, sender = ctx.Pipe(duplex=False)
+    # not a pool worker, so insert_MAPJson can start its own pool
+    process = ctx.Process(
+        target=_run_benchmark, args=(sender, name, corpus, repeat, workers)
+    )
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {"error": f"Benchmark process exited with {process.exitcode}"}
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"Benchmark {name} failed:\n{result['error']}")
+    return result
+
+
+def benchmark(
+    corpus: str,
+    benchmarks: T.List[str],
+    repeat: int = 1,
+    workers: T.Optional[int] = None,
+) -> T.Dict:
+    """
+    Run the benchmarks over the images in corpus, and return their results
+    by name
+    """
+    images = [name for name in os.listdir(corpus) if name.endswith(".jpg")]
+    results = {}
+    for name in benchmarks:
+        result = run_benchmark(name, corpus, repeat, workers)
+        seconds = result["seconds"]
+        results[name] = {
+            "seconds": seconds,
+            "images_per_second": len(images) / seconds if seconds else None,
+            # the header bytes read, or the bytes of the images written
+            "bytes": result["bytes"],
+            "mb_per_second": result["bytes"] / seconds / 1e6 if seconds else None,
+            "peak_rss_bytes": result["peak_rss_bytes"],
+            "rss_increase_bytes": result["rss_increase_bytes"],
+        }
+    return results
+
+
+def compare(results: T.Dict, baseline: T.Dict) -> T.List[str]:
+    """
+    Describe the throughput of results relative to baseline, per benchmark
+    """
+    lines = []
+    for name, result in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or not base.get("images_per_second"):
+            continue
+        ratio = result["images_per_second"] / base["images_per_second"]
+        lines.append(
+            f"{name}: {result['images_per_second']:.1f} images/s, "
+            f"{result['mb_per_second']:.1f} MB/s, "
+            f"{ratio:.2f}x of {base['images_per_second']:.1f} images/s "
+            f"(version {baseline.get('mapillary_tools_version')})"
+        )
+    return lines
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark EXIF reads and writes over a synthetic JPEG corpus"
+    )
+    parser.add_argument(
+        "--corpus",
+        help="Directory of the corpus, generated if it has no images. A temporary one by default.",
+    )
+    parser.add_argument("--count", help="Images to generate", type=int, default=200)
+    parser.add_argument("--width", help="Image width", type=int, default=1024)
+    parser.add_argument("--height", help="Image height", type=int, default=768)
+    parser.add_argument(
+        "--tag_mix", help="EXIF tags to generate", choices=TAG_MIXES, default="gps"
+    )
+    parser.add_argument("--seed", help="Random seed", type=int, default=0)
+    parser.add_argument(
+        "--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS
+    )
+    parser.add_argument(
+        "--repeat", help="Runs per benchmark, the best is kept", type=int, default=3
+    )
+    parser.add_argument(
+        "--workers", help="Workers of insert_MAPJson", type=int, default=None
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+
+    with contextlib.ExitStack() as stack:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(corpus, exist_ok=True)
+        if not any(name.endswith(".jpg") for name in os.listdir(corpus)):
+            generate_corpus(
+                corpus, args.count, args.width, args.height, args.tag_mix, args.seed
+            )
+        images = [name for name in os.listdir(corpus) if name.endswith(".jpg")]
+        corpus_bytes = sum(
+            os.path.getsize(os.path.join(corpus, name)) for name in images
+        )
+        measured = benchmark(corpus, args.benchmarks, args.repeat, args.workers)
+
+    results = {
+        "mapillary_tools_version": VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {
+            "images": len(images),
+            "bytes": corpus_bytes,
+            "width": args.width,
+            "height": args.height,
+            "tag_mix": args.tag_mix,
+            "seed": args.seed,
+        },
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "benchmarks": measured,
+    }
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        for line in compare(results, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mapillary_tools import state_store
+from mapillary_tools.compact_logs import compact_logs
+
+
+class CompactLogsTests(unittest.TestCase):
+    def setUp(self):
+        self.import_path = tempfile.mkdtemp()
+        self.image = os.path.join(self.import_path, "sub", "image.jpg")
+        os.makedirs(os.path.dirname(self.image))
+        open(self.image, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.import_path)
+
+    def test_compact_logs(self):
+        store = state_store.FileStateStore()
+        store.set_flag(self.image, "upload_success")
+        log_root = state_store.log_rootpath(self.image)
+        for created_at in ["2021_01_01_00_00_00", "2021_01_02_00_00_00"]:
+            open(os.path.join(log_root, f"upload_failed_{created_at}"), "w").close()
+        before = store.export_state(self.image)
+
+        result = compact_logs(self.import_path, workers=2)
+        self.assertEqual(result.images, 1)
+        self.assertEqual(result.removed_files, 2)
+        self.assertEqual(result.reclaimed_inodes, 1)
+        self.assertEqual(
+            sorted(os.listdir(log_root)),
+            [state_store.HISTORY_RECORD_FILENAME, "upload_success"],
+        )
+        self.assertEqual(store.flags(self.image), {"upload_success"})
+        self.assertEqual(store.export_state(self.image), before)
+
+        store.set_flag(self.image, "upload_success", history=True)
+        result = compact_logs(self.import_path)
+        self.assertEqual(result.reclaimed_inodes, 1)
+        self.assertEqual(len(store.export_state(self.image).history), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mapillary_tools.exif_read import ExifRead
+from tests.benchmark import exif_benchmark
+
+
+class ExifBenchmarkTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.tmpdir, "corpus")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_generated_images_have_the_tag_mix(self):
+        images = exif_benchmark.generate_corpus(
+            self.corpus, 3, width=64, height=48, tag_mix="full"
+        )
+        self.assertEqual(len(images), 3)
+        exif = ExifRead(images[1])
+        self.assertEqual(exif.extract_make(), "Benchmark")
+        self.assertIsNotNone(exif.extract_lon_lat()[0])
+        self.assertEqual(exif.extract_capture_time().second, 1)
+
+    def test_insert_benchmark_describes_the_images(self):
+        exif_benchmark.generate_corpus(self.corpus, 3, width=64, height=48)
+        work_dir = os.path.join(self.tmpdir, "images")
+        seconds, written = exif_benchmark.bench_insert(self.corpus, work_dir, None)
+        self.assertGreater(seconds, 0)
+        images = [
+            os.path.join(work_dir, name)
+            for name in os.listdir(work_dir)
+            if name.endswith(".jpg")
+        ]
+        self.assertEqual(written, sum(os.path.getsize(image) for image in images))
+        for name in os.listdir(work_dir):
+            if name.endswith(".jpg"):
+                description = ExifRead(
+                    os.path.join(work_dir, name)
+                ).extract_image_description()
+                self.assertEqual(
+                    json.loads(description)["MAPSequenceUUID"], "benchmark_sequence"
+                )
+
+    def test_read_benchmark_counts_the_header_bytes(self):
+        images = exif_benchmark.generate_corpus(
+            self.corpus, 2, width=64, height=48, tag_mix="gps"
+        )
+        seconds, read = exif_benchmark.bench_read(
+            self.corpus, os.path.join(self.tmpdir, "images"), None
+        )
+        self.assertGreater(seconds, 0)
+        # the EXIF segment but not the image data
+        self.assertGreater(read, 2 * 100)
+        self.assertLess(read, sum(os.path.getsize(image) for image in images))
+
+    def test_results_report_throughput_and_memory(self):
+        exif_benchmark.generate_corpus(self.corpus, 2, width=64, height=48)
+        result = exif_benchmark.benchmark(self.corpus, ["write"])["write"]
+        self.assertAlmostEqual(
+            result["mb_per_second"], result["bytes"] / result["seconds"] / 1e6
+        )
+        if result["peak_rss_bytes"] is not None:
+            self.assertGreater(result["peak_rss_bytes"], 0)
+        self.assertIn("rss_increase_bytes", result)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mapillary_tools import exif_read
+from mapillary_tools.exif_read import ExifRead, ExifTagsCache
+from mapillary_tools.exif_write import ExifEdit
+
+this_file_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(this_file_dir, "data")
+
+
+class ExifCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, "image.jpg")
+        shutil.copy(os.path.join(data_dir, "test_exif.jpg"), self.image)
+        exif_read.clear_exif_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        exif_read.clear_exif_cache()
+
+    def test_repeated_reads_hit_the_cache(self):
+        first = ExifRead(self.image).extract_lon_lat()
+        second = ExifRead(self.image).extract_lon_lat()
+        self.assertEqual(first, second)
+        info = exif_read.exif_cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+
+    def test_written_images_are_read_again(self):
+        ExifRead(self.image)
+        exif_edit = ExifEdit(self.image)
+        exif_edit.add_image_description({"MAPLatitude": 1.0})
+        exif_edit.write()
+        self.assertEqual(
+            ExifRead(self.image).extract_image_description(), '{"MAPLatitude": 1.0}'
+        )
+        self.assertEqual(exif_read.exif_cache_info().misses, 2)
+
+    def test_rewrites_with_the_same_mtime_are_read_again(self):
+        ExifRead(self.image)
+        stat = os.stat(self.image)
+        with open(self.image, "rb") as fp:
+            data = fp.read()
+        # rewritten in another process, with the mtime of a coarse filesystem
+        with open(self.image, "r+b") as fp:
+            fp.write(data)
+        os.utime(self.image, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        ExifRead(self.image)
+        self.assertEqual(exif_read.exif_cache_info().misses, 2)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ExifTagsCache(maxsize=2)
+        cache.put("a", (1, 1), {"a": 1})
+        cache.put("b", (1, 1), {"b": 1})
+        self.assertEqual(cache.get("a", (1, 1)), {"a": 1})
+        cache.put("c", (1, 1), {"c": 1})
+        self.assertIsNone(cache.get("b", (1, 1)))
+        self.assertIsNone(cache.get("a", (2, 1)))
+        self.assertEqual(cache.info(), (1, 2, 2, 2))
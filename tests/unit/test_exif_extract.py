@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from mapillary_tools import exif_extract
+
+this_file_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(this_file_dir, "data")
+
+
+def comparable(geotag):
+    if geotag is None:
+        return None
+    return [
+        type(value).__name__ if isinstance(value, Exception) else value
+        for value in geotag
+    ]
+
+
+class ExtractGeotagsTests(unittest.TestCase):
+    def setUp(self):
+        self.images = sorted(
+            os.path.join(data_dir, name) for name in os.listdir(data_dir)
+        )
+        self.missing = os.path.join(tempfile.gettempdir(), "missing_image.jpg")
+        self.images.append(self.missing)
+
+    def test_parallel_extraction_matches_serial(self):
+        serial = [
+            comparable(geotag) for geotag in exif_extract.extract_geotags(self.images)
+        ]
+        self.assertIsNone(serial[-1])
+        self.assertIsNotNone(serial[0])
+        for mode in exif_extract.EXTRACTION_MODES:
+            geotags = exif_extract.extract_geotags(self.images, 3, mode)
+            self.assertEqual([comparable(geotag) for geotag in geotags], serial)
+
+    def test_missing_fields_raise_on_access(self):
+        geotag = exif_extract.ExifGeotag(None, ValueError("no time"), None, None)
+        self.assertIsNone(geotag.extract_lon_lat())
+        with self.assertRaises(ValueError):
+            geotag.extract_capture_time()
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            exif_extract.extract_geotags(self.images, 2, "fiber")
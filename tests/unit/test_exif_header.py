@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import exifread
+
+from mapillary_tools import exif_header, exif_read
+from mapillary_tools.exif_read import ExifRead
+
+this_file_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(this_file_dir, "data")
+
+
+def values(tags, name):
+    if name not in tags:
+        return None
+    return [
+        (value.num, value.den) if isinstance(value, exifread.utils.Ratio) else value
+        for value in tags[name].values
+    ]
+
+
+class ExifHeaderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_tags_as_exifread(self):
+        for name in sorted(os.listdir(data_dir)):
+            image = os.path.join(data_dir, name)
+            with open(image, "rb") as fp:
+                expected = exifread.process_file(fp, details=False)
+            for use_mmap in [False, True]:
+                tags = exif_header.read_exif_tags(image, use_mmap=use_mmap)
+                self.assertIsNotNone(tags, image)
+                for ifd_name, tag_names in exif_header.WANTED_TAGS.items():
+                    for tag_name in tag_names:
+                        key = f"{ifd_name} {tag_name}"
+                        self.assertEqual(
+                            values(tags, key), values(expected, key), (image, key)
+                        )
+
+    def test_other_files_fall_back_to_exifread(self):
+        image = os.path.join(self.tmpdir, "image.jpg")
+        with open(image, "wb") as f:
+            f.write(b"II*\x00\x08\x00\x00\x00\x00\x00")
+        for use_mmap in [False, True]:
+            self.assertIsNone(exif_header.read_exif_tags(image, use_mmap=use_mmap))
+        self.assertEqual(ExifRead(image).extract_lon_lat(), (None, None))
+
+    def test_empty_files_fall_back_to_exifread(self):
+        # an empty file can not be memory mapped
+        image = os.path.join(self.tmpdir, "image.jpg")
+        open(image, "wb").close()
+        for use_mmap in [False, True]:
+            self.assertIsNone(exif_header.read_exif_tags(image, use_mmap=use_mmap))
+
+    def test_exif_read_with_mmap(self):
+        image = os.path.join(self.tmpdir, "image.jpg")
+        shutil.copy(os.path.join(data_dir, "test_exif.jpg"), image)
+        expected = ExifRead(image).extract_lon_lat()
+        exif_read.clear_exif_cache()
+        with mock.patch.object(
+            exif_header, "read_exif_tags", wraps=exif_header.read_exif_tags
+        ) as read_exif_tags:
+            self.assertEqual(ExifRead(image, use_mmap=True).extract_lon_lat(), expected)
+        read_exif_tags.assert_called_once_with(image, use_mmap=True)
+
+    def test_truncated_exif_falls_back_to_exifread(self):
+        with open(os.path.join(data_dir, "test_exif.jpg"), "rb") as f:
+            data = f.read()
+        image = os.path.join(self.tmpdir, "image.jpg")
+        with open(image, "wb") as f:
+            # keep the APP0 segment, and cut the APP1 segment short of the
+            # entries of its first IFD
+            f.write(data[:20] + b"\xff\xe1\x00\x20" + data[24:54])
+        self.assertIsNone(exif_header.read_exif_tags(image))
+
+    def test_tags_are_decoded_once_on_lookup(self):
+        tags = exif_header.read_exif_tags(os.path.join(data_dir, "test_exif.jpg"))
+        self.assertIn("GPS GPSLatitude", tags)
+        self.assertEqual(tags._decoded, {})
+        latitude = tags["GPS GPSLatitude"]
+        self.assertIs(tags["GPS GPSLatitude"], latitude)
+        self.assertEqual(list(tags._decoded), ["GPS GPSLatitude"])
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mapillary_tools import exif_plan
+from mapillary_tools.exif_read import ExifRead
+
+this_file_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(this_file_dir, "data")
+
+
+def read_file(filename):
+    with open(filename, "rb") as fp:
+        return fp.read()
+
+
+class ExifPlanTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, "image.jpg")
+        shutil.copy(os.path.join(data_dir, "test_exif.jpg"), self.image)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_writes_are_deferred_until_commit(self):
+        original = read_file(self.image)
+        plan = exif_plan.ExifPlan()
+        with exif_plan.activate(plan):
+            exif_edit = exif_plan.edit(self.image)
+            exif_edit.add_image_description({"MAPLatitude": 1.0})
+            exif_plan.write(exif_edit)
+            self.assertEqual(read_file(self.image), original)
+            self.assertEqual(
+                ExifRead(self.image).extract_image_description(),
+                '{"MAPLatitude": 1.0}',
+            )
+
+            exif_edit = exif_plan.edit(self.image)
+            exif_edit.add_orientation(3)
+            exif_plan.write(exif_edit)
+            self.assertEqual(len(plan.edits), 1)
+        self.assertEqual(plan.edits, {})
+
+        exif_read = ExifRead(self.image)
+        self.assertEqual(exif_read.extract_image_description(), '{"MAPLatitude": 1.0}')
+        self.assertEqual(exif_read.extract_orientation(), 3)
+
+    def test_writes_to_other_files_are_not_deferred(self):
+        target = os.path.join(self.tmpdir, "copy.jpg")
+        with exif_plan.activate(exif_plan.ExifPlan()) as plan:
+            exif_edit = exif_plan.edit(self.image)
+            exif_edit.add_image_description({"MAPLatitude": 1.0})
+            exif_plan.write(exif_edit, filename=target)
+            self.assertEqual(plan.edits, {})
+            self.assertEqual(
+                ExifRead(target).extract_image_description(), '{"MAPLatitude": 1.0}'
+            )
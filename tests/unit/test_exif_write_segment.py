@@ -0,0 +1,185 @@
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+from mapillary_tools import exif_write
+from mapillary_tools.exif_read import ExifRead
+from mapillary_tools.exif_write import ExifEdit, locate_exif_segment
+
+this_file_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(this_file_dir, "data")
+
+# the description insert_MAPJson writes, which does not fit in the EXIF
+# segment of the test images
+DESCRIPTION = {
+    "MAPLatitude": 48.1376132,
+    "MAPLongitude": 11.5754238,
+    "MAPAltitude": 520.3,
+    "MAPCaptureTime": "2021_06_01_12_00_00_000",
+    "MAPCompassHeading": {"TrueHeading": 123.4, "MagneticHeading": 123.4},
+    "MAPGPSAccuracyMeters": 5.0,
+    "MAPOrientation": 1,
+    "MAPDeviceMake": "GoPro",
+    "MAPDeviceModel": "HERO8 Black",
+    "MAPSequenceUUID": "3f1e7e4a-8c0b-4f43-9d3c-2b7a9e5c1d2f",
+    "MAPPhotoUUID": "b7c2d9e1-5a4f-4c8e-8f1a-6e3d2c1b0a9f",
+    "MAPSettingsUsername": "mapillary_user",
+    "MAPSettingsUserKey": "AbCdEfGhIjKlMnOpQrStUv",
+    "MAPSettingsUploadHash": "5f4dcc3b5aa765d61d8327deb882cf99"
+    "5f4dcc3b5aa765d61d8327deb882cf99",
+    "MAPMetaTags": {},
+}
+
+
+def fake_clone_range(src, dst, src_offset, dest_offset):
+    # a reflink clone where reflinks are not supported
+    block = os.fstat(src.fileno()).st_blksize
+    assert src_offset % block == 0 and dest_offset % block == 0
+    src.seek(src_offset)
+    dst.seek(dest_offset)
+    dst.write(src.read())
+    return True
+
+
+def image_data(filename):
+    with open(filename, "rb") as fp:
+        location = locate_exif_segment(fp)
+        fp.seek(location.offset + location.length)
+        return fp.read()
+
+
+class ExifSegmentWriteTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, "image.jpg")
+        shutil.copy(os.path.join(data_dir, "test_exif.jpg"), self.image)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_description(self, description, filename=None):
+        exif_edit = ExifEdit(self.image)
+        exif_edit.add_image_description(description)
+        exif_edit.write(filename=filename)
+
+    def test_small_changes_are_patched_in_place(self):
+        size = os.path.getsize(self.image)
+        inode = os.stat(self.image).st_ino
+        data = image_data(self.image)
+        self.write_description({"MAPLatitude": 1.0})
+        self.assertEqual(os.path.getsize(self.image), size)
+        self.assertEqual(os.stat(self.image).st_ino, inode)
+        self.assertEqual(image_data(self.image), data)
+        self.assertEqual(
+            ExifRead(self.image).extract_image_description(), '{"MAPLatitude": 1.0}'
+        )
+
+    def test_larger_segments_are_spliced(self):
+        data = image_data(self.image)
+        description = {"MAPLatitude": "1" * 4000}
+        self.write_description(description)
+        self.assertGreater(
+            os.path.getsize(self.image),
+            os.path.getsize(os.path.join(data_dir, "test_exif.jpg")),
+        )
+        self.assertEqual(image_data(self.image), data)
+        self.assertIn("1" * 4000, ExifRead(self.image).extract_image_description())
+        self.assertEqual(os.listdir(self.tmpdir), ["image.jpg"])
+
+    def test_write_to_another_file(self):
+        target = os.path.join(self.tmpdir, "copy.jpg")
+        with open(self.image, "rb") as fp:
+            original = fp.read()
+        self.write_description({"MAPLatitude": 1.0}, target)
+        with open(self.image, "rb") as fp:
+            self.assertEqual(fp.read(), original)
+        self.assertEqual(image_data(target), image_data(self.image))
+        self.assertEqual(
+            ExifRead(target).extract_image_description(), '{"MAPLatitude": 1.0}'
+        )
+
+    def test_copies_are_cloned_and_patched(self):
+        target = os.path.join(self.tmpdir, "copy.jpg")
+        exif_write.reset_copy_info()
+        self.write_description({"MAPLatitude": 1.0}, target)
+        self.assertEqual(os.path.getsize(target), os.path.getsize(self.image))
+        self.assertEqual(image_data(target), image_data(self.image))
+        info = exif_write.copy_info()
+        self.assertEqual(info.cloned + info.copied, 1)
+        if info.copied:
+            self.assertEqual(info.bytes_saved, 0)
+
+    def test_copies_with_grown_segments_are_cloned(self):
+        # image data of 3 blocks and a half after the EXIF segment
+        block = os.stat(self.image).st_blksize
+        with open(self.image, "rb") as fp:
+            location = locate_exif_segment(fp)
+            fp.seek(0)
+            data = fp.read()
+        tail = location.offset + location.length
+        comment = (
+            b"\xff\xfe" + struct.pack(">H", block * 7 // 2) + bytes(block * 7 // 2 - 2)
+        )
+        with open(self.image, "wb") as fp:
+            fp.write(data[:tail] + comment + data[tail:])
+        size = os.path.getsize(self.image)
+
+        target = os.path.join(self.tmpdir, "copy.jpg")
+        exif_write.reset_copy_info()
+        with mock.patch.object(
+            exif_write, "_clone_range", side_effect=fake_clone_range
+        ):
+            self.write_description(DESCRIPTION, target)
+        # the image data is moved by whole blocks, and all but the block
+        # holding the end of the EXIF segment is shared
+        self.assertEqual((os.path.getsize(target) - size) % block, 0)
+        self.assertEqual(
+            exif_write.copy_info(), (1, 0, size - (tail // block + 1) * block)
+        )
+        self.assertEqual(image_data(target), image_data(self.image))
+        self.assertEqual(
+            json.loads(ExifRead(target).extract_image_description()), DESCRIPTION
+        )
+
+    def test_grown_segments_are_copied_without_reflinks(self):
+        target = os.path.join(self.tmpdir, "copy.jpg")
+        exif_write.reset_copy_info()
+        with mock.patch.object(exif_write, "_clone_range", return_value=False):
+            self.write_description(DESCRIPTION, target)
+        self.assertEqual(exif_write.copy_info(), (0, 1, 0))
+        self.assertEqual(image_data(target), image_data(self.image))
+        self.assertEqual(
+            json.loads(ExifRead(target).extract_image_description()), DESCRIPTION
+        )
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ["copy.jpg", "image.jpg"])
+
+    @unittest.skipIf(os.name == "nt", "reflinks are only cloned on Linux")
+    def test_clone_falls_back_to_copy(self):
+        target = os.path.join(self.tmpdir, "copy.jpg")
+        with mock.patch("fcntl.ioctl", side_effect=OSError("not supported")):
+            self.assertFalse(exif_write.clone_file(self.image, target))
+        with open(self.image, "rb") as src, open(target, "rb") as dst:
+            self.assertEqual(src.read(), dst.read())
+
+    def test_write_to_a_stream(self):
+        with open(self.image, "rb") as fp:
+            original = fp.read()
+        exif_edit = ExifEdit(self.image)
+        exif_edit.add_image_description({"MAPLatitude": 1.0})
+        output = io.BytesIO()
+        exif_edit.write_to(output)
+        with open(self.image, "rb") as fp:
+            self.assertEqual(fp.read(), original)
+        output.seek(0)
+        self.assertEqual(
+            ExifRead(output).extract_image_description(), '{"MAPLatitude": 1.0}'
+        )
+        output.seek(0)
+        self.assertEqual(
+            output.read()[-len(image_data(self.image)) :], image_data(self.image)
+        )
@@ -0,0 +1,234 @@
+import csv
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mapillary_tools import geo
+from mapillary_tools import gps_parser
+from mapillary_tools import gpx_from_gopro
+from mapillary_tools.gps_trace import GpsTrace
+
+TRACK = [(48.1 + i * 1e-4, 11.5 + (i % 7) * 2e-4) for i in range(50)] + [
+    (0.0, 179.9),
+    (0.1, -179.9),
+    (-33.9, 151.2),
+]
+
+
+class GeoArrayTests(unittest.TestCase):
+    def assert_close(self, values, expected):
+        self.assertEqual(len(values), len(expected))
+        for value, expected_value in zip(values, expected):
+            self.assertAlmostEqual(value, expected_value, places=6)
+
+    def check_same_as_scalar(self):
+        self.assert_close(
+            geo.consecutive_gps_distances(TRACK),
+            [geo.gps_distance(ll1, ll2) for ll1, ll2 in zip(TRACK, TRACK[1:])],
+        )
+        self.assert_close(
+            geo.gps_distances_from(TRACK[0], TRACK),
+            [geo.gps_distance(TRACK[0], ll) for ll in TRACK],
+        )
+        self.assert_close(
+            geo.consecutive_bearings(TRACK),
+            [
+                geo.compute_bearing(ll1[0], ll1[1], ll2[0], ll2[1])
+                for ll1, ll2 in zip(TRACK, TRACK[1:])
+            ],
+        )
+        self.assert_close(geo.gps_speed([1.0, 4.0, 3.0], [0, 2, 1.5]), [2.0, 2.0, 2.0])
+        self.assertEqual(geo.consecutive_gps_distances(TRACK[:1]), [])
+        self.assertEqual(geo.consecutive_bearings([]), [])
+
+    @unittest.skipIf(geo._numpy() is None, "NumPy is not installed")
+    def test_arrays_match_the_scalar_functions(self):
+        self.check_same_as_scalar()
+
+    def test_without_numpy(self):
+        with mock.patch.object(geo, "_numpy", return_value=None):
+            self.check_same_as_scalar()
+
+
+START = datetime.datetime(2021, 1, 1, 12, 0, 0)
+TRACE = [
+    (START + datetime.timedelta(seconds=i), lat, lon, float(i))
+    for i, (lat, lon) in enumerate(TRACK[:50])
+]
+# repeated time
+TRACE.insert(10, (TRACE[10][0], 48.0, 11.0, 0.0))
+
+
+class InterpolationTests(unittest.TestCase):
+    def test_batch_matches_single(self):
+        times = [
+            START + datetime.timedelta(seconds=s)
+            for s in [30.5, -20, 0, 0.25, 9.5, 10, 10.5, 49, 55, 49.9, 70, 3]
+        ]
+        results = geo.interpolate_lat_lons(TRACE, times)
+        self.assertEqual(len(results), len(times))
+        for t, result in zip(times, results):
+            try:
+                expected = geo.interpolate_lat_lon(TRACE, t)
+            except geo.MapillaryInterpolationError as ex:
+                self.assertIsInstance(result, geo.MapillaryInterpolationError)
+                self.assertEqual(str(result), str(ex))
+            else:
+                self.assertEqual(result, expected)
+        self.assertIsInstance(results[1], geo.MapillaryInterpolationError)
+        self.assertEqual(results[2], (TRACE[0][1], TRACE[0][2], results[2][2], 0.0))
+        self.assertAlmostEqual(results[3][3], 0.25)
+
+    def test_interpolation_between_points(self):
+        lat, lon, _, ele = geo.interpolate_lat_lon(
+            TRACE, START + datetime.timedelta(seconds=20.5)
+        )
+        self.assertAlmostEqual(lat, (TRACK[20][0] + TRACK[21][0]) / 2)
+        self.assertAlmostEqual(lon, (TRACK[20][1] + TRACK[21][1]) / 2)
+        self.assertAlmostEqual(ele, 20.5)
+
+
+class TimezoneResolverTests(unittest.TestCase):
+    def setUp(self):
+        self.lookups = []
+
+    def tz_name_at(self, lat, lon):
+        self.lookups.append((lat, lon))
+        if 48.2 < lat < 48.3 and 13.6 < lon < 13.7:
+            return "Europe/Vienna"
+        return "Europe/Berlin" if lon > 11.3 else "Europe/Paris"
+
+    def resolver(self):
+        # the border at longitude 11.3, and an enclave inside a cell
+        rings = [
+            [(11.3, 40.0), (11.3, 50.0)],
+            [(13.6, 48.2), (13.7, 48.2), (13.7, 48.3), (13.6, 48.3), (13.6, 48.2)],
+        ]
+        return geo.TimezoneResolver(
+            cell_size=0.5,
+            tz_name_at=self.tz_name_at,
+            polygon_rings=lambda lat, lon: rings,
+        )
+
+    def test_lookups_are_cached_per_cell(self):
+        resolver = self.resolver()
+        self.assertEqual(resolver.timezone_at(48.1, 13.1), "Europe/Berlin")
+        self.assertEqual(resolver.timezone_at(48.4, 13.4), "Europe/Berlin")
+        self.assertEqual(len(self.lookups), 1)
+
+    def test_locations_near_a_border_are_looked_up(self):
+        resolver = self.resolver()
+        self.assertEqual(resolver.timezone_at(48.1, 11.4), "Europe/Berlin")
+        self.assertEqual(resolver.timezone_at(48.1, 11.2), "Europe/Paris")
+        self.assertEqual(resolver.timezone_at(48.1, 11.4), "Europe/Berlin")
+        self.assertEqual(len(self.lookups), 2)
+        # the corners of the cell are all outside the enclave
+        self.assertEqual(resolver.timezone_at(48.1, 13.6), "Europe/Berlin")
+        self.assertEqual(resolver.timezone_at(48.25, 13.65), "Europe/Vienna")
+
+    def test_timezones_at(self):
+        resolver = self.resolver()
+        self.assertEqual(
+            resolver.timezones_at([(48.1, 12.1), (48.1, 11.2), (48.3, 12.2)]),
+            ["Europe/Berlin", "Europe/Paris", "Europe/Berlin"],
+        )
+        self.assertEqual(len(self.lookups), 2)
+
+    def test_nothing_is_cached_without_the_polygons(self):
+        resolver = geo.TimezoneResolver(cell_size=0.5, tz_name_at=self.tz_name_at)
+        resolver.timezones_at([(48.1, 12.1), (48.1, 12.2)])
+        self.assertEqual(len(self.lookups), 2)
+
+
+class SpatialGridTests(unittest.TestCase):
+    def test_neighbors_include_all_items_within_cell_size(self):
+        grid = geo.SpatialGrid(5.0)
+        for i, latlon in enumerate(TRACK):
+            grid.add(latlon, i)
+        for latlon in TRACK + [(48.10001, 11.50002), (-33.90003, 151.2)]:
+            neighbors = set(grid.neighbors(latlon))
+            for i, other in enumerate(TRACK):
+                if geo.gps_distance(latlon, other) < 5.0:
+                    self.assertIn(i, neighbors)
+        self.assertEqual(grid.neighbors((10.0, 10.0)), [])
+
+
+class WriteTraceTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.points = [
+            (START, 48.1, 11.5, 500.0),
+            (START + datetime.timedelta(seconds=1.5), 48.2, 11.6, None),
+            # without a position
+            (START + datetime.timedelta(seconds=2), 0.0, 11.6, 502.0),
+            (START + datetime.timedelta(seconds=3), 48.3, 11.7),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write_gpx_from_generator(self):
+        gpx_path = os.path.join(self.tmpdir, "trace.gpx")
+        geo.write_gpx(gpx_path, (point for point in self.points))
+        self.assertEqual(
+            list(gps_parser.get_lat_lon_time_from_gpx(gpx_path, local_time=False)),
+            [
+                (START, 48.1, 11.5, 500.0),
+                (START + datetime.timedelta(seconds=1.5), 48.2, 11.6, 0.0),
+                (START + datetime.timedelta(seconds=3), 48.3, 11.7, 0.0),
+            ],
+        )
+
+    def test_binary_round_trip(self):
+        trace_path = os.path.join(self.tmpdir, "trace.bin")
+        geo.write_trace_binary(trace_path, GpsTrace.from_points(self.points))
+        self.assertEqual(
+            list(gps_parser.get_lat_lon_time_from_binary(trace_path)),
+            [
+                (START, 48.1, 11.5, 500.0),
+                (START + datetime.timedelta(seconds=1.5), 48.2, 11.6, None),
+                (START + datetime.timedelta(seconds=3), 48.3, 11.7, None),
+            ],
+        )
+        with open(trace_path, "r+b") as fp:
+            fp.truncate(os.path.getsize(trace_path) - 1)
+        with self.assertRaises(ValueError):
+            gps_parser.get_lat_lon_time_from_binary(trace_path)
+
+    def test_write_csv(self):
+        csv_path = os.path.join(self.tmpdir, "trace.csv")
+        geo.write_trace_csv(csv_path, self.points)
+        with open(csv_path, newline="") as fp:
+            rows = list(csv.reader(fp))
+        self.assertEqual(
+            rows,
+            [
+                ["time", "lat", "lon", "elevation"],
+                ["2021-01-01T12:00:00.000000", "48.1", "11.5", "500.0"],
+                ["2021-01-01T12:00:01.500000", "48.2", "11.6", ""],
+                ["2021-01-01T12:00:03.000000", "48.3", "11.7", ""],
+            ],
+        )
+
+    def test_gopro_gpx_is_sorted(self):
+        video = os.path.join(self.tmpdir, "GOPR0001.MP4")
+        for points in [self.points, self.points[::-1]]:
+            gopro_points = [point[:4] + (None,) * (6 - len(point)) for point in points]
+            with mock.patch.object(
+                gpx_from_gopro,
+                "iter_points_from_gpmf",
+                side_effect=lambda path: iter(gopro_points),
+            ):
+                gpx_path = gpx_from_gopro.gpx_from_gopro(video)
+            self.assertEqual(
+                [
+                    point[0]
+                    for point in gps_parser.get_lat_lon_time_from_gpx(
+                        gpx_path, local_time=False
+                    )
+                ],
+                [START + datetime.timedelta(seconds=s) for s in [0, 1.5, 3]],
+            )
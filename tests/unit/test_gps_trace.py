@@ -0,0 +1,74 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from mapillary_tools import geo
+from mapillary_tools.gps_trace import GpsTrace
+
+START = datetime.datetime(2021, 1, 1, 12, 0, 0)
+POINTS = [
+    (START + datetime.timedelta(seconds=s), 48.1 + s * 1e-4, 11.5, ele)
+    for s, ele in [(0, 500.0), (1.5, None), (1.5, 502.0), (3, 503.5), (10, None)]
+]
+
+
+class GpsTraceTests(unittest.TestCase):
+    def test_points_round_trip(self):
+        trace = GpsTrace.from_points(POINTS)
+        self.assertEqual(len(trace), len(POINTS))
+        self.assertEqual(list(trace), POINTS)
+        self.assertEqual([trace[i] for i in range(len(trace))], POINTS)
+        self.assertEqual(trace[-1], POINTS[-1])
+        self.assertEqual(list(trace[1:3]), POINTS[1:3])
+        self.assertEqual(list(trace[:2] + trace[2:]), POINTS)
+
+    def test_sort(self):
+        trace = GpsTrace.from_points(POINTS[::-1])
+        trace.sort()
+        self.assertEqual(
+            list(trace), [POINTS[0], POINTS[2], POINTS[1], POINTS[3], POINTS[4]]
+        )
+
+    def test_fixes(self):
+        trace = GpsTrace(fixes=True)
+        trace.append(START, 48.1, 11.5, 500.0, fix=3)
+        trace.append(START, 48.1, 11.5, 500.0)
+        self.assertEqual(list(trace.fixes), [3, 0])
+        self.assertIsNone(trace.precisions)
+        self.assertIsNone((trace + GpsTrace.from_points(POINTS)).fixes)
+
+    def test_searchsorted(self):
+        trace = GpsTrace.from_points(POINTS)
+        t = START + datetime.timedelta(seconds=1.5)
+        self.assertEqual(trace.searchsorted(t), 1)
+        self.assertEqual(trace.searchsorted(t, side="right"), 3)
+        self.assertEqual(trace.searchsorted(START - datetime.timedelta(days=1)), 0)
+        self.assertEqual(trace.searchsorted(START + datetime.timedelta(days=1)), 5)
+
+    def test_interpolation(self):
+        points = [p for p in POINTS if p[3] is not None]
+        trace = GpsTrace.from_points(points)
+        times = [START + datetime.timedelta(seconds=s) for s in [-1, 0.5, 1.5, 2, 3]]
+        self.assertEqual(
+            geo.interpolate_lat_lons(trace, times),
+            [geo.interpolate_lat_lon(points, t) for t in times],
+        )
+
+    def test_gpx_of_trace_matches_gpx_of_points(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            points = POINTS + [
+                (START + datetime.timedelta(seconds=20), 48.2, 11.6, 123.4)
+            ]
+            list_path = os.path.join(tmpdir, "list.gpx")
+            trace_path = os.path.join(tmpdir, "trace.gpx")
+            geo.write_gpx(list_path, points)
+            geo.write_gpx(trace_path, GpsTrace.from_points(points))
+            with open(list_path) as list_fp, open(trace_path) as trace_fp:
+                gpx = list_fp.read()
+                self.assertIn("<ele>123.4</ele>", gpx)
+                self.assertEqual(trace_fp.read(), gpx)
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mapillary_tools import image_catalog, state_store, uploader
+
+
+class ImageCatalogTests(unittest.TestCase):
+    def setUp(self):
+        self.import_path = tempfile.mkdtemp()
+        self.image = os.path.join(self.import_path, "image.jpg")
+        open(self.image, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.import_path)
+
+    def test_reads_are_served_from_the_catalog(self):
+        store = state_store.get_store(self.image)
+        with image_catalog.activate(image_catalog.ImageCatalog()):
+            self.assertEqual(
+                uploader.get_total_file_list(self.import_path), [self.image]
+            )
+            self.assertEqual(state_store.get_flags(self.image), set())
+            self.assertFalse(state_store.has_json(self.image, "user_process"))
+
+            state_store.set_flag(self.image, "user_process_success")
+            state_store.save_json(
+                self.image, "user_process", {"MAPSettingsUsername": "a"}
+            )
+
+            with mock.patch.object(
+                store, "bulk_flags", side_effect=AssertionError
+            ), mock.patch.object(
+                store, "bulk_load_json", side_effect=AssertionError
+            ), mock.patch(
+                "mapillary_tools.uploader.iterate_file_entries",
+                side_effect=AssertionError,
+            ):
+                self.assertEqual(
+                    uploader.get_total_file_list(self.import_path), [self.image]
+                )
+                self.assertEqual(
+                    state_store.get_flags(self.image), {"user_process_success"}
+                )
+                payload = state_store.load_json(self.image, "user_process")
+                payload["MAPSettingsUsername"] = "b"
+                self.assertEqual(
+                    state_store.load_json(self.image, "user_process"),
+                    {"MAPSettingsUsername": "a"},
+                )
+
+        # the updates were written through to the store
+        self.assertEqual(store.flags(self.image), {"user_process_success"})
+        self.assertEqual(
+            store.load_json(self.image, "user_process"), {"MAPSettingsUsername": "a"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mapillary_tools import exif_read
+from mapillary_tools import state_store
+from mapillary_tools.exif_read import ExifRead
+from mapillary_tools.insert_MAPJson import insert_image_descriptions_parallel
+
+PAYLOADS = {
+    "user_process": {"MAPSettingsUsername": "test_username"},
+    "geotag_process": {"MAPLatitude": 1.0, "MAPLongitude": 2.0},
+    "sequence_process": {"MAPSequenceUUID": "sequence"},
+    "upload_params_process": {"key": "value"},
+    "settings_upload_hash": {"MAPSettingsUploadHash": "hash"},
+    "import_meta_data_process": {"MAPOrientation": 1},
+}
+
+
+class InsertParallelTests(unittest.TestCase):
+    def setUp(self):
+        self.import_path = tempfile.mkdtemp()
+        self.images = []
+        for i in range(5):
+            image = os.path.join(self.import_path, f"image_{i}.jpg")
+            with open(image, "wb") as f:
+                f.write(b"not a jpeg")
+            for name, payload in PAYLOADS.items():
+                state_store.save_json(image, name, payload)
+            self.images.append(image)
+
+    def tearDown(self):
+        shutil.rmtree(self.import_path)
+        exif_read.clear_exif_cache()
+
+    def test_descriptions_are_logged(self):
+        failures = insert_image_descriptions_parallel(
+            self.images, 2, skip_EXIF_insert=True
+        )
+        self.assertEqual(failures, {})
+        for image in self.images:
+            self.assertIn(
+                "mapillary_image_description_success", state_store.get_flags(image)
+            )
+            description = state_store.load_json(image, "mapillary_image_description")
+            self.assertEqual(description["MAPSequenceUUID"], "sequence")
+            self.assertIn("MAPPhotoUUID", description)
+
+    def test_failures_are_collected_per_image(self):
+        failures = insert_image_descriptions_parallel(self.images, 2)
+        self.assertEqual(sorted(failures), self.images)
+        for image in self.images:
+            self.assertIn(
+                "mapillary_image_description_failed", state_store.get_flags(image)
+            )
+
+    def test_exif_rewritten_in_workers_is_read_again(self):
+        image = self.images[0]
+        shutil.copy(
+            os.path.join(os.path.dirname(__file__), "data", "test_exif.jpg"), image
+        )
+        self.assertEqual(insert_image_descriptions_parallel([image], 1), {})
+        stat = os.stat(image)
+        first = ExifRead(image).extract_image_description()
+        # rewrite in place with the same size and mtime, as on a filesystem
+        # with a coarse mtime
+        self.assertEqual(insert_image_descriptions_parallel([image], 1), {})
+        os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(os.stat(image).st_size, stat.st_size)
+        second = ExifRead(image).extract_image_description()
+        self.assertNotEqual(first, second)
+        self.assertEqual(
+            json.loads(second)["MAPPhotoUUID"],
+            state_store.load_json(image, "mapillary_image_description")["MAPPhotoUUID"],
+        )
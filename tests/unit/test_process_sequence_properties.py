@@ -0,0 +1,98 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mapillary_tools import process_sequence_properties, state_store
+
+START = datetime.datetime(2021, 1, 1, 12, 0, 0)
+
+
+class IsDuplicateTests(unittest.TestCase):
+    def test_close_images_facing_the_same_way_are_duplicates(self):
+        latlon = (48.1, 11.5)
+        self.assertTrue(
+            process_sequence_properties.is_duplicate(latlon, 90.0, latlon, 92.0)
+        )
+        # too far
+        self.assertFalse(
+            process_sequence_properties.is_duplicate(
+                latlon, 90.0, (48.1001, 11.5), 90.0
+            )
+        )
+        # turned
+        self.assertFalse(
+            process_sequence_properties.is_duplicate(latlon, 90.0, latlon, 100.0)
+        )
+        # the bearing difference wraps around north
+        self.assertTrue(
+            process_sequence_properties.is_duplicate(latlon, 358.0, latlon, 1.0)
+        )
+        # without directions only the distance counts, and it is not enough
+        self.assertFalse(
+            process_sequence_properties.is_duplicate(latlon, None, latlon, 90.0)
+        )
+        self.assertTrue(
+            process_sequence_properties.is_duplicate(
+                latlon, 90.0, (48.1001, 11.5), 90.0, duplicate_distance=20
+            )
+        )
+
+
+class DuplicatesAcrossSequencesTests(unittest.TestCase):
+    def setUp(self):
+        self.import_path = tempfile.mkdtemp()
+        self.images = {}
+        for name in ["a0", "a1", "a2", "b0", "b1"]:
+            self.images[name] = os.path.join(self.import_path, name + ".jpg")
+            open(self.images[name], "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.import_path)
+
+    def _sequence(self, names, latlons):
+        return {
+            "file_list": [self.images[name] for name in names],
+            "directions": [90.0] * len(names),
+            "latlons": latlons,
+            "capture_times": [
+                START + datetime.timedelta(seconds=i) for i in range(len(names))
+            ],
+        }
+
+    def _process(self, duplicates_across_sequences):
+        sequences = [
+            # a1 is at the same place as a0
+            self._sequence(
+                ["a0", "a1", "a2"], [(48.1, 11.5), (48.1, 11.5), (48.1005, 11.5)]
+            ),
+            # b0, the first image of its sequence, is at the same place as a0
+            self._sequence(["b0", "b1"], [(48.1, 11.5), (48.102, 11.5)]),
+        ]
+        with mock.patch.object(
+            process_sequence_properties, "find_sequences", return_value=sequences
+        ):
+            process_sequence_properties.process_sequence_properties(
+                self.import_path,
+                duplicates_across_sequences=duplicates_across_sequences,
+            )
+        flags = state_store.bulk_flags(self.images.values())
+        return {
+            name for name, image in self.images.items() if "duplicate" in flags[image]
+        }, {
+            name
+            for name, image in self.images.items()
+            if state_store.has_json(image, "sequence_process")
+        }
+
+    def test_duplicates_of_other_sequences_are_flagged(self):
+        duplicates, kept = self._process(True)
+        self.assertEqual(duplicates, {"a1", "b0"})
+        self.assertEqual(kept, {"a0", "a2", "b1"})
+
+    def test_duplicates_within_sequences_only(self):
+        duplicates, kept = self._process(False)
+        self.assertEqual(duplicates, {"a1"})
+        self.assertEqual(kept, {"a0", "a2", "b0", "b1"})
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mapillary_tools import scan_index, state_store, uploader
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+
+def set_mtime(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+class ScanIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.import_path = tempfile.mkdtemp()
+        self.image = os.path.join(self.import_path, "sub", "image.jpg")
+        touch(self.image)
+        state_store.FileStateStore().set_flag(self.image, "duplicate")
+        os.makedirs(os.path.dirname(scan_index.scan_index_path(self.import_path)))
+        for dirpath, _, _ in os.walk(self.import_path):
+            set_mtime(dirpath, 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.import_path)
+
+    def test_unchanged_directories_are_not_listed_again(self):
+        index = scan_index.ScanIndex(self.import_path)
+        self.assertEqual(
+            list(index.iterate_files(self.import_path, True)), [self.image]
+        )
+        index.save()
+
+        index = scan_index.ScanIndex(self.import_path)
+        with mock.patch("os.scandir", side_effect=AssertionError):
+            self.assertEqual(
+                list(index.iterate_files(self.import_path, True)), [self.image]
+            )
+
+        other = os.path.join(self.import_path, "sub", "other.jpg")
+        touch(other)
+        set_mtime(os.path.dirname(other), 2000)
+        self.assertEqual(
+            sorted(index.iterate_files(self.import_path, True)),
+            sorted([other, self.image]),
+        )
+
+    def test_flags_are_reused_until_the_log_changes(self):
+        index = scan_index.enable(self.import_path)
+        try:
+            self.assertEqual(
+                uploader.get_total_file_list(self.import_path), [self.image]
+            )
+            self.assertEqual(
+                state_store.bulk_flags([self.image]), {self.image: {"duplicate"}}
+            )
+            index.save()
+
+            store = state_store.get_file_store()
+            with mock.patch.object(store, "flags", side_effect=AssertionError):
+                self.assertEqual(
+                    state_store.bulk_flags([self.image]), {self.image: {"duplicate"}}
+                )
+
+            store.set_flag(self.image, "upload_success")
+            set_mtime(state_store.log_rootpath(self.image), 2000)
+            self.assertEqual(
+                state_store.bulk_flags([self.image]),
+                {self.image: {"duplicate", "upload_success"}},
+            )
+        finally:
+            scan_index._INDEXES.clear()
+            state_store.use_file_store(state_store.FileStateStore())
+
+
+if __name__ == "__main__":
+    unittest.main()
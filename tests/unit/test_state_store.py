@@ -0,0 +1,189 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from mapillary_tools import state_store
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+
+class StateStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.import_path = tempfile.mkdtemp()
+        self.image = os.path.join(self.import_path, "sub", "image.jpg")
+        touch(self.image)
+
+    def tearDown(self):
+        # forget the databases opened by enable_sqlite
+        for store in state_store._SQLITE_STORES.values():
+            store.close()
+        state_store._SQLITE_STORES.clear()
+        state_store._DIRECTORY_STORES.clear()
+        shutil.rmtree(self.import_path)
+
+    def check_store(self, store):
+        image = self.image
+        self.assertEqual(store.flags(image), set())
+        self.assertFalse(store.has_json(image, "geotag_process"))
+        self.assertEqual(store.load_json(image, "geotag_process"), {})
+
+        store.set_flag(image, "geotag_process_success", history=True)
+        store.set_flag(image, "duplicate")
+        store.save_json(image, "geotag_process", {"MAPLatitude": 1.0})
+        self.assertEqual(store.flags(image), {"geotag_process_success", "duplicate"})
+        self.assertEqual(
+            store.bulk_flags([image]),
+            {image: {"geotag_process_success", "duplicate"}},
+        )
+        self.assertEqual(
+            store.load_jsons(image, ["geotag_process", "user_process"]),
+            {"geotag_process": {"MAPLatitude": 1.0}},
+        )
+
+        store.clear_flag(image, "duplicate")
+        store.remove_json(image, "geotag_process")
+        self.assertEqual(store.flags(image), {"geotag_process_success"})
+        self.assertFalse(store.has_json(image, "geotag_process"))
+
+        state = store.export_state(image)
+        self.assertEqual(state.flags, {"geotag_process_success"})
+        self.assertEqual(
+            [flag for flag, _ in state.history], ["geotag_process_success"]
+        )
+
+    def test_file_store(self):
+        self.check_store(state_store.FileStateStore())
+        log_root = state_store.log_rootpath(self.image)
+        self.assertTrue(
+            os.path.isfile(os.path.join(log_root, "geotag_process_success"))
+        )
+
+    def test_file_store_bulk_flags_without_logs(self):
+        other = os.path.join(self.import_path, "sub", "other.jpg")
+        touch(other)
+        store = state_store.FileStateStore()
+        store.set_flag(self.image, "duplicate")
+        self.assertEqual(
+            store.bulk_flags([self.image, other]),
+            {self.image: {"duplicate"}, other: set()},
+        )
+
+    def test_file_store_batch(self):
+        store = state_store.FileStateStore()
+        log_root = state_store.log_rootpath(self.image)
+        with store.batch():
+            store.set_flag(self.image, "duplicate", history=True)
+            store.save_json(self.image, "geotag_process", {"MAPLatitude": 1.0})
+            self.assertFalse(os.path.isdir(log_root))
+            # reads of an image with buffered updates flush them first
+            self.assertEqual(store.flags(self.image), {"duplicate"})
+            store.clear_flag(self.image, "duplicate")
+        self.assertEqual(store.flags(self.image), set())
+        self.assertEqual(
+            store.load_json(self.image, "geotag_process"), {"MAPLatitude": 1.0}
+        )
+        self.assertFalse(
+            os.path.exists(state_store.journal_dirpath(os.path.abspath(self.image)))
+        )
+
+    def test_file_store_journal_recovery(self):
+        journal_dir = state_store.journal_dirpath(os.path.abspath(self.image))
+        os.makedirs(journal_dir)
+        with open(os.path.join(journal_dir, f"{exited_pid()}.jsonl"), "w") as f:
+            f.write(
+                '["set_flag", "%s", "upload_success", "2021_01_01_00_00_00"]\n'
+                % os.path.abspath(self.image)
+            )
+            f.write('["clear_flag", "')
+
+        store = state_store.FileStateStore()
+        self.assertEqual(store.flags(self.image), {"upload_success"})
+        self.assertEqual(
+            store.export_state(self.image).history,
+            [("upload_success", "2021_01_01_00_00_00")],
+        )
+        self.assertFalse(os.path.exists(journal_dir))
+
+    def test_file_store_journal_of_running_process_is_kept(self):
+        journal_dir = state_store.journal_dirpath(os.path.abspath(self.image))
+        os.makedirs(journal_dir)
+        journal_path = os.path.join(journal_dir, f"{os.getppid()}.jsonl")
+        with open(journal_path, "w") as f:
+            f.write(
+                '["set_flag", "%s", "upload_success", null]\n'
+                % os.path.abspath(self.image)
+            )
+
+        store = state_store.FileStateStore()
+        self.assertEqual(store.flags(self.image), set())
+        self.assertTrue(os.path.isfile(journal_path))
+
+    def test_sqlite_store(self):
+        store = state_store.SQLiteStateStore(self.import_path)
+        self.check_store(store)
+        self.assertFalse(os.path.isdir(state_store.log_rootpath(self.image)))
+        store.close()
+
+    def test_sqlite_bulk_reads_in_batches(self):
+        store = state_store.SQLiteStateStore(self.import_path)
+        images = [
+            os.path.join(self.import_path, f"image_{i}.jpg")
+            for i in range(state_store.SQLITE_BATCH_SIZE + 10)
+        ]
+        with store.transaction():
+            for i, image in enumerate(images):
+                store.set_flag(image, "duplicate")
+                store.save_json(image, "sequence_process", {"MAPPhotoIndex": i})
+        self.assertEqual(
+            store.bulk_flags(images[1:]), {image: {"duplicate"} for image in images[1:]}
+        )
+        payloads = store.bulk_load_json(images[1:], "sequence_process")
+        self.assertEqual(len(payloads), len(images) - 1)
+        self.assertEqual(payloads[images[-1]], {"MAPPhotoIndex": len(images) - 1})
+        store.close()
+
+    def test_sqlite_transaction_rollback(self):
+        store = state_store.SQLiteStateStore(self.import_path)
+        with self.assertRaises(RuntimeError):
+            with store.transaction():
+                store.set_flag(self.image, "duplicate")
+                raise RuntimeError()
+        self.assertEqual(store.flags(self.image), set())
+        store.close()
+
+    def test_enable_sqlite_migrates_logs(self):
+        state_store.FileStateStore().set_flag(
+            self.image, "upload_success", history=True
+        )
+        state_store.FileStateStore().save_json(
+            self.image, "sequence_process", {"MAPSequenceUUID": "abc"}
+        )
+        store = state_store.enable_sqlite(self.import_path)
+        self.assertIs(state_store.get_store(self.image), store)
+        self.assertEqual(state_store.get_flags(self.image), {"upload_success"})
+        self.assertEqual(
+            state_store.bulk_load_json([self.image], "sequence_process"),
+            {self.image: {"MAPSequenceUUID": "abc"}},
+        )
+
+        destination = os.path.join(self.import_path, "moved", "image.jpg")
+        state_store.move(self.image, destination)
+        self.assertEqual(state_store.get_flags(self.image), set())
+        self.assertEqual(state_store.get_flags(destination), {"upload_success"})
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import datetime
+import math
+import unittest
+from unittest import mock
+
+from mapillary_tools import geo
+from mapillary_tools import trace_reduction
+from mapillary_tools.gps_trace import GpsTrace, from_microseconds
+
+START = datetime.datetime(2021, 1, 1, 12, 0, 0)
+
+
+def stop_and_go_trace():
+    trace = GpsTrace(fixes=True)
+    for i in range(18 * 600):
+        s = i / 18
+        # moving east for a minute, then standing for a minute
+        east = s - 60 * (s // 120) if (s // 60) % 2 == 0 else 60 * (s // 120 + 1)
+        trace.append(
+            START + datetime.timedelta(seconds=s),
+            48.1 + 1e-4 * math.sin(s / 30),
+            11.5 + 1e-4 * east,
+            500.0,
+            fix=3,
+        )
+    return trace
+
+
+class TraceReductionTests(unittest.TestCase):
+    def assert_within(self, reduced, trace, tolerance):
+        times = [from_microseconds(t) for t in trace.times[::5]]
+        for interpolated, point in zip(
+            geo.interpolate_lat_lons(reduced, times), trace[::5]
+        ):
+            self.assertLess(
+                geo.gps_distance(interpolated[:2], point[1:3]), tolerance + 1e-6
+            )
+
+    def check_simplify(self):
+        trace = stop_and_go_trace()
+        for tolerance in [0.5, 5.0]:
+            simplified = trace_reduction.simplify(trace, tolerance)
+            self.assertLess(len(simplified), len(trace) / 10)
+            self.assertEqual(simplified[0], trace[0])
+            self.assertEqual(simplified[-1], trace[-1])
+            self.assert_within(simplified, trace, tolerance)
+        return simplified
+
+    @unittest.skipIf(geo._numpy() is None, "NumPy is not installed")
+    def test_simplify(self):
+        self.check_simplify()
+
+    def test_simplify_without_numpy(self):
+        simplified = self.check_simplify()
+        with mock.patch.object(trace_reduction, "_numpy", return_value=None):
+            self.assertEqual(list(self.check_simplify().times), list(simplified.times))
+
+    def test_resample(self):
+        trace = stop_and_go_trace()
+        resampled = trace_reduction.resample(trace, 2.0)
+        self.assertEqual(len(resampled), 301)
+        self.assertEqual(resampled[0], trace[0])
+        self.assertEqual(resampled[-1], trace[-1])
+        self.assertEqual(resampled[1][0], START + datetime.timedelta(seconds=2))
+        self.assertEqual(set(resampled.fixes), {3})
+        self.assertIsNone(resampled.precisions)
+        self.assert_within(resampled, trace, 0.1)
+
+    def test_reduce_trace_without_options(self):
+        trace = stop_and_go_trace()
+        self.assertIs(trace_reduction.reduce_trace(trace, "trace"), trace)
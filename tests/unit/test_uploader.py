@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from mapillary_tools import processing, state_store, uploader
+from mapillary_tools.exif_read import ExifRead
+
+this_file_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(this_file_dir, "data")
+
+
+class UploaderTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.image = os.path.join(self.tmpdir, "image.jpg")
+        shutil.copy(os.path.join(data_dir, "test_exif.jpg"), self.image)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_descriptions_are_inserted_in_the_zip_only(self):
+        with open(self.image, "rb") as fp:
+            original = fp.read()
+        description = {"MAPLatitude": 1.0, "MAPLongitude": 2.0}
+        zip_path = os.path.join(self.tmpdir, "sequence.zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as ziph:
+            uploader.write_described_image(ziph, self.image, "image.jpg", description)
+
+        with open(self.image, "rb") as fp:
+            self.assertEqual(fp.read(), original)
+        with zipfile.ZipFile(zip_path) as ziph:
+            self.assertEqual(ziph.namelist(), ["image.jpg"])
+            with ziph.open("image.jpg") as fp:
+                exif = ExifRead(fp)
+                self.assertEqual(
+                    json.loads(exif.extract_image_description()), description
+                )
+
+    def test_file_entries_cache_their_stat(self):
+        other = os.path.join(self.tmpdir, "sub", "other.jpg")
+        os.mkdir(os.path.dirname(other))
+        shutil.copy(self.image, other)
+        open(os.path.join(self.tmpdir, "notes.txt"), "w").close()
+
+        entries = uploader.get_total_file_entries(self.tmpdir)
+        self.assertEqual([entry.path for entry in entries], [self.image, other])
+        self.assertEqual(
+            [entry.path for entry in entries],
+            uploader.get_total_file_list(self.tmpdir),
+        )
+        for entry in entries:
+            stat = os.stat(entry.path)
+            self.assertEqual(entry.size, stat.st_size)
+            self.assertEqual(entry.mtime_ns, stat.st_mtime_ns)
+            self.assertEqual(entry.inode(), stat.st_ino)
+            self.assertIs(entry.stat(), entry.stat())
+
+    def test_list_builders_filter_the_entries(self):
+        state_store.set_flag(self.image, "mapillary_image_description_success")
+        self.assertEqual(
+            [entry.path for entry in uploader.get_upload_file_entries(self.tmpdir)],
+            [self.image],
+        )
+        self.assertEqual(uploader.get_upload_file_list(self.tmpdir), [self.image])
+        self.assertEqual(
+            processing.get_process_file_list(self.tmpdir, "user_process"),
+            [self.image],
+        )
+        state_store.set_flag(self.image, "user_process_success")
+        self.assertEqual(
+            processing.get_process_file_entries(self.tmpdir, "user_process"), []
+        )